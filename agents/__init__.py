@@ -1,8 +1,23 @@
 import yaml
 from .base_agent import BaseAgent
 from .synthetic_agent import SyntheticAgent
+from .shot_agent import ShotAgent
+from .checkpoint import SimulationCheckpoint
+from .rounds import RoundScheduler
+from .simulation import augment_prompts, augment_shot_prompts, simulate_episode
 
-def instantiate_agents(yaml_file):
+def instantiate_agents(yaml_file, llm_factory=None):
+    """
+    Creates the synthetic and helper agents listed in a scenario file.
+
+    Args:
+        yaml_file (str): Path to the scenario file.
+        llm_factory (Callable, optional): Called once per agent to create its language model wrapper.
+            Every agent gets a Gemini LLMWrapper when None.
+
+    Returns:
+        tuple: The synthetic agents and the helper agents.
+    """
 
     synthetic_agents = []
     helper_agents = []
@@ -11,11 +26,11 @@ def instantiate_agents(yaml_file):
             config = yaml.safe_load(file)
 
     for path in config['synthetic_agents']:
-        agent = SyntheticAgent(path)
+        agent = SyntheticAgent(path, llm_factory() if llm_factory else None)
         synthetic_agents.append(agent)
     
     for path in config['helper_agents']:
-        agent = BaseAgent(path)
+        agent = BaseAgent(path, llm_factory() if llm_factory else None)
         helper_agents.append(agent)
 
     return synthetic_agents, helper_agents
@@ -2,9 +2,8 @@ import yaml
 import base64
 from typing import Dict, Any
 from .llm_wrapper import LLMWrapper
-import numpy as np
+from tracing import traced
 from io import BytesIO
-from PIL import Image
 
 
 class BaseAgent:
@@ -15,23 +14,37 @@ class BaseAgent:
         config (Dict[str, Any]): Configuration loaded from the config file.
         llm (LLMWrapper): Wrapper for the language model.
         context (str): Context for the agent.
+        cache (SemanticCache): Answers basic_api_call queries nearly the same as earlier ones, None unless the
+            config has a semantic_cache mapping of SemanticCache arguments.
     """
 
-    def __init__(self, config_file: str = None) -> None:
+    def __init__(self, config_file: str = None, llm: LLMWrapper = None) -> None:
         """
         Initializes the BaseAgent with a configuration file.
 
         Args:
             config_file (str): Path to the configuration file. Defaults to None.
+            llm (LLMWrapper): The language model wrapper to use. A Gemini LLMWrapper is created when None.
         """
         if config_file:
             self.config = self.load_config_file(config_file)
         else:
             self.config = self.default_config()
             
-        self.llm = LLMWrapper("gemini")
+        if llm is None:
+            # agents can pick their backend with an `llm` mapping of LLMWrapper arguments in their config
+            llm_config = self.config.get("llm")
+            llm = LLMWrapper(**llm_config) if isinstance(llm_config, dict) else LLMWrapper("gemini")
+        self.llm = llm
         self.name = self.config["name"]
 
+        self.cache = None
+        cache_config = self.config.get("semantic_cache")
+        if cache_config:
+            from .semantic_cache import SemanticCache
+
+            self.cache = SemanticCache(**cache_config) if isinstance(cache_config, dict) else SemanticCache()
+
     def load_config_file(self, config_file: str) -> Dict[str, Any]:
         """
         Loads the configuration file.
@@ -58,16 +71,24 @@ class BaseAgent:
             "llm": "openAI"
         }
 
-    def basic_api_call(self, query: str) -> str:
+    @traced("agent.basic_api_call", lambda self, query, use_cache=True: {"agent": self.name})
+    def basic_api_call(self, query: str, use_cache: bool = True) -> str:
         """
         Makes a basic API call to the language model with the provided query.
 
         Args:
             query (str): The query to send to the language model.
+            use_cache (bool, optional): Look the query up in, and add it to, the agent's semantic cache if it has one.
+                Pass False when a fresh answer is wanted, e.g. for another variation. Defaults to True.
 
         Returns:
-            str: The response from the language model.
+            str: The response from the language model, or the cached response to a nearly identical query.
         """
+        if self.cache is not None and use_cache:
+            response = self.cache.get(query)
+            if response is not None:
+                return response
+
         messages = [
             {
                 "role": "system",
@@ -76,6 +97,8 @@ class BaseAgent:
             {"role": "user", "content": query}
         ]
         response = self.llm.make_api_call(messages)
+        if self.cache is not None and use_cache:
+            self.cache.put(query, response)
         return response
 
     def basic_api_call_structured(self, query: str) -> str:
@@ -98,7 +121,7 @@ class BaseAgent:
         response = self.llm.make_api_call_structured(messages)
         return response
     
-    def image_api_call(self, query: str, image:Image) -> str:
+    def image_api_call(self, query: str, image: "Image.Image") -> str:
         """
         Makes an API call to the language model with the provided query and image for prompt generation.
 
@@ -108,6 +131,8 @@ class BaseAgent:
         Returns:
             str: The response from the language model.
         """
+        import numpy as np
+        from PIL import Image
 
         if isinstance(image, np.ndarray):
             image = Image.fromarray(image.astype('uint8'))
@@ -0,0 +1,190 @@
+import json
+import os
+import sys
+import time
+
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tracing import trace_context
+
+from . import get_agent_by_name, instantiate_agents
+from .checkpoint import SimulationCheckpoint
+from .rounds import RoundScheduler
+from .simulation import augment_prompts
+
+
+def read_narratives(path: str):
+    """
+    Reads the episodes of a batch, lazily so that a stream can be consumed while earlier episodes run.
+
+    Each non-empty line is either a JSON object with a "narrative" and optionally an "id" and "iterations",
+    or the narrative as plain text. Episodes without an id are numbered by their position in the input,
+    so the input must keep its order for a resumed run to skip the right episodes.
+
+    Args:
+        path (str): A text or JSONL file, or "-" for stdin.
+
+    Yields:
+        dict: The episode, with "id", "narrative" and optionally "iterations".
+    """
+    file = sys.stdin if path == "-" else open(path, 'r')
+    try:
+        index = 0
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            episode = json.loads(line) if line.startswith("{") else {"narrative": line}
+            episode.setdefault("id", f"episode_{index:06d}")
+            episode["id"] = str(episode["id"])
+            index += 1
+            yield episode
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+def completed_ids(output_path: str) -> set:
+    """
+    Reads the ids of the episodes already written to a batch output.
+
+    Args:
+        output_path (str): The output JSONL file.
+
+    Returns:
+        set: The completed episode ids. A line cut short by an interruption is ignored.
+    """
+    ids = set()
+    if not os.path.exists(output_path):
+        return ids
+    with open(output_path, 'r') as file:
+        for line in file:
+            try:
+                ids.add(json.loads(line)["id"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return ids
+
+
+def truncate_partial_line(output_path: str) -> None:
+    """
+    Drops a last line left unfinished by an interruption, so appended records start on a line of their own.
+
+    Args:
+        output_path (str): The output JSONL file.
+    """
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'rb+') as file:
+        data = file.read()
+        if data and not data.endswith(b"\n"):
+            file.truncate(data.rfind(b"\n") + 1)
+
+
+def checkpoint_path(checkpoint_dir: str, episode_id: str) -> str:
+    """
+    Returns the checkpoint file of an episode.
+    """
+    return os.path.join(checkpoint_dir, f"{episode_id}.jsonl")
+
+
+def run_episode(episode: dict, scenario_file_path: str, iterations: int, augment: bool = False, llm_factory=None, checkpoint_dir: str = None) -> dict:
+    """
+    Writes one episode script with its own freshly created agents.
+
+    Args:
+        episode (dict): The episode, see read_narratives.
+        scenario_file_path (str): Path to the scenario file.
+        iterations (int): Number of story beats, unless the episode sets its own.
+        augment (bool, optional): Rewrite the image prompts with the image prompt helper agent. Defaults to False.
+        llm_factory (Callable, optional): Creates the language model wrapper of each agent, see instantiate_agents.
+        checkpoint_dir (str, optional): Every turn is checkpointed to checkpoint_dir/<id>.jsonl, and an episode
+            with a checkpoint there resumes after its last recorded turn. No checkpoints when None.
+
+    Returns:
+        dict: The output record, with "id", "narrative", "script" and "elapsed".
+    """
+    start = time.perf_counter()
+    with trace_context(episode=episode["id"]):
+        synthetic_agents, helper_agents = instantiate_agents(scenario_file_path, llm_factory)
+        scheduler = RoundScheduler.from_scenario(scenario_file_path, synthetic_agents)
+
+        checkpoint = SimulationCheckpoint(checkpoint_path(checkpoint_dir, episode["id"])) if checkpoint_dir else None
+        script = scheduler.run(episode["narrative"], int(episode.get("iterations", iterations)), checkpoint=checkpoint)
+        if augment:
+            augment_prompts(script, scheduler.writer, get_agent_by_name("img_prompt", helper_agents))
+
+    return {
+        "id": episode["id"],
+        "narrative": episode["narrative"],
+        "script": script.to_json(),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def run_script_batch(narratives_path: str, output_path: str, scenario_file_path: str, iterations: int = 3, concurrency: int = 8, augment: bool = False, llm_factory=None, checkpoint_dir: str = None) -> dict:
+    """
+    Writes many episode scripts concurrently, appending each to a JSONL output as soon as it finishes.
+
+    Episodes already in the output are skipped, so an interrupted run resumes where it stopped.
+    Failed episodes are reported and left out of the output, so the next run retries them. With a checkpoint_dir
+    the retry continues after the last turn the episode finished, and the checkpoint is removed once the episode
+    is written.
+
+    Args:
+        narratives_path (str): The episodes to write, see read_narratives.
+        output_path (str): The output JSONL file, one {"id", "narrative", "script", "elapsed"} record per line.
+        scenario_file_path (str): Path to the scenario file.
+        iterations (int, optional): Default number of story beats. Defaults to 3.
+        concurrency (int, optional): Number of episodes simulated at the same time. Defaults to 8.
+        augment (bool, optional): Rewrite the image prompts with the image prompt helper agent. Defaults to False.
+        llm_factory (Callable, optional): Creates the language model wrapper of each agent, see instantiate_agents.
+        checkpoint_dir (str, optional): Directory of the per-episode turn checkpoints. No checkpoints when None.
+
+    Returns:
+        dict: Counts of completed, skipped and failed episodes, the wall time and episodes per hour.
+    """
+    truncate_partial_line(output_path)
+    done = completed_ids(output_path)
+    stats = {"completed": 0, "skipped": 0, "failed": 0}
+    start = time.perf_counter()
+
+    with open(output_path, 'a') as output, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+
+        def collect(return_when):
+            finished, _ = wait(pending, return_when=return_when)
+            for future in finished:
+                episode_id = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"episode {episode_id} failed: {e!r}")
+                    continue
+                output.write(json.dumps(record) + "\n")
+                # flushed per episode so an interruption loses at most the episodes still running
+                output.flush()
+                os.fsync(output.fileno())
+                if checkpoint_dir and os.path.exists(checkpoint_path(checkpoint_dir, episode_id)):
+                    os.remove(checkpoint_path(checkpoint_dir, episode_id))
+                stats["completed"] += 1
+                print(f"episode {episode_id} done in {record['elapsed']:.1f}s ({stats['completed']} completed)")
+
+        for episode in read_narratives(narratives_path):
+            if episode["id"] in done:
+                stats["skipped"] += 1
+                continue
+            done.add(episode["id"])
+            # keep a bounded number of episodes in flight so a long stream is consumed as it arrives
+            if len(pending) >= concurrency:
+                collect(FIRST_COMPLETED)
+            future = executor.submit(run_episode, episode, scenario_file_path, iterations, augment, llm_factory, checkpoint_dir)
+            pending[future] = episode["id"]
+
+        if pending:
+            collect(ALL_COMPLETED)
+
+    stats["wall_time"] = time.perf_counter() - start
+    stats["episodes_per_hour"] = stats["completed"] / stats["wall_time"] * 3600 if stats["wall_time"] else 0.0
+    return stats
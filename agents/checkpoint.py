@@ -0,0 +1,221 @@
+import json
+import os
+
+from .llm_wrapper import ShotList
+
+VERSION = 1
+
+
+class SimulationCheckpoint:
+    """
+    Append-only snapshot log of a simulation: the agents' memories, the scene log, the turn counter and the latest script.
+
+    The first line is a header with the narrative and number of story beats. Every turn appends one JSON line
+    holding only what changed: the new scene log entries, the memory entries each agent gained (or its whole
+    memory when it was rewritten, e.g. by summarize_memory) and the script when the turn wrote one. Loading
+    replays the lines without calling a model, so a session resumes, is shared or restarts at any turn for
+    the cost of reading a small file.
+
+    Turns are numbered in RoundScheduler order. With the script writer / producer loop of simulate_episode,
+    turn t is the script writer's turn of beat t // 2 when t is even and the producer's critique when t is
+    odd, and turn 2 * iterations is the script writer's final revision.
+
+    Attributes:
+        path (str): The checkpoint file.
+        turns (int): Number of turns recorded.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initializes the SimulationCheckpoint. Nothing is written until start or record is called.
+
+        Args:
+            path (str): The checkpoint file.
+        """
+        self.path = path
+        self.turns = 0
+        self._scenes = 0
+        self._memories = {}
+
+    def exists(self) -> bool:
+        """
+        Returns whether the checkpoint file holds a header.
+        """
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def start(self, narrative: str, iterations: int, agents: list, all_scenes: list) -> None:
+        """
+        Starts a new checkpoint, replacing any earlier one at the same path.
+
+        Args:
+            narrative (str): What the episode is about.
+            iterations (int): Number of story beats.
+            agents (list[SyntheticAgent]): The agents taking turns.
+            all_scenes (list): The scene log so far, usually just the narrative.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        header = {
+            "type": "header",
+            "version": VERSION,
+            "narrative": narrative,
+            "iterations": iterations,
+            "scenes": list(all_scenes),
+            "memory": {agent.name: {"short": list(agent.short_memory), "long": list(agent.long_memory)} for agent in agents},
+        }
+        with open(self.path, 'w') as file:
+            file.write(json.dumps(header) + "\n")
+        self.turns = 0
+        self._scenes = len(all_scenes)
+        self._memories = {agent.name: (len(agent.short_memory), len(agent.long_memory)) for agent in agents}
+
+    def record(self, agent_name: str, agents: list, all_scenes: list, observation: str, script: ShotList = None) -> None:
+        """
+        Appends a turn and flushes it to disk.
+
+        Args:
+            agent_name (str): The agent whose turn it was.
+            agents (list[SyntheticAgent]): The agents taking turns.
+            all_scenes (list): The scene log after the turn.
+            observation (str): The latest producer critique or user note, which the next script writer turn revises against.
+            script (ShotList, optional): The script the turn wrote, if any.
+        """
+        memory = {}
+        for agent in agents:
+            short_seen, long_seen = self._memories.get(agent.name, (0, 0))
+            changes = {}
+            for field, memories, seen in (("short", agent.short_memory, short_seen), ("long", agent.long_memory, long_seen)):
+                if len(memories) >= seen:
+                    if len(memories) > seen:
+                        changes[field] = {"append": memories[seen:]}
+                else:
+                    # the memory was rewritten rather than extended
+                    changes[field] = {"set": list(memories)}
+            if changes:
+                memory[agent.name] = changes
+            self._memories[agent.name] = (len(agent.short_memory), len(agent.long_memory))
+
+        turn = {
+            "type": "turn",
+            "turn": self.turns,
+            "agent": agent_name,
+            "scenes": all_scenes[self._scenes:],
+            "memory": memory,
+            "observation": observation,
+            "script": script.to_json() if script is not None else None,
+        }
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(turn) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.turns += 1
+        self._scenes = len(all_scenes)
+
+    @staticmethod
+    def load(path: str, upto: int = None) -> dict:
+        """
+        Rebuilds the simulation state from a checkpoint file.
+
+        Args:
+            path (str): The checkpoint file.
+            upto (int, optional): Number of turns to replay. Every recorded turn when None.
+
+        Returns:
+            dict: "narrative", "iterations", "turns" (number replayed), "all_scenes", "memories" (agent name to
+                "short" and "long"), "observation", "script" (the latest ShotList or None) and "history" (agent
+                name and text of every replayed turn).
+        """
+        with open(path, 'r') as file:
+            lines = file.read().split("\n")
+
+        header = json.loads(lines[0])
+        if header.get("type") != "header" or header.get("version") != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} simulation checkpoint")
+
+        state = {
+            "narrative": header["narrative"],
+            "iterations": header["iterations"],
+            "turns": 0,
+            "all_scenes": list(header["scenes"]),
+            "memories": {name: {"short": list(memory["short"]), "long": list(memory["long"])} for name, memory in header["memory"].items()},
+            "observation": header["narrative"],
+            "script": None,
+            "history": [],
+        }
+        for line in lines[1:]:
+            if upto is not None and state["turns"] >= upto:
+                break
+            try:
+                turn = json.loads(line)
+            except json.JSONDecodeError:
+                # a turn cut short by a crash, the turns before it are complete
+                break
+            state["all_scenes"] += turn["scenes"]
+            for name, changes in turn["memory"].items():
+                memories = state["memories"].setdefault(name, {"short": [], "long": []})
+                for field, change in changes.items():
+                    if "set" in change:
+                        memories[field] = list(change["set"])
+                    else:
+                        memories[field] += change["append"]
+            state["observation"] = turn["observation"]
+            if turn["script"] is not None:
+                state["script"] = ShotList.from_json(json.dumps(turn["script"]))
+            state["history"].append((turn["agent"], turn["scenes"][-1] if turn["scenes"] else ""))
+            state["turns"] += 1
+        return state
+
+    def resume(self, agents: list, upto: int = None) -> dict:
+        """
+        Loads the checkpoint into the agents and continues appending to it.
+
+        Turns after `upto` are dropped from the file, so a simulation can be restarted at any earlier turn.
+
+        Args:
+            agents (list[SyntheticAgent]): The agents taking turns, their memories are replaced.
+            upto (int, optional): Number of turns to keep. Every recorded turn when None.
+
+        Returns:
+            dict: The simulation state, see load.
+        """
+        state = self.load(self.path, upto)
+        for agent in agents:
+            memories = state["memories"].get(agent.name, {"short": [], "long": []})
+            agent.short_memory = list(memories["short"])
+            agent.long_memory = list(memories["long"])
+
+        # rewrite the kept turns so later records follow the last complete one
+        with open(self.path, 'r') as file:
+            lines = file.read().split("\n")[:state["turns"] + 1]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+        self.turns = state["turns"]
+        self._scenes = len(state["all_scenes"])
+        self._memories = {agent.name: (len(agent.short_memory), len(agent.long_memory)) for agent in agents}
+        return state
+
+    def fork(self, path: str, upto: int = None) -> "SimulationCheckpoint":
+        """
+        Copies the first turns of the checkpoint to a new file, e.g. to share a session or try another direction from a turn.
+
+        Args:
+            path (str): The new checkpoint file.
+            upto (int, optional): Number of turns to copy. Every recorded turn when None.
+
+        Returns:
+            SimulationCheckpoint: The copy, not yet loaded into any agents.
+        """
+        with open(self.path, 'r') as file:
+            lines = [line for line in file.read().split("\n") if line]
+        if upto is not None:
+            lines = lines[:upto + 1]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            file.write("\n".join(lines) + "\n")
+        return SimulationCheckpoint(path)
@@ -1,11 +1,13 @@
 import os
 import json
 
-from google import genai
-from google.genai import types
-from openai import OpenAI
 from pydantic import BaseModel
 
+DEFAULT_MODELS = {
+    "openAI": "gpt-4o",
+    "gemini": "gemini-2.0-flash",
+}
+
 class Shot(BaseModel):
     shot_action: str
     txt2img_prompt: str
@@ -44,6 +46,14 @@ class ShotList(BaseModel):
         data = json.loads(json_str)
         shots = [Shot(**shot) for shot in data["shots"]]
         return cls(shots=shots)
+
+class ShotPrompt(BaseModel):
+    shot: int
+    image_prompt: str
+    video_prompt: str
+
+class ShotPromptList(BaseModel):
+    prompts: list[ShotPrompt]
         
 
     
@@ -53,30 +63,88 @@ class LLMWrapper:
     Wrapper class for different language models.
 
     Attributes:
-        llm (str): The language model to use.
-        client (OpenAI): The client for the OpenAI API.
+        llm (str): The language model to use. "openAI", "gemini" or "openai_compatible".
+        model (str): The model name sent with each request.
+        base_url (str): The server of the "openai_compatible" backend.
+        structured_output (str): How the "openai_compatible" backend constrains structured responses,
+            "json_schema" (response_format) or "guided_json" (vLLM extra_body).
+        client (OpenAI | genai.Client): The provider client, created on first use so that unused backends are never imported.
     """
 
-    def __init__(self, llm: str = "gemini") -> None:
+    def __init__(self, llm: str = "gemini", model: str = None, base_url: str = None, api_key: str = None, structured_output: str = "json_schema", timeout: float = 120.0) -> None:
         """
         Initializes the LLMWrapper with the specified language model.
 
         Args:
-            llm (str): The language model to use. Defaults to "openAI".
+            llm (str): The language model to use. Defaults to "gemini".
+            model (str, optional): The model name. Defaults to gpt-4o, gemini-2.0-flash, or LOCAL_LLM_MODEL for "openai_compatible".
+            base_url (str, optional): Server of the "openai_compatible" backend, e.g. http://localhost:8080/v1 for llama.cpp,
+                http://localhost:8000/v1 for vLLM or http://localhost:11434/v1 for Ollama. Defaults to LOCAL_LLM_BASE_URL.
+            api_key (str, optional): Key of the "openai_compatible" backend. Defaults to LOCAL_LLM_API_KEY, most local servers ignore it.
+            structured_output (str, optional): "json_schema" or "guided_json". Defaults to "json_schema".
+            timeout (float, optional): Request timeout of the "openai_compatible" backend in seconds. Defaults to 120.
         """
         self.llm = llm
+        self.model = model or DEFAULT_MODELS.get(llm)
+        self.base_url = base_url
+        self.api_key = api_key
+        self.structured_output = structured_output
+        self.timeout = timeout
+        self._client = None
+        # configuration errors are still raised here, only the client construction is deferred
         if self.llm == "openAI":
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
+            if not os.getenv("OPENAI_API_KEY"):
                 raise ValueError("OPENAI_API_KEY environment variable is not set.")
-            self.client = OpenAI()
         elif self.llm == "gemini":
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
+            self.api_key = os.getenv("GEMINI_API_KEY")
+            if not self.api_key:
                 raise ValueError("GEMINI_API_KEY environment variable is not set.")
-            self.client = genai.Client(api_key=api_key)
-        else:
-            self.client = None
+        elif self.llm == "openai_compatible":
+            self.base_url = base_url or os.getenv("LOCAL_LLM_BASE_URL")
+            if not self.base_url:
+                raise ValueError("base_url or the LOCAL_LLM_BASE_URL environment variable must be set.")
+            self.model = model or os.getenv("LOCAL_LLM_MODEL")
+            if not self.model:
+                raise ValueError("model or the LOCAL_LLM_MODEL environment variable must be set.")
+            self.api_key = api_key or os.getenv("LOCAL_LLM_API_KEY", "not-needed")
+
+    @property
+    def client(self):
+        """
+        The provider client, imported and created on first use.
+        """
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        """
+        Imports the provider SDK and creates its client.
+
+        Returns:
+            OpenAI | genai.Client: The client, or None for unknown backends.
+        """
+        if self.llm == "openAI":
+            from openai import OpenAI
+            return OpenAI()
+        elif self.llm == "gemini":
+            from google import genai
+            return genai.Client(api_key=self.api_key)
+        elif self.llm == "openai_compatible":
+            import httpx
+            from openai import OpenAI
+            # one pooled client per wrapper, so helper calls reuse warm keep-alive connections
+            http_client = httpx.Client(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16, keepalive_expiry=300),
+            )
+            return OpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                http_client=http_client,
+                max_retries=0,
+            )
+        return None
 
     def make_api_call(self, messages: list) -> str:
         # todo: make an error catch for when the API call fails
@@ -89,15 +157,16 @@ class LLMWrapper:
         Returns:
             str: The response from the language model.
         """
-        if self.llm == "openAI":
+        if self.llm in ("openAI", "openai_compatible"):
             response = self.client.chat.completions.create(
-                model="gpt-4o",
+                model=self.model,
                 messages=messages
             )
             return response.choices[0].message.content
         elif self.llm == "gemini":
+            from google.genai import types
             response = self.client.models.generate_content(
-                model="gemini-2.0-flash", 
+                model=self.model, 
                 contents=messages[1]["content"],
                 config=types.GenerateContentConfig(
                     system_instruction=messages[0]["content"]),
@@ -106,37 +175,51 @@ class LLMWrapper:
         else:
          return ""
     
-    def make_api_call_structured(self, messages: list) -> str:
+    def make_api_call_structured(self, messages: list, response_model: type = ShotList) -> str:
         """
         Makes an API call to the language model with the provided messages.
 
         Args:
             messages (list): The messages to send to the language model.
+            response_model (type, optional): The pydantic model the response is constrained to. Defaults to ShotList.
 
         Returns:
             str: The the structured response from the language model.
         """
         if self.llm == "openAI":
             response = self.client.beta.chat.completions.parse(
-                model="gpt-4o-2024-08-06",
+                model=self.model,
                 messages=messages,
-                response_format=ShotList
-                
+                response_format=response_model
             )
             return response.choices[0].message.parsed
+
+        elif self.llm == "openai_compatible":
+            schema = response_model.model_json_schema()
+            if self.structured_output == "guided_json":
+                constraint = {"extra_body": {"guided_json": schema}}
+            else:
+                constraint = {"response_format": {"type": "json_schema", "json_schema": {"name": response_model.__name__, "schema": schema, "strict": True}}}
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                **constraint
+            )
+            return response_model.model_validate_json(response.choices[0].message.content)
         
         elif self.llm == "gemini":
+            from google.genai import types
             response = self.client.models.generate_content(
-                model='gemini-2.0-flash',
+                model=self.model,
                 contents=messages[1]["content"],
                 config=types.GenerateContentConfig(
                     system_instruction=messages[0]["content"],
                     response_mime_type='application/json',
-                    response_schema=ShotList
+                    response_schema=response_model
                     )
             )
 
-            parsed = ShotList.from_json(response.text)
+            parsed = response_model.model_validate_json(response.text)
             return parsed
 
         return ""
\ No newline at end of file
@@ -0,0 +1,381 @@
+import copy
+import hashlib
+import os
+import re
+import tempfile
+import yaml
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .checkpoint import SimulationCheckpoint
+from .llm_wrapper import ShotList
+from .shot_agent import ShotAgent, split_script
+from tracing import in_context, span, trace_context
+
+REVISION_PROMPT = "please make the following changes to the orignal script: {notes}"
+CRITIQUE_PROMPT = "what do you think of : {script} tell the script writer what they should change"
+JUDGE_PROMPT = (
+    "Score this script from 0 to 10 for how compelling, clear and true to the brief it is. "
+    "Start your answer with the score, then give one sentence why.\n\n{script}"
+)
+SCORE = re.compile(r"\d+(?:\.\d+)?")
+# added to the script writer's prompt on the fork beat, so that the branches write different scripts
+BRANCH_PROMPT = "This is alternative {branch} of {branches}, {steer}."
+BRANCH_STEERS = [
+    "stay as close to the brief as you can",
+    "take the boldest creative risk you can",
+    "put the characters' feelings first",
+    "keep the pace as fast as you can",
+    "make it as visual as you can",
+]
+
+# a narrative longer than this is a finished script, which the writer breaks down chunk by chunk in parallel
+LONG_SCRIPT_CHARS = 6000
+LONG_SCRIPT_SHOTS_PER_CHUNK = 6
+
+# the script writer / producer loop, used when a scenario file has no rounds section
+DEFAULT_ROUNDS = [
+    {"agent": "script_writer", "writes_script": True},
+    {"agent": "producer", "after": ["script_writer"]},
+]
+
+
+class RoundScheduler:
+    """
+    Runs the story beats of a simulation with any number of synthetic agents.
+
+    Every beat, each agent in the round schedule takes one turn. Exactly one agent writes the script: it drafts
+    it from the narrative on the first beat and revises it against the previous beat's notes afterwards. A
+    narrative longer than LONG_SCRIPT_CHARS is taken as a finished script and broken down, see break_down_script. Every
+    other agent declares in `after` whose output of the same beat it needs, and gets the latest script and
+    those outputs. Agents whose dependencies have taken their turn run concurrently, so a beat takes as many
+    model calls in sequence as the dependency chain is deep, not as many as there are agents. The notes are the
+    outputs of the agents no one else depends on, e.g. the critiques of several critics reviewing the same draft.
+
+    Agents running concurrently see the same scene log. Their turns are appended to it, checkpointed and
+    reported in schedule order, so a run is reproducible whatever order the calls finish in. Turn t of a
+    run is the turn of order[t % len(order)] in beat t // len(order), and the last turn is the final revision.
+
+    Attributes:
+        turns (list[dict]): The round schedule: "agent", "after" (names), "prompt" (format string with
+            {script}, {inputs} and {narrative}) and "writes_script" of every turn.
+        agents (list[SyntheticAgent]): The agents of the schedule, in schedule order.
+        writer (SyntheticAgent): The agent writing the script.
+        waves (list[list[dict]]): The turns of a beat grouped by dependency depth, each wave runs concurrently.
+        order (list[str]): The agent of every turn of a beat, in the order turns are recorded.
+        notes (list[str]): The agents whose outputs the writer revises against on the next beat.
+    """
+
+    def __init__(self, agents: list, turns: list = None) -> None:
+        """
+        Initializes the RoundScheduler and checks the round schedule.
+
+        Args:
+            agents (list[SyntheticAgent]): The available agents, looked up by name.
+            turns (list[dict], optional): The round schedule, see the rounds section of scenario.yaml. The
+                script writer / producer loop when None.
+
+        Raises:
+            ValueError: When the schedule names an unknown agent, does not have exactly one script writer, or
+                its dependencies are missing or circular.
+        """
+        by_name = {agent.name: agent for agent in agents}
+        self.turns = []
+        for turn in DEFAULT_ROUNDS if turns is None else turns:
+            if turn["agent"] not in by_name:
+                raise ValueError(f"round schedule names unknown agent {turn['agent']!r}")
+            self.turns.append({
+                "agent": turn["agent"],
+                "after": list(turn.get("after", [])),
+                "prompt": turn.get("prompt", CRITIQUE_PROMPT),
+                "writes_script": bool(turn.get("writes_script", False)),
+            })
+
+        names = [turn["agent"] for turn in self.turns]
+        if len(set(names)) != len(names):
+            raise ValueError("every agent takes at most one turn per beat")
+        writers = [turn for turn in self.turns if turn["writes_script"]]
+        if len(writers) != 1:
+            raise ValueError(f"round schedule needs exactly one writes_script agent, got {len(writers)}")
+        if writers[0]["after"]:
+            raise ValueError("the script writer revises against the previous beat and cannot depend on this one")
+        for turn in self.turns:
+            if not turn["writes_script"] and not turn["after"]:
+                raise ValueError(f"{turn['agent']} must run after another agent, at least the script writer")
+            for name in turn["after"]:
+                if name not in names:
+                    raise ValueError(f"{turn['agent']} runs after {name!r}, which takes no turn")
+
+        # group the turns by dependency depth, keeping the schedule order within a wave
+        depth = {}
+        while len(depth) < len(self.turns):
+            ready = {turn["agent"]: max((depth[name] + 1 for name in turn["after"]), default=0)
+                     for turn in self.turns if turn["agent"] not in depth and all(name in depth for name in turn["after"])}
+            if not ready:
+                raise ValueError("round schedule dependencies are circular")
+            depth.update(ready)
+        self.waves = [[turn for turn in self.turns if depth[turn["agent"]] == d] for d in range(max(depth.values()) + 1)]
+        self.order = [turn["agent"] for wave in self.waves for turn in wave]
+        self.agents = [by_name[name] for name in self.order]
+        self.writer = by_name[writers[0]["agent"]]
+
+        depended_on = {name for turn in self.turns for name in turn["after"]}
+        self.notes = [name for name in self.order if name not in depended_on and name != self.writer.name]
+
+    @classmethod
+    def from_scenario(cls, yaml_file: str, agents: list) -> "RoundScheduler":
+        """
+        Creates the RoundScheduler of a scenario file.
+
+        Args:
+            yaml_file (str): Path to the scenario file. Its rounds section is the schedule, the script writer /
+                producer loop when it has none.
+            agents (list[SyntheticAgent]): The synthetic agents of the scenario, see instantiate_agents.
+
+        Returns:
+            RoundScheduler: The scheduler.
+        """
+        with open(yaml_file, 'r') as file:
+            config = yaml.safe_load(file)
+        return cls(agents, config.get('rounds'))
+
+    def total_turns(self, iterations: int) -> int:
+        """
+        Returns the number of turns of a run, the final revision included.
+        """
+        return len(self.order) * iterations + 1
+
+    def steps(self, narrative: str, iterations: int, all_scenes: list = None, checkpoint: SimulationCheckpoint = None, steer: dict = None):
+        """
+        Runs the simulation, yielding every turn once it is recorded.
+
+        Args:
+            narrative (str): What the episode is about.
+            iterations (int): Number of story beats.
+            all_scenes (list, optional): The scene log to append to. A new log starting with the narrative when None.
+            checkpoint (SimulationCheckpoint, optional): Every turn is appended to it. When it already holds turns of
+                the same narrative, the agents' memories and the scene log are restored from it and the simulation
+                continues after the last recorded turn instead of starting over.
+            steer (dict, optional): Text added to the script writer's prompt, by beat, e.g. the direction of a branch.
+                The final revision is beat `iterations`.
+
+        Yields:
+            tuple: The agent name, the text the turn added to the scene log, and the script when the turn wrote one.
+
+        Raises:
+            ValueError: When the checkpoint was recorded with a different round schedule.
+        """
+        if all_scenes is None:
+            all_scenes = [narrative]
+        observation = narrative
+        script = None
+        # the text of every turn so far, turn t of beat b is outputs[b * len(order) + t]
+        outputs = []
+
+        if checkpoint is not None:
+            if checkpoint.exists() and SimulationCheckpoint.load(checkpoint.path, 0)["narrative"] == narrative:
+                state = checkpoint.resume(self.agents)
+                expected = self.order * iterations + [self.writer.name]
+                if [agent_name for agent_name, _ in state["history"]] != expected[:state["turns"]]:
+                    raise ValueError(f"{checkpoint.path} was recorded with a different round schedule")
+                all_scenes[:] = state["all_scenes"]
+                observation = state["observation"]
+                script = state["script"]
+                outputs = [text for _, text in state["history"]]
+            else:
+                checkpoint.start(narrative, iterations, self.agents, all_scenes)
+
+        def notes(beat):
+            if beat < 0:
+                return narrative
+            start = beat * len(self.order)
+            return "\n\n".join(outputs[start + self.order.index(name)] for name in self.notes)
+
+        def writer_prompt(beat):
+            prompt = narrative if beat == 0 else REVISION_PROMPT.format(notes=notes(beat - 1))
+            if steer and beat in steer:
+                prompt += f"\n\n{steer[beat]}"
+            return prompt
+
+        for beat in range(iterations):
+            start = beat * len(self.order)
+            for wave in self.waves:
+                pending = [turn for turn in wave if start + self.order.index(turn["agent"]) >= len(outputs)]
+                if not pending:
+                    continue
+
+                prompts = []
+                for turn in pending:
+                    if turn["writes_script"]:
+                        prompts.append(writer_prompt(beat))
+                    else:
+                        inputs = "\n\n".join(outputs[start + self.order.index(name)] for name in turn["after"])
+                        prompts.append(turn["prompt"].format(script=script.to_str(), inputs=inputs, narrative=narrative))
+                scenes = list(all_scenes)
+
+                def take_turn(k):
+                    agent = self.agents[self.order.index(pending[k]["agent"])]
+                    with trace_context(beat=beat):
+                        if pending[k]["writes_script"] and beat == 0 and len(narrative) > LONG_SCRIPT_CHARS:
+                            return self.break_down_script(narrative)
+                        return agent.process_observation(prompts[k], scenes, use_structured=pending[k]["writes_script"])
+
+                if len(pending) == 1:
+                    results = [take_turn(0)]
+                else:
+                    with span("simulation.wave", beat=beat, agents=len(pending)), ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                        results = list(executor.map(in_context(take_turn), range(len(pending))))
+
+                for turn, result in zip(pending, results):
+                    if turn["writes_script"]:
+                        script = result
+                        text = script.to_str()
+                    else:
+                        text = result
+                    all_scenes.append(text)
+                    outputs.append(text)
+                    if turn["agent"] in self.notes:
+                        observation = "\n\n".join(outputs[start + self.order.index(name)] for name in self.notes
+                                                  if start + self.order.index(name) < len(outputs))
+                    if checkpoint is not None:
+                        checkpoint.record(turn["agent"], self.agents, all_scenes, observation, script if turn["writes_script"] else None)
+                    yield turn["agent"], text, script if turn["writes_script"] else None
+
+        if len(outputs) > len(self.order) * iterations:
+            # the final revision was already recorded
+            return
+        with trace_context(beat=iterations):
+            script = self.writer.process_observation(writer_prompt(iterations), all_scenes, use_structured=True)
+        if checkpoint is not None:
+            checkpoint.record(self.writer.name, self.agents, all_scenes + [script.to_str()], observation, script)
+        yield self.writer.name, script.to_str(), script
+
+    def break_down_script(self, script: str) -> ShotList:
+        """
+        Drafts the first script from a narrative that is a finished script, too long for one structured call.
+
+        The writer's model breaks it into LONG_SCRIPT_SHOTS_PER_CHUNK shots per chunk of whole scenes with
+        ShotAgent.break_down_script, and the shots describe the writer's character from its character sheet.
+
+        Args:
+            script (str): The script.
+
+        Returns:
+            ShotList: The draft, recorded in the writer's memory like any other.
+        """
+        num_shots = LONG_SCRIPT_SHOTS_PER_CHUNK * len(split_script(script, LONG_SCRIPT_CHARS))
+        draft = ShotAgent(llm=self.writer.llm).break_down_script(script, num_shots, [self.writer], LONG_SCRIPT_CHARS)
+        self.writer.short_memory.append(draft.to_str())
+        return draft
+
+    def run(self, narrative: str, iterations: int, all_scenes: list = None, on_turn=None, checkpoint: SimulationCheckpoint = None, steer: dict = None) -> ShotList:
+        """
+        Runs the simulation and returns the final revised script.
+
+        Args:
+            narrative (str): What the episode is about.
+            iterations (int): Number of story beats.
+            all_scenes (list, optional): The scene log to append to. A new log starting with the narrative when None.
+            on_turn (Callable, optional): Called as on_turn(agent_name, text) after every turn.
+            checkpoint (SimulationCheckpoint, optional): See steps.
+            steer (dict, optional): See steps.
+
+        Returns:
+            ShotList: The final script.
+        """
+        script = None
+        if checkpoint is not None and checkpoint.exists():
+            # a run whose final revision was recorded yields no turns
+            script = SimulationCheckpoint.load(checkpoint.path)["script"]
+        for agent_name, text, turn_script in self.steps(narrative, iterations, all_scenes, checkpoint, steer):
+            if turn_script is not None:
+                script = turn_script
+            if on_turn:
+                on_turn(agent_name, text)
+        return script
+
+    def branch(self, narrative: str, iterations: int, branches: int = 3, fork_at: int = 1, top_n: int = 1, judge=None, checkpoint_dir: str = None, on_turn=None) -> list[dict]:
+        """
+        Explores alternative scripts: runs the first beats once, then forks the simulation into branches that continue concurrently.
+
+        The shared prefix runs with this scheduler's agents and is checkpointed. Every branch resumes from a
+        copy of that checkpoint with its own copies of the agents, so it only pays for the beats after the fork.
+        On the fork beat, each branch adds its own direction from BRANCH_STEERS to the script writer's prompt,
+        so the branches diverge even with a deterministic model. The branches' prompts start with the shared
+        scene log, which lets provider prefix caching reuse it, and their agents share the language model
+        wrappers and their connections, but get their own empty semantic caches. Each final script is scored
+        by the judge, by default the agent whose notes the script writer revises against, e.g. the producer.
+
+        Checkpoints are kept per narrative and fork beat, so an interrupted run resumes its prefix and branches.
+
+        Args:
+            narrative (str): What the episode is about.
+            iterations (int): Number of story beats.
+            branches (int, optional): Number of branches. Defaults to 3.
+            fork_at (int, optional): Beat the branches diverge at, the beats before it are shared. Defaults to 1.
+            top_n (int, optional): Number of branches returned. Defaults to 1.
+            judge (BaseAgent, optional): Scores the final scripts with basic_api_call.
+            checkpoint_dir (str, optional): Directory of the prefix and branch checkpoints. A temporary directory when None.
+            on_turn (Callable, optional): Called as on_turn(branch, agent_name, text) after every turn, branch is None for the shared prefix.
+
+        Returns:
+            list[dict]: The best top_n branches, best first, each with "branch" (index), "script", "score" (None when the
+                verdict holds no number), "verdict" and "checkpoint" (path, None for a temporary directory).
+        """
+        fork_at = min(max(fork_at, 0), iterations)
+        fork_turn = fork_at * len(self.order)
+        if judge is None:
+            judge = self.agents[self.order.index(self.notes[-1])] if self.notes else self.writer
+
+        tmp_dir = None
+        if checkpoint_dir is None:
+            tmp_dir = tempfile.TemporaryDirectory()
+            checkpoint_dir = tmp_dir.name
+        name = f"{hashlib.sha256(narrative.encode()).hexdigest()[:12]}_fork{fork_at}"
+
+        try:
+            prefix = SimulationCheckpoint(os.path.join(checkpoint_dir, f"{name}_prefix.jsonl"))
+            if not prefix.exists() or SimulationCheckpoint.load(prefix.path, 0)["narrative"] != narrative:
+                prefix.start(narrative, iterations, self.agents, [narrative])
+            if SimulationCheckpoint.load(prefix.path)["turns"] < fork_turn:
+                with span("simulation.prefix", turns=fork_turn):
+                    for agent_name, text, _ in self.steps(narrative, iterations, checkpoint=prefix):
+                        if on_turn:
+                            on_turn(None, agent_name, text)
+                        if prefix.turns >= fork_turn:
+                            break
+
+            def run_branch(k):
+                path = os.path.join(checkpoint_dir, f"{name}_branch{k}.jsonl")
+                if not os.path.exists(path):
+                    prefix.fork(path, fork_turn)
+                # the copies get their own memories when the checkpoint is resumed, and share the llm
+                agents = [copy.copy(agent) for agent in self.agents]
+                for agent in agents:
+                    if agent.cache is not None:
+                        agent.cache = agent.cache.empty()
+                scheduler = RoundScheduler(agents, self.turns)
+                steer = BRANCH_PROMPT.format(branch=k + 1, branches=branches, steer=BRANCH_STEERS[k % len(BRANCH_STEERS)])
+                with trace_context(branch=k):
+                    script = scheduler.run(narrative, iterations, on_turn=(lambda agent_name, text: on_turn(k, agent_name, text)) if on_turn else None,
+                                           checkpoint=SimulationCheckpoint(path), steer={fork_at: steer})
+                    # near-identical scripts of other branches must not share a verdict
+                    verdict = judge.basic_api_call(JUDGE_PROMPT.format(script=script.to_str()), use_cache=False)
+                match = SCORE.search(verdict)
+                return {
+                    "branch": k,
+                    "script": script,
+                    "score": float(match.group()) if match else None,
+                    "verdict": verdict,
+                    "checkpoint": None if tmp_dir else path,
+                }
+
+            with span("simulation.branches", branches=branches, fork_turn=fork_turn), ThreadPoolExecutor(max_workers=max(1, branches)) as executor:
+                results = list(executor.map(in_context(run_branch), range(branches)))
+        finally:
+            if tmp_dir is not None:
+                tmp_dir.cleanup()
+
+        # unscored branches go last, ties keep the branch order
+        results.sort(key=lambda result: -result["score"] if result["score"] is not None else float("inf"))
+        return results[:top_n]
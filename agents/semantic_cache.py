@@ -0,0 +1,174 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+
+def hashed_embedding(text: str, dim: int = 1024) -> np.ndarray:
+    """
+    Embeds a text as L2-normalized counts of its words and character trigrams, hashed into dim buckets.
+
+    Near-identical prompts share most of their words and trigrams, so their cosine similarity is close to 1,
+    while texts about different things fall well below. It needs no model or provider call.
+
+    Args:
+        text (str): The text.
+        dim (int, optional): Number of buckets. Defaults to 1024.
+
+    Returns:
+        np.ndarray: The float32 embedding.
+    """
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    features = text.split(" ") + [text[i:i + 3] for i in range(len(text) - 2)]
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        h = zlib.crc32(feature.encode())
+        # the sign bit keeps colliding features from only ever adding up
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """
+    Reuses the response to an earlier query when a new query is nearly the same.
+
+    Queries are embedded and kept as the rows of one matrix, so a lookup is a single matrix-vector product
+    over every stored query. The stored response of the most similar query is returned when its cosine
+    similarity reaches the threshold. Exact repeats are answered from a dict without embedding. Once
+    max_entries queries are stored, the least recently used one is replaced.
+
+    It is safe to share between threads.
+
+    Attributes:
+        threshold (float): Lowest cosine similarity at which a stored response is reused.
+        max_entries (int): Number of queries kept.
+        dim (int): Size of the embeddings.
+        embed (Callable): Embeds a text as a normalized vector of size dim.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that were not.
+        evictions (int): Entries replaced to stay within max_entries.
+    """
+
+    def __init__(self, threshold: float = 0.97, max_entries: int = 1024, dim: int = 1024, embed=None) -> None:
+        """
+        Initializes the SemanticCache.
+
+        Args:
+            threshold (float, optional): Lowest cosine similarity at which a stored response is reused, 1 only reuses
+                exact repeats. Prompts that differ in a single word, e.g. "clue number 1" and "clue number 2",
+                score about 0.95, while punctuation and whitespace changes score above 0.98. Defaults to 0.97.
+            max_entries (int, optional): Number of queries kept. Defaults to 1024.
+            dim (int, optional): Size of the embeddings. Defaults to 1024.
+            embed (Callable, optional): Embeds a text as a normalized vector of size dim. hashed_embedding when None.
+
+        Raises:
+            ValueError: When max_entries is less than 1.
+        """
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.dim = dim
+        self.embed = embed or (lambda text: hashed_embedding(text, dim))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._queries = []
+        self._responses = []
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._rows = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> str:
+        """
+        Looks up the response of the most similar stored query.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            str: The stored response, or None when no stored query is similar enough.
+        """
+        with self._lock:
+            row = self._rows.get(query)
+            if row is not None:
+                return self._hit(row)
+        # embed outside the lock, it is the slow part
+        vector = self.embed(query)
+        with self._lock:
+            if self._queries:
+                similarities = self._vectors[:len(self._queries)] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    return self._hit(best)
+            self.misses += 1
+            return None
+
+    def _hit(self, row: int) -> str:
+        """
+        Counts a hit on a row and marks it as recently used. Called with the lock held.
+        """
+        self._clock += 1
+        self.hits += 1
+        self._last_used[row] = self._clock
+        return self._responses[row]
+
+    def put(self, query: str, response: str) -> None:
+        """
+        Stores the response to a query, replacing the least recently used entry when the cache is full.
+
+        Args:
+            query (str): The query.
+            response (str): The response.
+        """
+        vector = self.embed(query)
+        with self._lock:
+            self._clock += 1
+            row = self._rows.get(query)
+            if row is None:
+                if len(self._queries) < self.max_entries:
+                    row = len(self._queries)
+                    self._queries.append(query)
+                    self._responses.append(response)
+                else:
+                    row = int(np.argmin(self._last_used))
+                    del self._rows[self._queries[row]]
+                    self._queries[row] = query
+                    self._responses[row] = response
+                    self.evictions += 1
+                self._rows[query] = row
+            else:
+                self._responses[row] = response
+            self._vectors[row] = vector
+            self._last_used[row] = self._clock
+
+    def empty(self) -> "SemanticCache":
+        """
+        Returns a new, empty cache with the same threshold, size and embedding.
+        """
+        return SemanticCache(self.threshold, self.max_entries, self.dim, self.embed)
+
+    def stats(self) -> dict:
+        """
+        Returns the hits, misses, hit rate, evictions and number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._queries),
+        }
+
+    def format_stats(self) -> str:
+        """
+        Summarizes the stats on one line.
+        """
+        stats = self.stats()
+        return (f"{stats['hits']}/{stats['hits'] + stats['misses']} hits ({100 * stats['hit_rate']:.0f}%), "
+                f"{stats['entries']} entries, {stats['evictions']} evicted")
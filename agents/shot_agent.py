@@ -1,14 +1,75 @@
 import os
+import re
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from .base_agent import BaseAgent
+from .llm_wrapper import Shot, ShotList
 from .synthetic_agent import SyntheticAgent
+from tracing import in_context, traced
 
 from pydantic import BaseModel
 
+# a line opening a new scene, e.g. "INT. BOB'S LIVING ROOM - DAY", "EXT ROOFTOP", "Scene 3" or "Shot 4"
+SCENE_HEADING = re.compile(r"^\s*(?:INT[./]|EXT[./]|INT\b|EXT\b|(?:scene|shot)\s+\d+)", re.IGNORECASE | re.MULTILINE)
+# a "Shot 3:" style label the model may prefix to an action, numbered within its chunk
+SHOT_LABEL = re.compile(r"^\s*shot\s*\d+\s*[:.\-]\s*", re.IGNORECASE)
+
 class Txt2ImgPrompt(BaseModel):
     prompt: str
 
+def split_script(script: str, max_chars: int = 6000) -> List[str]:
+    """
+    Splits a script into chunks of whole scenes.
+
+    Consecutive scenes are packed into the same chunk while it stays under max_chars. A scene longer than
+    max_chars becomes a chunk of its own. Scripts without scene headings are split on blank lines instead.
+
+    Args:
+        script (str): The script.
+        max_chars (int, optional): Soft limit on the length of a chunk. Defaults to 6000.
+
+    Returns:
+        List[str]: The chunks, in script order.
+    """
+    starts = [match.start() for match in SCENE_HEADING.finditer(script)]
+    if starts:
+        # text before the first heading, e.g. a title, stays with the first scene
+        starts[0] = 0
+        scenes = [script[start:end] for start, end in zip(starts, starts[1:] + [len(script)])]
+    else:
+        scenes = re.split(r"\n\s*\n", script)
+    scenes = [scene.strip() for scene in scenes if scene.strip()]
+
+    chunks = []
+    for scene in scenes:
+        if chunks and len(chunks[-1]) + len(scene) + 2 <= max_chars:
+            chunks[-1] += "\n\n" + scene
+        else:
+            chunks.append(scene)
+    return chunks
+
+def allocate_shots(chunks: List[str], num_shots: int) -> List[int]:
+    """
+    Splits the shot budget over the chunks in proportion to their length, at least one shot each.
+
+    Args:
+        chunks (List[str]): The script chunks, no more of them than num_shots.
+        num_shots (int): The total number of shots.
+
+    Returns:
+        List[int]: Number of shots per chunk, summing to num_shots.
+    """
+    total = sum(len(chunk) for chunk in chunks)
+    spare = num_shots - len(chunks)
+    shares = [spare * len(chunk) / total for chunk in chunks]
+    counts = [1 + int(share) for share in shares]
+    # hand the shots lost to rounding down to the largest remainders
+    by_remainder = sorted(range(len(chunks)), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_remainder[:num_shots - sum(counts)]:
+        counts[i] += 1
+    return counts
+
 class ShotAgent(BaseAgent):
     """
     Agent that breaks a script into a series of shots and generates txt2img prompts.
@@ -17,14 +78,24 @@ class ShotAgent(BaseAgent):
         script (str): The script to be broken into shots.
     """
 
-    def __init__(self, config_file: str = None) -> None:
+    def __init__(self, config_file: str = None, llm=None) -> None:
         """
         Initializes the ShotAgent with a configuration file.
 
         Args:
             config_file (str): Path to the configuration file.
+            llm (LLMWrapper): The language model wrapper to use. A Gemini LLMWrapper is created when None.
+        """
+        super().__init__(config_file, llm)
+
+    def default_config(self) -> dict:
         """
-        super().__init__(config_file)
+        Provides the configuration used without a config file.
+
+        Returns:
+            dict: Default configuration dictionary.
+        """
+        return {"name": "shot_agent", "system_prompt": "You break scripts into shots."}
 
     def generate_shots(self, script_file: str, num_shots: int, characters: List[SyntheticAgent]) -> List[str]:
         """
@@ -60,7 +131,7 @@ class ShotAgent(BaseAgent):
                   "EXAMPLE OUTPUT PROMPT: "
                   "CMBND, "
                   f"characters: Alex, Bob, "
-                  f"composition: Shot of Alex and Bob, wide shot, Bob has dark hair  in a buzz cut, and a five o clock shadow. He is wearing a baggy gray t-shirt, baggy, blue jeans. He has olive skin. Alex has has medium length blonde hair. He is wearing a green sweater, black jeans, and boots. He has pale white skin.  " 
+                  f"composition: Shot of Alex and Bob, wide shot, Bob has dark hair  in a buzz cut, and a five o clock shadow. He is wearing a baggy gray t-shirt, baggy, blue jeans. He has olive skin. Alex has has medium length blonde hair. He is wearing a green sweater, black jeans, and boots. He has pale white skin.  "
                    "action: The two are screaming at eachother in a modern apartment."
                    "environment: The apartment is a luxury apartment in brooklyn."
               )
@@ -70,5 +141,116 @@ class ShotAgent(BaseAgent):
         ]
         print(messages)
         response = self.llm.make_api_call(messages)
-        shots = response.split('\n')
-        return shots
\ No newline at end of file
+        # blank lines between prompts are not shots
+        shots = [line.strip() for line in response.split('\n') if line.strip()]
+        return shots
+
+    def generate_shot_list(self, script_file: str, num_shots: int, characters: List[SyntheticAgent], max_chunk_chars: int = 6000, concurrency: int = 8) -> ShotList:
+        """
+        Breaks a script file into a structured list of shots, see break_down_script.
+
+        Args:
+            script_file (str): Path to the script file to be broken into shots.
+            num_shots (int): The number of shots to generate.
+            characters (List[SyntheticAgent]): The characters appearing in the script, described the same way in every prompt.
+            max_chunk_chars (int, optional): Soft limit on the script length sent per call. Defaults to 6000.
+            concurrency (int, optional): Number of chunks broken down at the same time. Defaults to 8.
+
+        Returns:
+            ShotList: The shots, in script order.
+        """
+        if not os.path.isfile(script_file):
+            raise FileNotFoundError(f"The file {script_file} does not exist.")
+
+        with open(script_file, 'r') as file:
+            script = file.read()
+        return self.break_down_script(script, num_shots, characters, max_chunk_chars, concurrency)
+
+    def break_down_script(self, script: str, num_shots: int, characters: List[SyntheticAgent], max_chunk_chars: int = 6000, concurrency: int = 8) -> ShotList:
+        """
+        Breaks a script into a structured list of shots, map-reduce style so long scripts take about as long as short ones.
+
+        The script is split into chunks of whole scenes and each chunk gets a share of the shots in proportion to
+        its length (map). The chunks are broken down in parallel, each with the same character sheet, and their
+        shots are joined in script order (reduce). A script shorter than max_chunk_chars takes a single call.
+
+        Args:
+            script (str): The script.
+            num_shots (int): The number of shots to generate.
+            characters (List[SyntheticAgent]): The characters appearing in the script, described the same way in every prompt.
+            max_chunk_chars (int, optional): Soft limit on the script length sent per call. Defaults to 6000.
+            concurrency (int, optional): Number of chunks broken down at the same time. Defaults to 8.
+
+        Returns:
+            ShotList: The shots, in script order.
+        """
+        chunks = split_script(script, max_chunk_chars)
+        if not chunks:
+            return ShotList(shots=[])
+        if len(chunks) > num_shots:
+            # every chunk needs at least one shot, so join neighbouring chunks down to num_shots
+            chunks = ["\n\n".join(chunks[i * len(chunks) // num_shots:(i + 1) * len(chunks) // num_shots]) for i in range(num_shots)]
+        counts = allocate_shots(chunks, num_shots)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+            # map keeps the chunk order whatever order the calls finish in
+            parts = list(executor.map(
+                in_context(lambda i: self._break_down_chunk(chunks[i], i, len(chunks), counts[i], characters)),
+                range(len(chunks)),
+            ))
+
+        shots = [shot for part in parts for shot in part.shots]
+        return ShotList(shots=[self._normalize_shot(shot, characters) for shot in shots])
+
+    @traced("agent.shot_breakdown", lambda self, chunk, index, total, num_shots, characters: {"chunk": index, "shots": num_shots})
+    def _break_down_chunk(self, chunk: str, index: int, total: int, num_shots: int, characters: List[SyntheticAgent]) -> ShotList:
+        """
+        Breaks one chunk of the script into shots.
+
+        Args:
+            chunk (str): The scenes of the chunk.
+            index (int): Position of the chunk in the script.
+            total (int): Number of chunks in the script.
+            num_shots (int): The number of shots to generate for the chunk.
+            characters (List[SyntheticAgent]): The characters appearing in the script.
+
+        Returns:
+            ShotList: The shots of the chunk.
+        """
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    f"You are a bot that breaks scenes of a script into a series of shots. Each shot has a shot_action describing what happens, "
+                    "a single line txt2img_prompt for FLUX and the vo spoken over it. "
+                    "Each txt2img_prompt follows the structure: characters: <names>, composition: <framing and how each character looks>, "
+                    "action: <what they are doing>, environment: <where it happens>. "
+                    "Describe every character exactly as in the character sheet below, so they look the same in every shot.\n"
+                    f"CHARACTER SHEET:\n{self._character_sheet(characters)}"
+                ),
+            },
+            {"role": "user", "content": f"These are the scenes of part {index + 1} of {total} of the script:\n{chunk}\n\nBreak them into precisely {num_shots} shots, in script order. Do not mix two shots together."},
+        ]
+        return self.llm.make_api_call_structured(messages)
+
+    @staticmethod
+    def _character_sheet(characters: List[SyntheticAgent]) -> str:
+        """
+        Describes each character on one line: its character name, LoRA trigger words and caption.
+        """
+        if not characters:
+            return "No recurring characters."
+        return "\n".join(f"{character.character_name}: {character.lora_key_word}, {character.flux_caption}" for character in characters)
+
+    @staticmethod
+    def _normalize_shot(shot: Shot, characters: List[SyntheticAgent]) -> Shot:
+        """
+        Drops the per-chunk "Shot N:" numbering and makes sure every character named in the shot carries its caption.
+        """
+        prompt = SHOT_LABEL.sub("", shot.txt2img_prompt)
+        for character in characters:
+            # the agent name, e.g. script_writer, is not what the script calls the character
+            named = character.character_name.lower() in f"{shot.shot_action} {prompt}".lower()
+            if named and character.flux_caption not in prompt:
+                prompt += f" {character.character_name}: {character.lora_key_word}, {character.flux_caption}"
+        return Shot(shot_action=SHOT_LABEL.sub("", shot.shot_action), txt2img_prompt=prompt, vo=shot.vo)
@@ -0,0 +1,102 @@
+from .checkpoint import SimulationCheckpoint
+from .llm_wrapper import ShotList, ShotPromptList
+from .rounds import RoundScheduler
+from .synthetic_agent import SyntheticAgent
+from tracing import span, trace_context
+
+
+def simulate_episode(script_writer: SyntheticAgent, producer: SyntheticAgent, narrative: str, iterations: int, all_scenes: list = None, on_turn=None, checkpoint: SimulationCheckpoint = None) -> ShotList:
+    """
+    Runs the script writer / producer loop and returns the final revised script.
+
+    Scenarios with more agents use RoundScheduler.from_scenario instead.
+
+    Args:
+        script_writer (SyntheticAgent): The agent writing the script.
+        producer (SyntheticAgent): The agent critiquing the script.
+        narrative (str): What the episode is about.
+        iterations (int): Number of write / critique rounds.
+        all_scenes (list, optional): The scene log to append to. A new log starting with the narrative when None.
+        on_turn (Callable, optional): Called as on_turn(agent_name, text) after every turn.
+        checkpoint (SimulationCheckpoint, optional): Every turn is appended to it. When it already holds turns of
+            the same narrative, the agents' memories and the scene log are restored from it and the simulation
+            continues after the last recorded turn instead of starting over.
+
+    Returns:
+        ShotList: The final script.
+    """
+    return RoundScheduler([script_writer, producer]).run(narrative, iterations, all_scenes, on_turn, checkpoint)
+
+
+def augment_prompts(script: ShotList, script_writer: SyntheticAgent, img_prompt_agent) -> ShotList:
+    """
+    Rewrites the image prompt of every shot with the image prompt helper agent, adding the LoRA keyword and costume caption.
+
+    Args:
+        script (ShotList): The script to update in place.
+        script_writer (SyntheticAgent): The agent holding the LoRA keyword and costume caption.
+        img_prompt_agent (BaseAgent): The helper agent augmenting the prompts.
+
+    Returns:
+        ShotList: The updated script.
+    """
+    for i, shot in enumerate(script.shots):
+        with trace_context(shot=i):
+            augmented_prompt = img_prompt_agent.basic_api_call(shot.txt2img_prompt)
+        shot.txt2img_prompt = f"{script_writer.lora_key_word},\n\n {augmented_prompt}, \n\n Costume: {script_writer.flux_caption}"
+    return script
+
+
+def augment_shot_prompts(script: ShotList, script_writer: SyntheticAgent, img_prompt_agent, vid_prompt_agent) -> list:
+    """
+    Writes the image and video prompts of every shot in a single structured call instead of two calls per shot.
+
+    The request combines the system prompts of both helper agents and returns an image and a video prompt per
+    shot. Shots missing from the response, or with an empty prompt, fall back to the helper agents' own calls.
+
+    Args:
+        script (ShotList): The script to update in place. The image prompts get the LoRA keyword and costume caption.
+        script_writer (SyntheticAgent): The agent holding the LoRA keyword and costume caption.
+        img_prompt_agent (BaseAgent): The helper agent augmenting the image prompts.
+        vid_prompt_agent (BaseAgent): The helper agent writing the video prompts.
+
+    Returns:
+        list: The video prompt of every shot.
+    """
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You write two prompts for every shot of a script: an image_prompt for a text to image model and a video_prompt for an image to video model "
+                "animating that image. Return exactly one entry per shot with its shot number.\n\n"
+                f"IMAGE PROMPT INSTRUCTIONS:\n{img_prompt_agent.config['system_prompt']}\n\n"
+                f"VIDEO PROMPT INSTRUCTIONS:\n{vid_prompt_agent.config['system_prompt']}"
+            ),
+        },
+        {"role": "user", "content": "\n".join(f"shot {i}: {shot.txt2img_prompt}" for i, shot in enumerate(script.shots))},
+    ]
+
+    prompts = {}
+    try:
+        with span("agent.augment_shot_prompts", shots=len(script.shots)):
+            response = img_prompt_agent.llm.make_api_call_structured(messages, ShotPromptList)
+        for prompt in response.prompts:
+            # a shot answered twice is ambiguous, so neither answer is used
+            prompts[prompt.shot] = None if prompt.shot in prompts else prompt
+    except Exception as e:
+        print(f"combined prompt augmentation failed, falling back to per-shot calls: {e!r}")
+
+    vid_texts = []
+    for i, shot in enumerate(script.shots):
+        prompt = prompts.get(i)
+        with trace_context(shot=i):
+            if prompt is not None and prompt.image_prompt.strip():
+                augmented_prompt = prompt.image_prompt.strip()
+            else:
+                augmented_prompt = img_prompt_agent.basic_api_call(shot.txt2img_prompt)
+            if prompt is not None and prompt.video_prompt.strip():
+                vid_texts.append(prompt.video_prompt.strip())
+            else:
+                vid_texts.append(vid_prompt_agent.basic_api_call(shot.txt2img_prompt))
+        shot.txt2img_prompt = f"{script_writer.lora_key_word},\n\n {augmented_prompt}, \n\n Costume: {script_writer.flux_caption}"
+    return vid_texts
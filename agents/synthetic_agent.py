@@ -2,6 +2,7 @@ import json
 
 from typing import List
 from .base_agent import BaseAgent
+from tracing import traced
 from pydantic import BaseModel
 
 class SyntheticAgent(BaseAgent):
@@ -9,19 +10,23 @@ class SyntheticAgent(BaseAgent):
     Agent that handles synthetic memory and processing.
 
     Attributes:
+        character_name (str): The name the script calls the agent's character, e.g. "Taylor Trace". The
+            config's character_name, the agent name when it has none.
         short_memory (List[str]): Short-term memory.
         long_memory (List[str]): Long-term memory.
     """
 
-    def __init__(self, config_file: str) -> None:
+    def __init__(self, config_file: str, llm=None) -> None:
         """
         Initializes the SyntheticAgent with a configuration file.
 
         Args:
             config_file (str): Path to the configuration file.
+            llm (LLMWrapper): The language model wrapper to use. A Gemini LLMWrapper is created when None.
         """
-        super().__init__(config_file)
+        super().__init__(config_file, llm)
         self.name = self.config["name"]
+        self.character_name = self.config.get("character_name", self.name)
         self.lora_key_word = self.config["lora_key_word"]
         self.flux_caption = self.config["flux_caption"]
         self.base_observations = self.config["base_observations"]
@@ -73,6 +78,7 @@ class SyntheticAgent(BaseAgent):
         self.long_memory.append(response)
         return response
 
+    @traced("agent.process_observation", lambda self, observation, scene, use_structured=False: {"agent": self.name, "structured": use_structured})
     def process_observation(
         self, observation: str, scene: list[str], use_structured:bool=False
     ) -> str:
@@ -0,0 +1,70 @@
+"""
+Compares the moviepy two-pass assembly in utils.py against AssemblyEngine on locally synthesized clips.
+
+Example:
+    python -m benchmarks.assembly --num_shots 6
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from content_generation.assembly import AssemblyEngine, ffmpeg_exe
+
+parser = argparse.ArgumentParser(description="Final cut assembly benchmark")
+parser.add_argument('--num_shots', type=int, default=6, help='Number of shots in the timeline')
+parser.add_argument('--clip_duration', type=float, default=10.0, help='Length of each synthesized video clip in seconds')
+parser.add_argument('--vo_duration', type=float, default=6.0, help='Length of each synthesized VO in seconds')
+parser.add_argument('--size', type=str, default='1280x720', help='Resolution of the synthesized clips')
+parser.add_argument('--skip_moviepy', action='store_true', help='Only time the assembly engine')
+
+args = parser.parse_args()
+
+ffmpeg = ffmpeg_exe()
+
+
+def synthesize(tmp_dir):
+    """
+    Writes h264 test pattern clips and mp3 tones, like the Kling and ElevenLabs outputs.
+    """
+    shots = []
+    for i in range(args.num_shots):
+        video_path = os.path.join(tmp_dir, f"{i}_img2video.mp4")
+        audio_path = os.path.join(tmp_dir, f"{i}.mp3")
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"testsrc2=size={args.size}:rate=24:duration={args.clip_duration}",
+                        "-c:v", "libx264", "-pix_fmt", "yuv420p", video_path], check=True)
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency={220 + 40 * i}:duration={args.vo_duration - 0.3 * i}",
+                        "-c:a", "libmp3lame", audio_path], check=True)
+        shots.append((video_path, audio_path))
+    return shots
+
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    shots = synthesize(tmp_dir)
+    engine = AssemblyEngine()
+
+    start = time.perf_counter()
+    engine.assemble(shots, os.path.join(tmp_dir, "engine_copy.mp4"))
+    copy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine._assemble_encode(engine.plan(shots)["segments"], os.path.join(tmp_dir, "engine_encode.mp4"))
+    encode_time = time.perf_counter() - start
+
+    print(f"assembly engine, stream copy: {copy_time:.1f}s")
+    print(f"assembly engine, single encode: {encode_time:.1f}s")
+
+    if not args.skip_moviepy:
+        from utils import combine_video_audio, concatenate_videos
+
+        start = time.perf_counter()
+        combined = []
+        for i, (video_path, audio_path) in enumerate(shots):
+            combined.append(os.path.join(tmp_dir, f"combined_{i}.mp4"))
+            combine_video_audio(video_path, audio_path, combined[-1])
+        concatenate_videos(combined, os.path.join(tmp_dir, "moviepy.mp4"))
+        moviepy_time = time.perf_counter() - start
+
+        print(f"moviepy, two encodes: {moviepy_time:.1f}s")
+        print(f"speedup: {moviepy_time / copy_time:.1f}x stream copy, {moviepy_time / encode_time:.1f}x single encode")
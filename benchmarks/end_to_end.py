@@ -0,0 +1,272 @@
+"""
+End-to-end benchmark of the script generation and full agentic pipelines with deterministic local stand-ins.
+
+Runs the same stages as script_generation.py and full_agentic_flow.py with fake LLM, video and TTS
+providers (and either a fake or a tiny CPU Flux image generator), then reports wall time, calls and
+time per stage, approximate tokens, peak memory and throughput. Results are saved as JSON and can be
+compared against an earlier run.
+
+Example:
+    python -m benchmarks.end_to_end --episodes 2 --llm_latency lognormal:0.5:0.3 --output bench.json
+    python -m benchmarks.end_to_end --episodes 2 --llm_latency lognormal:0.5:0.3 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+from collections import Counter
+
+from agents import get_agent_by_name, instantiate_agents, simulate_episode
+from agents.llm_wrapper import ShotList
+from content_generation.assembly import AssemblyEngine
+from production.fakes import FakeImageGen, FakeLLMWrapper, FakeTTSWrapper, FakeVideoWrapper
+
+parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark")
+parser.add_argument('--pipeline', type=str, default='both', choices=['script', 'full', 'both'], help='Which pipelines to run')
+parser.add_argument('--episodes', type=int, default=1, help='Number of episodes per pipeline')
+parser.add_argument('--iterations', type=int, default=3, help='Number of story beats')
+parser.add_argument('--scenario_file_path', type=str, default='config_files/scenario.yaml', help='Path to the scenario file')
+parser.add_argument('--shot_list', type=str, default=None, help='script.json whose shots the fake script writer returns')
+parser.add_argument('--llm_latency', type=str, default='0', help='LLM latency, a number of seconds or kind:mean:spread')
+parser.add_argument('--image_latency', type=str, default='0', help='Fake image latency')
+parser.add_argument('--video_latency', type=str, default='0', help='Video latency')
+parser.add_argument('--tts_latency', type=str, default='0', help='TTS latency')
+parser.add_argument('--image', type=str, default='fake', choices=['fake', 'tiny_flux'], help='Fake images or a tiny Flux model on the CPU')
+parser.add_argument('--seed', type=int, default=0, help='Seed of the latency distributions')
+parser.add_argument('--output', type=str, default='bench_results.json', help='Where to save the results')
+parser.add_argument('--compare', type=str, default=None, help='Earlier results to compare against')
+
+args = parser.parse_args()
+
+
+class StageTimer:
+    """
+    Records wall time and provider calls per stage.
+
+    Attributes:
+        providers (dict): Name to stand-in provider, each with a `calls` counter.
+        stages (dict): Stage name to {"time", "calls"} totals.
+    """
+
+    def __init__(self, providers: dict) -> None:
+        """
+        Initializes the StageTimer.
+
+        Args:
+            providers (dict): Name to stand-in provider, each with a `calls` counter.
+        """
+        self.providers = providers
+        self.stages = {}
+
+    def calls(self) -> Counter:
+        """
+        Reads the current call count of every provider.
+        """
+        return Counter({name: provider.calls for name, provider in self.providers.items()})
+
+    def stage(self, name: str):
+        """
+        Context manager adding the time and calls of its block to a stage.
+
+        Args:
+            name (str): The stage name.
+        """
+        timer = self
+
+        class Stage:
+            def __enter__(self):
+                self.start = time.perf_counter()
+                self.calls = timer.calls()
+
+            def __exit__(self, *exc):
+                entry = timer.stages.setdefault(name, {"time": 0.0, "calls": Counter()})
+                entry["time"] += time.perf_counter() - self.start
+                entry["calls"] += timer.calls() - self.calls
+
+        return Stage()
+
+
+llms = []
+
+def llm_factory():
+    shot_list = None
+    if args.shot_list:
+        with open(args.shot_list) as file:
+            shot_list = ShotList.from_json(file.read())
+    llm = FakeLLMWrapper(args.llm_latency, shot_list=shot_list, seed=args.seed + len(llms))
+    llms.append(llm)
+    return llm
+
+
+class LLMCalls:
+    """
+    Sums the calls of every fake LLM created so far.
+    """
+
+    @property
+    def calls(self):
+        return sum(llm.calls for llm in llms)
+
+
+if args.image == "tiny_flux":
+    from content_generation import FluxWrapper
+    image_gen = FluxWrapper("hf-internal-testing/tiny-flux-pipe", [], device="cpu")
+    image_gen.calls = 0
+    generate_images = image_gen.generate_images
+
+    def counted_generate_images(prompts, *a, **kw):
+        image_gen.calls += len(prompts)
+        return generate_images(prompts, *a, width=256, height=256, steps=4, **kw)
+
+    image_gen.generate_images = counted_generate_images
+else:
+    image_gen = FakeImageGen(args.image_latency, seed=args.seed)
+
+video_gen = FakeVideoWrapper(args.video_latency, seed=args.seed)
+tts = FakeTTSWrapper(args.tts_latency, seed=args.seed)
+assembly = AssemblyEngine()
+
+
+def run_script_episode(timer, narrative):
+    """
+    The script_generation.py flow with --augment_prompts.
+    """
+    with timer.stage("agents"):
+        synthetic_agents, helper_agents = instantiate_agents(args.scenario_file_path, llm_factory)
+        script_writer = get_agent_by_name("script_writer", synthetic_agents)
+        producer = get_agent_by_name("producer", synthetic_agents)
+        img_prompt_agent = get_agent_by_name("img_prompt", helper_agents)
+
+    with timer.stage("simulation"):
+        final_script = simulate_episode(script_writer, producer, narrative, args.iterations)
+
+    with timer.stage("augment"):
+        for shot in final_script.shots:
+            augmented_prompt = img_prompt_agent.basic_api_call(shot.txt2img_prompt)
+            shot.txt2img_prompt = f"{script_writer.lora_key_word},\n\n {augmented_prompt}, \n\n Costume: {script_writer.flux_caption}"
+
+    return final_script
+
+
+def run_full_episode(timer, narrative, work_dir):
+    """
+    The full_agentic_flow.py flow for one variation.
+    """
+    with timer.stage("agents"):
+        synthetic_agents, helper_agents = instantiate_agents(args.scenario_file_path, llm_factory)
+        script_writer = get_agent_by_name("script_writer", synthetic_agents)
+        producer = get_agent_by_name("producer", synthetic_agents)
+        img_prompt_agent = get_agent_by_name("img_prompt", helper_agents)
+        vid_prompt_agent = get_agent_by_name("vid_prompt", helper_agents)
+
+    with timer.stage("simulation"):
+        final_script = simulate_episode(script_writer, producer, narrative, args.iterations)
+
+    with timer.stage("augment"):
+        img_texts = []
+        for shot in final_script.shots:
+            augmented_prompt = img_prompt_agent.basic_api_call(shot.txt2img_prompt)
+            img_texts.append(f"{script_writer.lora_key_word},\n\n {augmented_prompt}, \n\n Costume: {script_writer.flux_caption}")
+
+    with timer.stage("images"):
+        imgs = image_gen.generate_images(img_texts)
+
+    shot_clips = []
+    for j, shot in enumerate(final_script.shots):
+        with timer.stage("augment"):
+            vid_text = vid_prompt_agent.basic_api_call(shot.txt2img_prompt)
+        with timer.stage("video"):
+            vid_path = video_gen.make_api_call(vid_text, imgs[j], duration=5, idx=f"bench_{j}")
+        with timer.stage("tts"):
+            audio_path = tts.make_api_call(shot.vo, idx=f"bench_{j}")
+        shot_clips.append((vid_path, audio_path))
+
+    with timer.stage("assembly"):
+        assembly.assemble(shot_clips, os.path.join(work_dir, "final_video.mp4"))
+
+    return final_script
+
+
+def run_pipeline(name):
+    """
+    Runs one pipeline for every episode and summarizes it.
+    """
+    timer = StageTimer({"llm": LLMCalls(), "image": image_gen, "video": video_gen, "tts": tts})
+    tokens_before = (sum(llm.prompt_tokens for llm in llms), sum(llm.completion_tokens for llm in llms))
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir:
+        for episode in range(args.episodes):
+            narrative = f"episode {episode}: today we are writing a story about a young boy learning about the universe"
+            if name == "script":
+                run_script_episode(timer, narrative)
+            else:
+                run_full_episode(timer, narrative, work_dir)
+    wall_time = time.perf_counter() - start
+
+    return {
+        "wall_time": wall_time,
+        "episodes_per_hour": args.episodes / wall_time * 3600,
+        "stages": {stage: {"time": entry["time"], "calls": dict(entry["calls"])} for stage, entry in timer.stages.items()},
+        "prompt_tokens": sum(llm.prompt_tokens for llm in llms) - tokens_before[0],
+        "completion_tokens": sum(llm.completion_tokens for llm in llms) - tokens_before[1],
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def git_commit():
+    """
+    Reads the current commit, so results can be matched to the code they measured.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+os.makedirs("out_vids", exist_ok=True)
+os.makedirs("out_audio", exist_ok=True)
+
+pipelines = ["script", "full"] if args.pipeline == "both" else [args.pipeline]
+results = {
+    "commit": git_commit(),
+    "timestamp": time.time(),
+    "python": platform.python_version(),
+    "config": vars(args),
+    "pipelines": {},
+}
+
+for name in pipelines:
+    print(f"running the {name} pipeline")
+    result = run_pipeline(name)
+    results["pipelines"][name] = result
+
+    print(f"  wall time: {result['wall_time']:.2f}s ({result['episodes_per_hour']:.1f} episodes/hour)")
+    for stage, entry in result["stages"].items():
+        calls = ", ".join(f"{provider}={count}" for provider, count in entry["calls"].items() if count)
+        print(f"  {stage}: {entry['time']:.2f}s {calls}")
+    print(f"  tokens: {result['prompt_tokens']} prompt, {result['completion_tokens']} completion")
+    print(f"  peak rss: {result['peak_rss_mb']:.0f} MB")
+
+with open(args.output, 'w') as json_file:
+    json.dump(results, json_file, indent=4)
+print(f"results saved to {args.output}")
+
+if args.compare:
+    with open(args.compare) as json_file:
+        baseline = json.load(json_file)
+    print(f"compared to {args.compare} (commit {baseline.get('commit')})")
+    for name, result in results["pipelines"].items():
+        if name not in baseline["pipelines"]:
+            continue
+        before = baseline["pipelines"][name]
+        print(f"  {name}: wall time {before['wall_time']:.2f}s -> {result['wall_time']:.2f}s ({(result['wall_time'] / before['wall_time'] - 1) * 100:+.1f}%)")
+        for stage, entry in result["stages"].items():
+            if stage in before["stages"]:
+                print(f"    {stage}: {before['stages'][stage]['time']:.2f}s -> {entry['time']:.2f}s")
@@ -0,0 +1,359 @@
+"""
+Load test of gradio_interface.py with concurrent simulated users.
+
+Starts the app with --fake_providers (local stand-ins for the LLM, image, video and TTS providers) and drives
+each user through the real Gradio client API, with its own session: run the simulation, read the shot
+prompts, then per shot augment the image prompt, generate the image, augment the video prompt, generate the
+video and the VO, and finally create the video. Reports latency and queue wait percentiles and error rates
+per endpoint, and samples the server's memory over time. Results are saved as JSON.
+
+Needs gradio_client, which is installed with gradio.
+
+Example:
+    python -m benchmarks.gradio_load --users 10 --shots 2 --fake_llm_latency lognormal:0.5:0.3 --output load.json
+    python -m benchmarks.gradio_load --users 10 --app_args "--llm_concurrency 4 --video_concurrency 2"
+"""
+import argparse
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from collections import defaultdict
+
+parser = argparse.ArgumentParser(description="Gradio load test")
+parser.add_argument('--users', type=int, default=10, help='Number of concurrent simulated users')
+parser.add_argument('--rounds', type=int, default=1, help='Number of times each user goes through the whole flow')
+parser.add_argument('--ramp', type=float, default=0.0, help='Seconds over which the users start, 0 starts them all at once')
+parser.add_argument('--shots', type=int, default=2, help='Number of shots each user renders, at most 6')
+parser.add_argument('--iterations', type=int, default=2, help='Number of story beats of the simulation')
+parser.add_argument('--fake_llm_latency', type=str, default='0.2', help='Stand-in LLM latency, a number of seconds or kind:mean:spread')
+parser.add_argument('--fake_image_latency', type=str, default='0.5', help='Stand-in image latency')
+parser.add_argument('--fake_video_latency', type=str, default='1.0', help='Stand-in video latency')
+parser.add_argument('--fake_tts_latency', type=str, default='0.3', help='Stand-in TTS latency')
+parser.add_argument('--app_args', type=str, default='', help='Extra arguments for gradio_interface.py, e.g. its concurrency limits')
+parser.add_argument('--port', type=int, default=9100, help='Port the app is started on')
+parser.add_argument('--url', type=str, default=None, help='Test an app that is already running instead of starting one')
+parser.add_argument('--server_pid', type=int, default=None, help='with --url, the process whose memory is sampled')
+parser.add_argument('--memory_interval', type=float, default=0.5, help='Seconds between server memory samples')
+parser.add_argument('--startup_timeout', type=float, default=180.0, help='Seconds to wait for the app to start')
+parser.add_argument('--timeout', type=float, default=600.0, help='Seconds after which a request counts as failed')
+parser.add_argument('--output', type=str, default='gradio_load.json', help='Where to save the results')
+
+args = parser.parse_args()
+
+from gradio_client import Client, handle_file
+from gradio_client.utils import Status
+
+# statuses after which a request has left the queue
+STARTED = {Status.PROCESSING, Status.ITERATING, Status.PROGRESS}
+
+
+def rss_mb(pid: int) -> float:
+    """
+    Reads the resident memory of a process from /proc, None when it is gone or not on Linux.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """
+    Samples the resident memory of a process in the background.
+
+    Attributes:
+        pid (int): The process.
+        interval (float): Seconds between samples.
+        samples (list): (seconds since start, MB) pairs.
+    """
+
+    def __init__(self, pid: int, interval: float) -> None:
+        """
+        Initializes the MemorySampler.
+
+        Args:
+            pid (int): The process.
+            interval (float): Seconds between samples.
+        """
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+        self._start_time = time.perf_counter()
+
+    def run(self):
+        while not self._stopped.is_set():
+            rss = rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append((time.perf_counter() - self._start_time, rss))
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Recorder:
+    """
+    Collects the latency, queue wait and outcome of every request, safe to share between the user threads.
+
+    Attributes:
+        requests (list[dict]): Endpoint, user, start, queue wait, latency and error of every request.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the Recorder.
+        """
+        self.requests = []
+        self._lock = threading.Lock()
+        self._start_time = time.perf_counter()
+
+    def call(self, client, user: int, api_name: str, *inputs):
+        """
+        Sends a request and waits for its result, recording how long it queued and took.
+
+        Args:
+            client (Client): The user's client.
+            user (int): The user, for the record.
+            api_name (str): The endpoint.
+            *inputs: The endpoint's inputs.
+
+        Returns:
+            The endpoint's last output.
+
+        Raises:
+            Exception: The request's error, after it is recorded.
+        """
+        start = time.perf_counter()
+        started = None
+        error = None
+        result = None
+        try:
+            job = client.submit(*inputs, api_name=f"/{api_name}")
+            # the client only exposes the latest status, so poll it to see when the request leaves the queue
+            while not job.done():
+                if started is None and job.status().code in STARTED:
+                    started = time.perf_counter()
+                if time.perf_counter() - start > args.timeout:
+                    job.cancel()
+                    raise TimeoutError(f"{api_name} took longer than {args.timeout}s")
+                time.sleep(0.005)
+            result = job.result()
+            outputs = job.outputs()
+            # generators, e.g. the simulation and the image previews, end with their final output
+            if outputs:
+                result = outputs[-1]
+        except Exception as e:
+            error = repr(e)
+        end = time.perf_counter()
+
+        with self._lock:
+            self.requests.append({
+                "endpoint": re.sub(r"_\d+$", "", api_name),
+                "user": user,
+                "start": start - self._start_time,
+                "queue_wait": (started or end) - start,
+                "latency": end - start,
+                "error": error,
+            })
+        if error is not None:
+            raise RuntimeError(f"{api_name}: {error}")
+        return result
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(requests: list) -> dict:
+    """
+    Aggregates the requests per endpoint.
+
+    Returns:
+        dict: Endpoint to request and error counts, error rate, and latency and queue wait percentiles in seconds.
+    """
+    by_endpoint = defaultdict(list)
+    for request in requests:
+        by_endpoint[request["endpoint"]].append(request)
+
+    summary = {}
+    for endpoint, entries in by_endpoint.items():
+        latencies = sorted(entry["latency"] for entry in entries if entry["error"] is None)
+        waits = sorted(entry["queue_wait"] for entry in entries if entry["error"] is None)
+        errors = sum(entry["error"] is not None for entry in entries)
+        summary[endpoint] = {
+            "requests": len(entries),
+            "errors": errors,
+            "error_rate": errors / len(entries),
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p95": percentile(latencies, 0.95),
+            "latency_p99": percentile(latencies, 0.99),
+            "latency_max": latencies[-1] if latencies else None,
+            "queue_wait_p50": percentile(waits, 0.5),
+            "queue_wait_p95": percentile(waits, 0.95),
+            "queue_wait_max": waits[-1] if waits else None,
+        }
+    return summary
+
+
+def video_path(value):
+    """
+    Reads the file of a gr.Video output, which newer Gradio versions wrap in a dict.
+    """
+    return value["video"] if isinstance(value, dict) else value
+
+
+def run_user(url: str, user: int, recorder: Recorder, aborted: list) -> None:
+    """
+    Goes through the whole flow args.rounds times with its own client, and so its own Gradio session.
+    """
+    time.sleep(user * args.ramp / max(1, args.users))
+    client = Client(url, verbose=False)
+    for _ in range(args.rounds):
+        try:
+            recorder.call(client, user, "run_simulation", [{"role": "user", "content": "run simulation"}])
+            # per shot: action, image prompt, video prompt and VO
+            texts = recorder.call(client, user, "update_textboxes")
+
+            videos = [None] * 6
+            audios = [None] * 6
+            for k in range(min(args.shots, 6)):
+                img_prompt = recorder.call(client, user, f"augment_image_prompt_{k}", texts[4 * k + 1])
+                image = recorder.call(client, user, f"generate_image_{k}", img_prompt, user, 40, 0.5, 1.0)
+                vid_prompt = recorder.call(client, user, f"augment_video_prompt_{k}", texts[4 * k + 2])
+                videos[k] = video_path(recorder.call(client, user, f"generate_video_{k}", vid_prompt, handle_file(image), 5))
+                audios[k] = recorder.call(client, user, f"generate_audio_{k}", texts[4 * k + 3], 0)
+
+            recorder.call(client, user, "create_video",
+                          *[{"video": handle_file(path)} if path else None for path in videos],
+                          *[handle_file(path) if path else None for path in audios])
+        except Exception as e:
+            # the rest of the round depends on the failed step
+            print(f"user {user} round aborted: {e}")
+            aborted.append(user)
+
+
+def wait_for_app(url: str, process) -> None:
+    """
+    Polls the app until it answers, failing early when its process exits.
+    """
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"gradio_interface.py exited with {process.returncode} before it started")
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"the app did not start within {args.startup_timeout}s")
+
+
+def git_commit():
+    """
+    Reads the current commit, so results can be matched to the code they measured.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+with tempfile.TemporaryDirectory() as work_dir:
+    process = None
+    if args.url:
+        url = args.url
+        pid = args.server_pid
+    else:
+        url = f"http://127.0.0.1:{args.port}/"
+        command = [sys.executable, "gradio_interface.py", "--fake_providers", "--server_port", str(args.port),
+                   "--iterations", str(args.iterations),
+                   "--fake_llm_latency", args.fake_llm_latency, "--fake_image_latency", args.fake_image_latency,
+                   "--fake_video_latency", args.fake_video_latency, "--fake_tts_latency", args.fake_tts_latency,
+                   "--asset_dir", os.path.join(work_dir, "assets"), "--checkpoint_dir", os.path.join(work_dir, "checkpoints")]
+        command += shlex.split(args.app_args)
+        log_path = os.path.join(work_dir, "app.log")
+        print(f"starting the app on port {args.port}")
+        process = subprocess.Popen(command, stdout=open(log_path, 'w'), stderr=subprocess.STDOUT)
+        pid = process.pid
+
+    try:
+        wait_for_app(url, process)
+        sampler = MemorySampler(pid, args.memory_interval) if pid else None
+        if sampler:
+            sampler.start()
+
+        print(f"running {args.users} users x {args.rounds} rounds")
+        recorder = Recorder()
+        aborted = []
+        start = time.perf_counter()
+        users = [threading.Thread(target=run_user, args=(url, user, recorder, aborted)) for user in range(args.users)]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        wall_time = time.perf_counter() - start
+
+        if sampler:
+            sampler.stop()
+    except Exception:
+        if process is not None:
+            with open(log_path) as log:
+                print(log.read()[-4000:])
+        raise
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+memory = sampler.samples if sampler else []
+results = {
+    "commit": git_commit(),
+    "timestamp": time.time(),
+    "config": vars(args),
+    "wall_time": wall_time,
+    "rounds_completed": args.users * args.rounds - len(aborted),
+    "rounds_aborted": len(aborted),
+    "endpoints": summarize(recorder.requests),
+    "memory": {
+        "start_mb": memory[0][1] if memory else None,
+        "peak_mb": max(rss for _, rss in memory) if memory else None,
+        "end_mb": memory[-1][1] if memory else None,
+        "samples": memory,
+    },
+    "requests": recorder.requests,
+}
+
+print(f"wall time: {wall_time:.1f}s, {results['rounds_completed']} rounds completed, {results['rounds_aborted']} aborted")
+print(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'wait p50':>10}{'wait p95':>10}")
+
+
+def seconds(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+for endpoint, entry in results["endpoints"].items():
+    print(f"{endpoint:<22}{entry['requests']:>9}{entry['errors']:>8}{seconds(entry['latency_p50']):>8}{seconds(entry['latency_p95']):>8}"
+          f"{seconds(entry['latency_p99']):>8}{seconds(entry['queue_wait_p50']):>10}{seconds(entry['queue_wait_p95']):>10}")
+if memory:
+    print(f"server memory: {results['memory']['start_mb']:.0f} MB at start, {results['memory']['peak_mb']:.0f} MB peak, {results['memory']['end_mb']:.0f} MB at the end")
+
+with open(args.output, 'w') as json_file:
+    json.dump(results, json_file, indent=4)
+print(f"results saved to {args.output}")
@@ -0,0 +1,45 @@
+"""
+Compares image throughput of the per-call FluxWrapper.generate_image path against the batched generate_images path.
+
+Example:
+    python -m benchmarks.image_throughput --num_images 12 --steps 20
+"""
+import argparse
+import time
+
+from content_generation import FluxWrapper
+
+parser = argparse.ArgumentParser(description="Flux image throughput benchmark")
+parser.add_argument('--model_id', type=str, default='black-forest-labs/FLUX.1-dev', help='Flux model to load')
+parser.add_argument('--lora_paths', type=str, nargs='*', default=["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"], help='LoRA weights to load')
+parser.add_argument('--num_images', type=int, default=12, help='Number of images to render per path')
+parser.add_argument('--steps', type=int, default=40, help='Number of inference steps')
+parser.add_argument('--width', type=int, default=1024, help='Image width')
+parser.add_argument('--height', type=int, default=576, help='Image height')
+parser.add_argument('--batch_size', type=int, default=None, help='Fixed batch size, estimated from free memory when omitted')
+parser.add_argument('--no_img2img', action='store_true', help='Use the single pass text to image pipeline')
+
+args = parser.parse_args()
+
+image_gen = FluxWrapper(args.model_id, args.lora_paths, img2img=not args.no_img2img)
+
+prompts = [f"3D animation of a detective examining clue number {i} in a neon-lit office" for i in range(args.num_images)]
+seeds = list(range(args.num_images))
+
+# warm up so that neither path pays for kernel compilation or allocator growth
+image_gen.generate_image(prompts[0], seed=0, steps=2, width=args.width, height=args.height)
+
+start = time.perf_counter()
+for prompt, seed in zip(prompts, seeds):
+    image_gen.generate_image(prompt, seed=seed, steps=args.steps, width=args.width, height=args.height)
+per_call_time = time.perf_counter() - start
+
+start = time.perf_counter()
+image_gen.generate_images(prompts, seeds, steps=args.steps, width=args.width, height=args.height, batch_size=args.batch_size)
+batched_time = time.perf_counter() - start
+
+batch_size = args.batch_size or image_gen.estimate_batch_size(args.width, args.height)
+
+print(f"per call: {args.num_images / per_call_time * 60:.2f} images/minute ({per_call_time:.1f}s)")
+print(f"batched (batch size {batch_size}): {args.num_images / batched_time * 60:.2f} images/minute ({batched_time:.1f}s)")
+print(f"speedup: {per_call_time / batched_time:.2f}x")
@@ -0,0 +1,101 @@
+"""
+Measures the startup import cost of each entry point script.
+
+The top-level import statements of every script are run in a fresh interpreter, several times, and the
+median wall time is reported together with the heavy dependencies those imports load. Imports inside
+branches (e.g. FluxWrapper when --image_worker is used) are not counted, matching what a run pays.
+
+Example:
+    python -m benchmarks.import_time --output import_time.json
+    git checkout <older commit> && python -m benchmarks.import_time --output before.json
+    python -m benchmarks.import_time --compare before.json
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ["script_generation.py", "full_agentic_flow.py", "gradio_interface.py", "production_service.py", "image_worker.py"]
+HEAVY_MODULES = ["torch", "diffusers", "torchao", "sd_embed", "moviepy", "runwayml", "elevenlabs", "google.genai", "openai", "httpx", "gradio", "numpy", "PIL"]
+
+parser = argparse.ArgumentParser(description="Entry point import time benchmark")
+parser.add_argument('--entry_points', type=str, nargs='*', default=ENTRY_POINTS, help='Scripts to measure')
+parser.add_argument('--repeats', type=int, default=5, help='Fresh interpreters per entry point')
+parser.add_argument('--output', type=str, default='import_time.json', help='Where to save the results')
+parser.add_argument('--compare', type=str, default=None, help='Earlier results to compare against')
+
+args = parser.parse_args()
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def top_level_imports(path):
+    """
+    Extracts the module level import statements of a script.
+
+    Args:
+        path (str): The script.
+
+    Returns:
+        str: The import statements, one per line.
+    """
+    with open(path) as file:
+        tree = ast.parse(file.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(imports):
+    """
+    Runs the imports in fresh interpreters.
+
+    Args:
+        imports (str): The import statements.
+
+    Returns:
+        dict: Median and min wall time in seconds, the heavy modules loaded, or the error when an import fails.
+    """
+    probe = f"{imports}\nimport json, sys\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    times = []
+    loaded = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", probe], cwd=root, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1]}
+        times.append(elapsed)
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"median": statistics.median(times), "min": min(times), "heavy_modules": loaded}
+
+
+baseline_start = time.perf_counter()
+subprocess.run([sys.executable, "-c", "pass"], cwd=root)
+interpreter = time.perf_counter() - baseline_start
+
+results = {"python": sys.version.split()[0], "interpreter_startup": interpreter, "entry_points": {}}
+for script in args.entry_points:
+    result = measure(top_level_imports(os.path.join(root, script)))
+    results["entry_points"][script] = result
+    if "error" in result:
+        print(f"{script}: import failed, {result['error']}")
+    else:
+        print(f"{script}: {result['median'] * 1000:.0f} ms (min {result['min'] * 1000:.0f} ms), loads {', '.join(result['heavy_modules']) or 'no heavy modules'}")
+print(f"bare interpreter startup: {interpreter * 1000:.0f} ms")
+
+with open(args.output, 'w') as json_file:
+    json.dump(results, json_file, indent=4)
+print(f"results saved to {args.output}")
+
+if args.compare:
+    with open(args.compare) as json_file:
+        baseline = json.load(json_file)
+    print(f"compared to {args.compare}")
+    for script, result in results["entry_points"].items():
+        before = baseline["entry_points"].get(script)
+        if before is None or "error" in before or "error" in result:
+            continue
+        print(f"  {script}: {before['median'] * 1000:.0f} ms -> {result['median'] * 1000:.0f} ms ({(result['median'] / before['median'] - 1) * 100:+.1f}%)")
@@ -0,0 +1,87 @@
+"""
+A small OpenAI-compatible chat completions server for trying the "openai_compatible" LLMWrapper backend locally.
+
+Plain requests get a short text answer. Requests constrained with a JSON schema (response_format or
+vLLM's guided_json) get a canned ShotList. GET /stats reports how many requests and TCP connections
+were served, so keep-alive reuse is visible.
+
+Example:
+    python -m benchmarks.llm_stub_server --port 8080 --latency 0.05
+    LOCAL_LLM_BASE_URL=http://localhost:8080/v1 LOCAL_LLM_MODEL=stub python -c "from agents.llm_wrapper import LLMWrapper; print(LLMWrapper('openai_compatible').make_api_call([{'role': 'user', 'content': 'hi'}]))"
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from production.fakes import canned_shot_list
+
+parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+parser.add_argument('--host', type=str, default='localhost', help='Host to bind')
+parser.add_argument('--port', type=int, default=8080, help='Port to bind')
+parser.add_argument('--latency', type=float, default=0.0, help='Seconds each completion takes')
+
+args = parser.parse_args()
+
+stats = {"requests": 0, "connections": 0}
+stats_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with stats_lock:
+            stats["connections"] += 1
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send_json(200, stats)
+        if self.path.endswith("/models"):
+            return self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if not self.path.endswith("/chat/completions"):
+            return self._send_json(404, {"error": "not found"})
+
+        with stats_lock:
+            stats["requests"] += 1
+        time.sleep(args.latency)
+
+        constrained = request.get("response_format", {}).get("type") == "json_schema" or "guided_json" in request
+        if constrained:
+            content = json.dumps(canned_shot_list().to_json())
+        else:
+            content = f"stub response to: {str(request['messages'][-1]['content'])[:80]}"
+
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def log_message(self, format, *log_args):
+        pass
+
+
+server = ThreadingHTTPServer((args.host, args.port), Handler)
+print(f"stub server listening on http://{args.host}:{args.port}/v1")
+server.serve_forever()
@@ -0,0 +1,46 @@
+"""
+Profiles FluxWrapper.generate_image phase by phase, on the CPU with a tiny test model by default.
+
+Example:
+    python -m benchmarks.pipeline_profile --generations 5 --torch_trace flux_trace.json
+"""
+import argparse
+import json
+
+from content_generation import FluxWrapper
+
+parser = argparse.ArgumentParser(description="Per-phase profile of the image pipeline")
+parser.add_argument('--model_id', type=str, default='hf-internal-testing/tiny-flux-pipe', help='Flux model to load')
+parser.add_argument('--device', type=str, default='cpu', help='Device to run on')
+parser.add_argument('--generations', type=int, default=5, help='Number of profiled generations')
+parser.add_argument('--steps', type=int, default=4, help='Number of inference steps')
+parser.add_argument('--width', type=int, default=256, help='Image width')
+parser.add_argument('--height', type=int, default=256, help='Image height')
+parser.add_argument('--torch_trace', type=str, default=None, help='Also capture a torch.profiler trace of one extra generation to this path')
+parser.add_argument('--output', type=str, default=None, help='Save the stats as JSON')
+
+args = parser.parse_args()
+
+image_gen = FluxWrapper(args.model_id, [], device=args.device, profile=True)
+
+# the first call pays for lazy initialization, keep it out of the stats
+image_gen.generate_image("a detective in a neon-lit office", seed=0, steps=args.steps, width=args.width, height=args.height)
+image_gen.profiler.reset()
+
+for i in range(args.generations):
+    image_gen.generate_image("a detective in a neon-lit office", seed=i, steps=args.steps, width=args.width, height=args.height)
+
+stats = image_gen.profiler.stats()
+
+if args.torch_trace:
+    with image_gen.profiler.capture(args.torch_trace):
+        image_gen.generate_image("a detective in a neon-lit office", seed=0, steps=args.steps, width=args.width, height=args.height)
+
+print(f"{stats['generations']} generations, peak memory {stats['peak_memory_bytes'] / 1024**2:.0f} MiB")
+print(f"{'phase':<16}{'count':>7}{'mean ms':>10}{'p95 ms':>10}{'total ms':>11}")
+for name, phase in stats["phases"].items():
+    print(f"{name:<16}{phase['count']:>7}{phase['mean'] * 1000:>10.1f}{phase['p95'] * 1000:>10.1f}{phase['total'] * 1000:>11.1f}")
+
+if args.output:
+    with open(args.output, 'w') as file:
+        json.dump(stats, file, indent=4)
@@ -0,0 +1,35 @@
+"""
+Runs FluxWrapper on the CPU with a tiny test model and checks that peak RSS stays under the memory budget.
+
+Example:
+    python -m benchmarks.placement_rss --memory_budget_gb 2
+"""
+import argparse
+import resource
+import sys
+
+from content_generation import FluxWrapper
+
+parser = argparse.ArgumentParser(description="CPU placement peak RSS check")
+parser.add_argument('--model_id', type=str, default='hf-internal-testing/tiny-flux-pipe', help='Flux model to load')
+parser.add_argument('--memory_budget_gb', type=float, default=2.0, help='Memory budget in GiB')
+parser.add_argument('--steps', type=int, default=4, help='Number of inference steps')
+parser.add_argument('--width', type=int, default=256, help='Image width')
+parser.add_argument('--height', type=int, default=256, help='Image height')
+
+args = parser.parse_args()
+
+memory_budget = int(args.memory_budget_gb * 1024**3)
+
+image_gen = FluxWrapper(args.model_id, [], device="cpu", memory_budget=memory_budget)
+image_gen.generate_image("a detective in a neon-lit office", seed=0, steps=args.steps, width=args.width, height=args.height)
+
+# ru_maxrss is reported in kilobytes on Linux
+peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+print(image_gen.plan.to_str())
+print(f"peak rss: {peak_rss / 1024**3:.2f} GiB of {memory_budget / 1024**3:.2f} GiB")
+
+if peak_rss > memory_budget:
+    print("peak rss is over budget")
+    sys.exit(1)
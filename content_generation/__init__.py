@@ -1,3 +1,34 @@
-from .flux_wrapper import FluxWrapper
-from .video_wrapper import VideoWrapper
-from .tts_wrapper import TTSWrapper
\ No newline at end of file
+import importlib
+
+# the wrappers pull in torch, diffusers and the provider SDKs, so each submodule is only imported when one of its names is first used
+_EXPORTS = {
+    "AssemblyEngine": ".assembly",
+    "AssetCreationError": ".asset_store",
+    "AssetStore": ".asset_store",
+    "image_digest": ".asset_store",
+    "FluxWrapper": ".flux_wrapper",
+    "ImageWorker": ".image_worker",
+    "ImageWorkerClient": ".image_worker",
+    "parse_address": ".image_worker",
+    "worker_authkey": ".image_worker",
+    "LoraManager": ".lora_manager",
+    "PreviewCascade": ".cascade",
+    "PipelineProfiler": ".profiler",
+    "VideoWrapper": ".video_wrapper",
+    "TTSWrapper": ".tts_wrapper",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    # cache it so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
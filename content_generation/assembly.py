@@ -0,0 +1,286 @@
+import os
+import re
+import subprocess
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import traced
+
+
+def ffmpeg_exe() -> str:
+    """
+    Finds the ffmpeg binary, preferring the one bundled with moviepy's imageio-ffmpeg.
+
+    Returns:
+        str: Path to the ffmpeg binary.
+    """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return "ffmpeg"
+
+
+class AssemblyEngine:
+    """
+    Builds the final cut from per-shot video and VO clips with at most one encode.
+
+    Every shot is trimmed to the length of its VO. When all clips share codec, resolution and
+    frame rate and are at least as long as their VO, each shot is muxed with stream copied video
+    (in parallel, one ffmpeg process per shot) and the shots are joined with the concat demuxer,
+    so the video is never re-encoded. Otherwise the whole timeline is trimmed, muxed and
+    concatenated in a single ffmpeg filter graph and encoded once.
+
+    Attributes:
+        ffmpeg (str): Path to the ffmpeg binary.
+        max_workers (int): Maximum number of per-shot ffmpeg processes run at once.
+    """
+
+    def __init__(self, ffmpeg: str = None, max_workers: int = 4) -> None:
+        """
+        Initializes the AssemblyEngine.
+
+        Args:
+            ffmpeg (str, optional): Path to the ffmpeg binary. Found automatically when None.
+            max_workers (int, optional): Maximum number of per-shot ffmpeg processes run at once. Defaults to 4.
+        """
+        self.ffmpeg = ffmpeg or ffmpeg_exe()
+        self.max_workers = max_workers
+
+    def probe(self, path: str) -> dict:
+        """
+        Reads duration and stream information of a media file.
+
+        Args:
+            path (str): The media file.
+
+        Returns:
+            dict: duration, video_codec, width, height, fps and audio_codec. Missing streams are None.
+        """
+        result = subprocess.run([self.ffmpeg, "-hide_banner", "-i", path], capture_output=True, text=True)
+        info = result.stderr
+
+        duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", info)
+        if duration is None:
+            raise ValueError(f"could not read media file {path}: {info.strip()}")
+        hours, minutes, seconds = duration.groups()
+
+        video = re.search(r"Stream #\S+.*?: Video: (\w+).*?, (\d+)x(\d+)", info)
+        fps = re.search(r"(\d+(?:\.\d+)?) fps", info)
+        audio = re.search(r"Stream #\S+.*?: Audio: (\w+)", info)
+
+        return {
+            "duration": int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+            "video_codec": video.group(1) if video else None,
+            "width": int(video.group(2)) if video else None,
+            "height": int(video.group(3)) if video else None,
+            "fps": float(fps.group(1)) if fps else None,
+            "audio_codec": audio.group(1) if audio else None,
+        }
+
+    def plan(self, shots: list[tuple[str, str]]) -> dict:
+        """
+        Plans the timeline: one segment per shot, trimmed to its VO, and the assembly strategy.
+
+        Args:
+            shots (list[tuple[str, str]]): (video path, audio path) per shot, in timeline order.
+
+        Returns:
+            dict: "segments" with video, audio and duration per shot, and "strategy", either "copy" or "encode".
+        """
+        if not shots:
+            raise ValueError("no shots to assemble")
+
+        def probe_shot(shot):
+            video_path, audio_path = shot
+            return self.probe(video_path), self.probe(audio_path)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            probes = list(executor.map(probe_shot, shots))
+
+        segments = []
+        for (video_path, audio_path), (video, audio) in zip(shots, probes):
+            segments.append({
+                "video": video_path,
+                "audio": audio_path,
+                "duration": audio["duration"],
+                "video_info": video,
+            })
+
+        first = segments[0]["video_info"]
+        compatible = all(
+            (s["video_info"]["video_codec"], s["video_info"]["width"], s["video_info"]["height"], s["video_info"]["fps"])
+            == (first["video_codec"], first["width"], first["height"], first["fps"])
+            and s["video_info"]["duration"] >= s["duration"]
+            for s in segments
+        )
+
+        return {"segments": segments, "strategy": "copy" if compatible else "encode"}
+
+    @traced("assembly.assemble", lambda self, shots, output_path, shot_paths=None: {"shots": len(shots)})
+    def assemble(self, shots: list[tuple[str, str]], output_path: str, shot_paths: list[str] = None) -> str:
+        """
+        Produces the final cut.
+
+        Args:
+            shots (list[tuple[str, str]]): (video path, audio path) per shot, in timeline order.
+            output_path (str): The path to the final video.
+            shot_paths (list[str], optional): Where to keep the per-shot muxed clips of the copy strategy.
+                Temporary files are used when None.
+
+        Returns:
+            str: The path to the final video.
+        """
+        plan = self.plan(shots)
+        print(f"assembling {len(shots)} shots with the {plan['strategy']} strategy")
+
+        if plan["strategy"] == "copy":
+            if shot_paths is not None:
+                self._assemble_copy(plan["segments"], output_path, shot_paths)
+            else:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    shot_paths = [os.path.join(tmp_dir, f"shot_{i:04d}.mp4") for i in range(len(shots))]
+                    self._assemble_copy(plan["segments"], output_path, shot_paths)
+        else:
+            self._assemble_encode(plan["segments"], output_path)
+
+        return output_path
+
+    def mux_shot(self, video_path: str, audio_path: str, output_path: str) -> str:
+        """
+        Trims one shot to its VO and muxes the VO in, copying the video stream when the clip is long enough.
+
+        Args:
+            video_path (str): The shot's video.
+            audio_path (str): The shot's VO.
+            output_path (str): The path to the muxed shot.
+
+        Returns:
+            str: The path to the muxed shot.
+        """
+        plan = self.plan([(video_path, audio_path)])
+        if plan["strategy"] == "copy":
+            self._mux_shot(plan["segments"][0], output_path)
+        else:
+            self._assemble_encode(plan["segments"], output_path)
+        return output_path
+
+    def concat(self, shot_paths: list[str], output_path: str) -> str:
+        """
+        Joins shots muxed by mux_shot, without re-encoding when they share codec, resolution and frame rate.
+
+        Args:
+            shot_paths (list[str]): The muxed shots, in timeline order.
+            output_path (str): The path to the final video.
+
+        Returns:
+            str: The path to the final video.
+        """
+        # a muxed shot is its own video and audio source
+        plan = self.plan([(path, path) for path in shot_paths])
+        if plan["strategy"] == "copy":
+            self._concat_copy(shot_paths, output_path)
+        else:
+            self._assemble_encode(plan["segments"], output_path)
+        return output_path
+
+    def _run(self, args: list[str]) -> None:
+        """
+        Runs ffmpeg and raises with its error output on failure.
+
+        Args:
+            args (list[str]): ffmpeg arguments.
+        """
+        result = subprocess.run([self.ffmpeg, "-y", "-hide_banner", "-loglevel", "error", *args], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()}")
+
+    @traced("assembly.mux_shot", lambda self, segment, output_path: {"output": os.path.basename(output_path)})
+    def _mux_shot(self, segment: dict, output_path: str) -> None:
+        """
+        Trims a shot to its VO and muxes the VO in, copying the video stream.
+
+        Args:
+            segment (dict): The planned segment.
+            output_path (str): The path to the muxed shot.
+        """
+        self._run([
+            "-i", segment["video"],
+            "-i", segment["audio"],
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-t", f"{segment['duration']:.3f}",
+            "-c:v", "copy",
+            "-c:a", "aac", "-ar", "44100", "-ac", "2",
+            output_path,
+        ])
+
+    def _assemble_copy(self, segments: list[dict], output_path: str, shot_paths: list[str]) -> None:
+        """
+        Muxes every shot in parallel and joins them with the concat demuxer, without re-encoding video.
+
+        Args:
+            segments (list[dict]): The planned segments.
+            output_path (str): The path to the final video.
+            shot_paths (list[str]): Where to write the per-shot muxed clips.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(self._mux_shot, segments, shot_paths))
+
+        self._concat_copy(shot_paths, output_path)
+
+    def _concat_copy(self, shot_paths: list[str], output_path: str) -> None:
+        """
+        Joins clips with the concat demuxer, copying all streams.
+
+        Args:
+            shot_paths (list[str]): The clips, in timeline order.
+            output_path (str): The path to the joined video.
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+            for path in shot_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+
+        try:
+            self._run(["-f", "concat", "-safe", "0", "-i", list_file.name, "-c", "copy", "-movflags", "+faststart", output_path])
+        finally:
+            os.remove(list_file.name)
+
+    def _assemble_encode(self, segments: list[dict], output_path: str) -> None:
+        """
+        Trims, muxes and concatenates the whole timeline in one filter graph with a single encode.
+
+        Args:
+            segments (list[dict]): The planned segments.
+            output_path (str): The path to the final video.
+        """
+        first = segments[0]["video_info"]
+        width, height, fps = first["width"], first["height"], first["fps"] or 24
+
+        inputs = []
+        filters = []
+        for i, segment in enumerate(segments):
+            duration = f"{segment['duration']:.3f}"
+            inputs += ["-i", segment["video"], "-i", segment["audio"]]
+            # clips shorter than their VO hold their last frame
+            filters.append(
+                f"[{2 * i}:v]trim=duration={duration},setpts=PTS-STARTPTS,"
+                f"tpad=stop_mode=clone:stop_duration={duration},trim=duration={duration},"
+                f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p[v{i}]"
+            )
+            filters.append(
+                f"[{2 * i + 1}:a]atrim=duration={duration},asetpts=PTS-STARTPTS,"
+                f"aformat=sample_rates=44100:channel_layouts=stereo[a{i}]"
+            )
+        filters.append("".join(f"[v{i}][a{i}]" for i in range(len(segments))) + f"concat=n={len(segments)}:v=1:a=1[v][a]")
+
+        self._run([
+            *inputs,
+            "-filter_complex", ";".join(filters),
+            "-map", "[v]", "-map", "[a]",
+            "-c:v", "libx264", "-c:a", "aac",
+            "-movflags", "+faststart",
+            output_path,
+        ])
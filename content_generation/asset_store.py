@@ -0,0 +1,311 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    inputs TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_last_used ON assets (last_used);
+CREATE TABLE IF NOT EXISTS manifests (
+    episode TEXT NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (episode, name)
+);
+"""
+
+
+def image_digest(image) -> str:
+    """
+    Hashes the pixels of an image, to key the assets generated from it.
+
+    Args:
+        image (Image.Image | np.ndarray): The image.
+
+    Returns:
+        str: The sha256 hex digest of its mode, size and pixels.
+    """
+    from PIL import Image
+
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image.astype('uint8'))
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class AssetCreationError(RuntimeError):
+    """
+    Raised when a provider called to generate a missing asset did not produce a file.
+    """
+
+
+class AssetStore:
+    """
+    Content addressed store of generated assets, keyed by the hash of the inputs that generated them.
+
+    Generating an asset whose inputs were seen before returns the stored file instead of paying for it again,
+    and identical assets of different episodes are kept once. Files live in root/objects/<key[:2]>/<key><ext>
+    and a SQLite index maps each key to its file, so a lookup is a primary key read, never a directory scan.
+    Episodes record which assets they used in a manifest. Instead of wiping the output directories, gc evicts
+    the least recently used assets once the store grows past max_bytes.
+
+    Every method opens its own connection, so the store can be shared between threads and processes.
+
+    Attributes:
+        root (str): Directory of the store.
+        max_bytes (int): Size the store is trimmed to by gc.
+        db_path (str): Path to the SQLite index.
+    """
+
+    def __init__(self, root: str = "assets", max_bytes: int = 20 * 1024 ** 3) -> None:
+        """
+        Initializes the AssetStore and creates its directories and index if needed.
+
+        Args:
+            root (str, optional): Directory of the store. Defaults to "assets".
+            max_bytes (int, optional): Size the store is trimmed to by gc. Defaults to 20 GiB.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(root, "index.db")
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection that returns rows as sqlite3.Row.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def key(kind: str, inputs: dict) -> str:
+        """
+        Hashes the generation inputs of an asset.
+
+        Args:
+            kind (str): The asset kind, e.g. "image", "video" or "audio".
+            inputs (dict): Everything the asset depends on, JSON serializable.
+
+        Returns:
+            str: The sha256 hex digest of the kind and the canonical JSON of the inputs.
+        """
+        canonical = json.dumps({"kind": kind, "inputs": inputs}, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> str:
+        """
+        Looks up an asset and marks it as recently used.
+
+        Args:
+            key (str): The asset key.
+
+        Returns:
+            str: The path of the asset, or None when it is not stored.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT path FROM assets WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row["path"]):
+                # removed behind the store's back, forget it so it is generated again
+                conn.execute("DELETE FROM assets WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE assets SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row["path"]
+
+    def put(self, kind: str, inputs: dict, source: str, move: bool = True) -> str:
+        """
+        Adds a generated file to the store. When the asset is already stored the existing copy is kept.
+
+        Args:
+            kind (str): The asset kind.
+            inputs (dict): The generation inputs.
+            source (str): The generated file.
+            move (bool, optional): Move the file into the store instead of copying it. Defaults to True.
+
+        Returns:
+            str: The path of the stored asset.
+        """
+        key = self.key(kind, inputs)
+        existing = self.get(key)
+        if existing is not None:
+            if move and os.path.abspath(source) != os.path.abspath(existing):
+                os.remove(source)
+            return existing
+
+        ext = os.path.splitext(source)[1]
+        path = os.path.join(self.root, "objects", key[:2], f"{key}{ext}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if move:
+            shutil.move(source, path)
+        else:
+            shutil.copyfile(source, path)
+
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO assets (key, kind, path, size, inputs, created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, path, os.path.getsize(path), json.dumps(inputs, default=str), now, now),
+            )
+        return path
+
+    def put_image(self, inputs: dict, image) -> str:
+        """
+        Adds a generated image to the store as a PNG.
+
+        Args:
+            inputs (dict): The generation inputs.
+            image (Image.Image): The image.
+
+        Returns:
+            str: The path of the stored image.
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix=".png", dir=os.path.join(self.root, "tmp"))
+        os.close(fd)
+        image.save(tmp_path)
+        return self.put("image", inputs, tmp_path)
+
+    def fetch(self, kind: str, inputs: dict, create) -> str:
+        """
+        Returns the stored asset for the inputs, generating and storing it on a miss.
+
+        Args:
+            kind (str): The asset kind.
+            inputs (dict): The generation inputs.
+            create (Callable): Generates the asset and returns the path of the file it wrote.
+
+        Returns:
+            str: The path of the stored asset.
+
+        Raises:
+            AssetCreationError: When create returns something other than the path of a file, e.g. the None or
+                empty list a provider returns after an error. Nothing is stored.
+        """
+        path = self.get(self.key(kind, inputs))
+        if path is not None:
+            return path
+        source = create()
+        if not isinstance(source, (str, os.PathLike)) or not os.path.isfile(source):
+            raise AssetCreationError(f"{kind} generation produced no file, got {source!r}")
+        return self.put(kind, inputs, source)
+
+    def record(self, episode: str, name: str, key: str) -> None:
+        """
+        Adds an asset to the manifest of an episode, replacing an earlier asset of the same name.
+
+        Args:
+            episode (str): The episode id.
+            name (str): The asset's role in the episode, e.g. "scene_0003.png".
+            key (str): The asset key.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO manifests (episode, name, key) VALUES (?, ?, ?)", (episode, name, key))
+
+    def manifest(self, episode: str) -> dict:
+        """
+        Reads the manifest of an episode.
+
+        Args:
+            episode (str): The episode id.
+
+        Returns:
+            dict: Asset name to its key, kind, inputs and path. The path is None for assets evicted since.
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT m.name, m.key, a.kind, a.inputs, a.path FROM manifests m LEFT JOIN assets a ON a.key = m.key WHERE m.episode = ? ORDER BY m.name",
+                (episode,),
+            ).fetchall()
+        return {
+            row["name"]: {
+                "key": row["key"],
+                "kind": row["kind"],
+                "inputs": json.loads(row["inputs"]) if row["inputs"] else None,
+                "path": row["path"],
+            }
+            for row in rows
+        }
+
+    def write_manifest(self, episode: str, path: str) -> str:
+        """
+        Writes the manifest of an episode as JSON.
+
+        Args:
+            episode (str): The episode id.
+            path (str): The output file.
+
+        Returns:
+            str: The output file.
+        """
+        with open(path, 'w') as json_file:
+            json.dump({"episode": episode, "assets": self.manifest(episode)}, json_file, indent=4)
+        return path
+
+    def size(self) -> int:
+        """
+        Returns the total size of the stored assets in bytes.
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM assets").fetchone()[0]
+
+    def gc(self, max_bytes: int = None, keep: set = None) -> dict:
+        """
+        Evicts the least recently used assets until the store fits in max_bytes.
+
+        Args:
+            max_bytes (int, optional): The size to trim to. self.max_bytes when None.
+            keep (set, optional): Keys that are never evicted, e.g. the assets of a running episode.
+
+        Returns:
+            dict: Number of assets and bytes evicted, and the size of the store afterwards.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        keep = keep or set()
+        evicted = 0
+        freed = 0
+        with closing(self._connect()) as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM assets").fetchone()[0]
+            for row in conn.execute("SELECT key, path, size FROM assets ORDER BY last_used").fetchall():
+                if total <= max_bytes:
+                    break
+                if row["key"] in keep:
+                    continue
+                try:
+                    os.remove(row["path"])
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM assets WHERE key = ?", (row["key"],))
+                total -= row["size"]
+                freed += row["size"]
+                evicted += 1
+
+        # leftovers of generations interrupted before they were stored
+        tmp_dir = os.path.join(self.root, "tmp")
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            if time.time() - os.path.getmtime(path) > 3600:
+                os.remove(path)
+
+        return {"evicted": evicted, "freed": freed, "size": total}
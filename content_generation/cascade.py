@@ -0,0 +1,222 @@
+import hashlib
+import random
+import time
+
+from tracing import span
+
+SCREEN_QUERY = (
+    "This is a quick low resolution preview of a shot's image prompt. The shot should show: {shot_action}\n"
+    "Does the preview show the right subject and action? Answer APPROVE or REJECT, then give one sentence why."
+)
+
+
+class PreviewCascade:
+    """
+    Renders cheap previews of every shot and promotes only the approved ones to full quality images and video.
+
+    Previews use few steps at a low resolution. They only check the prompt: Flux draws its starting noise in
+    the shape of the output, so the full render of the same seed has a different composition than its preview,
+    and only the subject and action carry over. A screening agent, when given, looks at each preview through
+    BaseAgent.image_api_call and approves it unless it answers REJECT. Rejected shots are previewed again with
+    another seed up to `retries` times before they are dropped. The seed of a retry follows from the shot's
+    seed and the attempt, see retry_seed, so a rerun with the same seeds tries the same ones.
+
+    Image compute is counted in megapixel-steps (width * height * steps / 1e6, the img2img pass adds its
+    strength's share of the steps), which tracks Flux render time closely enough to compare settings.
+
+    Attributes:
+        image_gen: Image provider with a generate_images method.
+        screen_agent (BaseAgent): Looks at the previews, every preview is approved when None.
+        preview_steps (int): Inference steps of a preview.
+        preview_width (int): Width of a preview.
+        preview_height (int): Height of a preview.
+        steps (int): Inference steps of a full render.
+        width (int): Width of a full render.
+        height (int): Height of a full render.
+        retries (int): Number of new seeds a rejected shot is previewed with.
+        video_cost_per_second (float): API spend per second of generated video, for the report.
+        report (dict): Counts, compute and spend of the last run.
+    """
+
+    def __init__(self, image_gen, screen_agent=None, preview_steps: int = 8, preview_width: int = 512, preview_height: int = 288, steps: int = 40, width: int = 1024, height: int = 576, retries: int = 1, video_cost_per_second: float = 0.0) -> None:
+        """
+        Initializes the PreviewCascade.
+
+        Args:
+            image_gen: Image provider with a generate_images method.
+            screen_agent (BaseAgent, optional): Looks at the previews, every preview is approved when None.
+            preview_steps (int, optional): Inference steps of a preview. Defaults to 8.
+            preview_width (int, optional): Width of a preview, a multiple of 16. Defaults to 512.
+            preview_height (int, optional): Height of a preview, a multiple of 16. Defaults to 288.
+            steps (int, optional): Inference steps of a full render. Defaults to 40.
+            width (int, optional): Width of a full render. Defaults to 1024.
+            height (int, optional): Height of a full render. Defaults to 576.
+            retries (int, optional): Number of new seeds a rejected shot is previewed with. Defaults to 1.
+            video_cost_per_second (float, optional): API spend per second of generated video, for the report. Defaults to 0.
+        """
+        self.image_gen = image_gen
+        self.screen_agent = screen_agent
+        self.preview_steps = preview_steps
+        self.preview_width = preview_width
+        self.preview_height = preview_height
+        self.steps = steps
+        self.width = width
+        self.height = height
+        self.retries = retries
+        self.video_cost_per_second = video_cost_per_second
+        self.report = {}
+
+    @staticmethod
+    def retry_seed(seed: int, attempt: int) -> int:
+        """
+        Derives the seed a shot is previewed and rendered with on an attempt.
+
+        Args:
+            seed (int): The shot's seed.
+            attempt (int): The attempt, 0 for the first preview.
+
+        Returns:
+            int: The seed itself on the first attempt, a seed derived from it and the attempt afterwards.
+        """
+        if attempt == 0:
+            return seed
+        return int(hashlib.sha256(f"{seed}:{attempt}".encode()).hexdigest()[:8], 16) % 100000
+
+    def render_cost(self, steps: int, width: int, height: int) -> float:
+        """
+        Estimates the compute of one image.
+
+        Args:
+            steps (int): Inference steps.
+            width (int): Image width.
+            height (int): Image height.
+
+        Returns:
+            float: The cost in megapixel-steps.
+        """
+        # FluxWrapper runs an img2img pass over the last 70% of the schedule by default
+        passes = 1.7 if getattr(self.image_gen, "img2img", False) else 1.0
+        return width * height * steps * passes / 1e6
+
+    def screen(self, shot_action: str, preview) -> tuple:
+        """
+        Asks the screening agent whether a preview shows its shot.
+
+        Args:
+            shot_action (str): What the shot should show.
+            preview (Image.Image): The preview.
+
+        Returns:
+            tuple: Whether the preview is approved, and the agent's answer.
+        """
+        if self.screen_agent is None:
+            return True, ""
+        try:
+            answer = self.screen_agent.image_api_call(SCREEN_QUERY.format(shot_action=shot_action), preview).strip()
+        except Exception as e:
+            # a screening outage should not stop the episode, the preview passes unchecked
+            print(f"preview screening failed, approving: {e!r}")
+            return True, repr(e)
+        return not answer.upper().startswith("REJECT"), answer
+
+    def run(self, prompts: list[str], shot_actions: list[str], seeds: list[int] = None, video_seconds: float = 5.0) -> dict:
+        """
+        Previews and screens every shot, then renders the approved shots at full quality.
+
+        Args:
+            prompts (list[str]): The image prompt of every shot.
+            shot_actions (list[str]): What every shot should show, for the screening agent.
+            seeds (list[int], optional): One seed per shot, retries derive theirs from it. Random seeds are drawn when None.
+            video_seconds (float, optional): Length of the video generated per approved shot, for the report. Defaults to 5.
+
+        Returns:
+            dict: "approved", the indices of the approved shots; "images", their full quality images in the same order;
+                "previews", the last preview of every shot; "seeds", the seed every shot was last previewed and
+                rendered with; and "report", see savings.
+        """
+        num_shots = len(prompts)
+        base_seeds = list(seeds) if seeds is not None else [random.randint(0, 100000) for _ in range(num_shots)]
+        seeds = list(base_seeds)
+        previews = [None] * num_shots
+        answers = [""] * num_shots
+        approved = set()
+        num_previews = 0
+
+        start = time.perf_counter()
+        pending = list(range(num_shots))
+        for attempt in range(self.retries + 1):
+            if not pending:
+                break
+            for i in pending:
+                seeds[i] = self.retry_seed(base_seeds[i], attempt)
+            with span("cascade.preview", shots=len(pending), attempt=attempt):
+                images = self.image_gen.generate_images([prompts[i] for i in pending], [seeds[i] for i in pending],
+                                                        steps=self.preview_steps, width=self.preview_width, height=self.preview_height)
+            num_previews += len(pending)
+            rejected = []
+            for i, image in zip(pending, images):
+                previews[i] = image
+                ok, answers[i] = self.screen(shot_actions[i], image)
+                if ok:
+                    approved.add(i)
+                else:
+                    print(f"shot {i} preview rejected: {answers[i]}")
+                    rejected.append(i)
+            pending = rejected
+        preview_time = time.perf_counter() - start
+
+        approved = sorted(approved)
+        start = time.perf_counter()
+        with span("cascade.render", shots=len(approved)):
+            images = self.image_gen.generate_images([prompts[i] for i in approved], [seeds[i] for i in approved],
+                                                    steps=self.steps, width=self.width, height=self.height) if approved else []
+        render_time = time.perf_counter() - start
+
+        self.report = self.savings(num_shots, len(approved), num_previews, video_seconds, preview_time, render_time)
+        self.report["screening"] = answers
+        return {"approved": approved, "images": images, "previews": previews, "seeds": seeds, "report": self.report}
+
+    def savings(self, num_shots: int, num_approved: int, num_previews: int, video_seconds: float, preview_time: float = 0.0, render_time: float = 0.0) -> dict:
+        """
+        Compares the cascade with rendering every shot at full quality.
+
+        Args:
+            num_shots (int): Number of shots.
+            num_approved (int): Number of shots promoted to full quality.
+            num_previews (int): Number of previews rendered, retries included.
+            video_seconds (float): Length of the video generated per shot.
+            preview_time (float, optional): Seconds spent on previews and screening. Defaults to 0.
+            render_time (float, optional): Seconds spent on full quality renders. Defaults to 0.
+
+        Returns:
+            dict: Shot counts, image compute in megapixel-steps with and without the cascade, video seconds and spend saved, and timings.
+        """
+        preview_cost = self.render_cost(self.preview_steps, self.preview_width, self.preview_height)
+        full_cost = self.render_cost(self.steps, self.width, self.height)
+        baseline = num_shots * full_cost
+        spent = num_previews * preview_cost + num_approved * full_cost
+        video_seconds_saved = (num_shots - num_approved) * video_seconds
+        return {
+            "shots": num_shots,
+            "approved": num_approved,
+            "rejected": num_shots - num_approved,
+            "previews": num_previews,
+            "image_compute": spent,
+            "image_compute_baseline": baseline,
+            "image_compute_saved": baseline - spent,
+            "image_compute_saved_fraction": (baseline - spent) / baseline if baseline else 0.0,
+            "video_seconds_saved": video_seconds_saved,
+            "video_spend_saved": video_seconds_saved * self.video_cost_per_second,
+            "preview_time": preview_time,
+            "render_time": render_time,
+        }
+
+    @staticmethod
+    def format_report(report: dict) -> str:
+        """
+        Summarizes a report on one line.
+        """
+        return (f"{report['approved']}/{report['shots']} shots approved from {report['previews']} previews, "
+                f"image compute {report['image_compute']:.0f} of {report['image_compute_baseline']:.0f} MP-steps "
+                f"({100 * report['image_compute_saved_fraction']:.0f}% saved), "
+                f"{report['video_seconds_saved']:.0f}s of video skipped ({report['video_spend_saved']:.2f} spend saved)")
@@ -1,62 +1,135 @@
 import numpy as np
 import random
+import time
 import torch
 
-from diffusers import FluxPipeline, FluxImg2ImgPipeline, FluxTransformer2DModel
+from diffusers import FluxPipeline, FluxImg2ImgPipeline
 from PIL import Image
-from torchao.quantization import quantize_, int8_weight_only
 from sd_embed.embedding_funcs import get_weighted_text_embeddings_flux1
 
+from tracing import traced
+
+from .lora_manager import LoraManager
+from .placement import BYTES_PER_DECODED_PIXEL, apply_placement, default_device, plan_placement
+from .profiler import PipelineProfiler
+
+# rough per-sample activation cost of one Flux denoising step, in bytes per latent token
+BYTES_PER_LATENT_TOKEN = 3072 * 2 * 48
+# memory kept free when the budget is read from the device
+RESERVED_BYTES = 2 * 1024**3
+# linear map from the 16 Flux latent channels to RGB, used for cheap previews
+LATENT_RGB_FACTORS = [
+    [-0.0346, 0.0244, 0.0681],
+    [0.0034, 0.0210, 0.0687],
+    [0.0275, -0.0668, -0.0433],
+    [-0.0174, 0.0160, 0.0617],
+    [0.0859, 0.0721, 0.0329],
+    [0.0004, 0.0383, 0.0115],
+    [0.0405, 0.0861, 0.0915],
+    [-0.0236, -0.0185, -0.0259],
+    [-0.0245, 0.0250, 0.1180],
+    [0.1008, 0.0755, -0.0421],
+    [-0.0515, 0.0201, 0.0011],
+    [0.0428, -0.0012, -0.0036],
+    [0.0817, 0.0765, 0.0749],
+    [-0.1264, -0.0522, -0.1103],
+    [-0.0280, -0.0881, -0.0499],
+    [-0.1262, -0.0982, -0.0778],
+]
+LATENT_RGB_BIAS = [-0.0329, -0.0718, -0.0851]
+
+
+def stack_prompt_embeds(embeds: list) -> tuple:
+    """
+    Stacks the embeddings of several prompts into one batch.
+
+    sd_embed encodes every prompt to as many T5 tokens as it needs, so the shorter sequences are padded with
+    zero vectors to the longest one in the batch. Flux attends to every text token without a mask, so a short
+    prompt rendered in a batch with a long one can come out slightly different than when rendered alone.
+
+    Args:
+        embeds (list[tuple]): The (prompt_embeds, pooled_prompt_embeds) pair of every prompt, each with a batch dimension of 1.
+
+    Returns:
+        tuple: The batched prompt embeddings, padded to the longest sequence, and the batched pooled embeddings.
+    """
+    length = max(prompt_embeds.shape[1] for prompt_embeds, _ in embeds)
+    prompt_embeds = torch.cat([torch.nn.functional.pad(prompt_embeds, (0, 0, 0, length - prompt_embeds.shape[1])) for prompt_embeds, _ in embeds])
+    pooled_prompt_embeds = torch.cat([pooled for _, pooled in embeds])
+    return prompt_embeds, pooled_prompt_embeds
+
+
 class FluxWrapper:
     """
-    A wrapper class for the FluxPipeline and FluxTransformer2DModel to generate images using a pre-trained model and LoRA weights.
+    A wrapper class for the FluxPipeline to generate images using a pre-trained model and LoRA weights.
 
     Attributes:
         model_id (str): The ID of the pre-trained model.
         lora_path (str): The path to the LoRA weights.
+        lora_dir (str): The directory scanned for additional LoRA adapters.
+        max_resident_loras (int): The maximum number of LoRA adapters kept loaded.
+        loras (LoraManager): Loads, evicts and fuses the LoRA adapters.
+        device (str): The device the denoising runs on.
+        memory_budget (int): The memory budget the placement is planned for, in bytes.
+        plan (PlacementPlan): The chosen device placement and offload mode.
+        verbose (bool): Print the placement plan once it is chosen.
+        profiler (PipelineProfiler): Per-phase timings and peak memory of the generations, when enabled.
         pipe (FluxPipeline): The FluxPipeline object.
-        transformer (FluxTransformer2DModel): The FluxTransformer2DModel object.
         img2img (bool): Are we using the img2img process?
     """
 
-    def __init__(self, model_id: str, lora_paths: [str], img2img:bool=True) -> None:
+    def __init__(self, model_id: str, lora_paths: [str], img2img:bool=True, lora_dir: str = "lora", max_resident_loras: int = 4, device: str = None, memory_budget: int = None, profile: bool = False, verbose: bool = False) -> None:
         """
         Initializes the FluxWrapper with the specified model ID and LoRA weights path.
 
         Args:
             model_id (str): The ID of the pre-trained model.
-            lora_path (str): The path to the LoRA weights.
+            lora_path (str): The path to the LoRA weights. These are loaded at startup as "lora_0", "lora_1", ...
+            lora_dir (str): The directory scanned for additional LoRA adapters. Defaults to "lora".
+            max_resident_loras (int): The maximum number of LoRA adapters kept loaded. Defaults to 4.
+            device (str): The device to run on. "cuda" when available, otherwise "cpu".
+            memory_budget (int): Bytes the pipeline may use on the device. The device total when None.
+            profile (bool): Record per-phase timings and peak memory, see `profiler`. Defaults to False.
+            verbose (bool): Print the placement plan once it is chosen. Defaults to False.
         """
         self.model_id = model_id
         self.lora_paths = lora_paths
+        self.lora_dir = lora_dir
+        self.max_resident_loras = max_resident_loras
+        self.loras = None
+        self.device = device or default_device()
+        self.memory_budget = memory_budget
+        self.plan = None
         self.pipe = None
-        self.transformer = None
+        self.verbose = verbose
         self.img2img = img2img
+        self.profiler = PipelineProfiler(self.device, enabled=profile)
         self.load_model()
 
     def load_model(self) -> None:
         """
-        Loads the pre-trained model and LoRA weights, and quantizes the transformer model.
+        Loads the pre-trained model and LoRA weights, and places the pipeline within the memory budget.
         """
 
         if self.img2img:
             self.pipe = FluxImg2ImgPipeline.from_pretrained(self.model_id, torch_dtype=torch.bfloat16)
-            for i,path in enumerate(self.lora_paths):
-                self.pipe.load_lora_weights(path,adapter_name=f"lora_{i}")
-            self.pipe.to("cuda")
         else:
             self.pipe = FluxPipeline.from_pretrained(self.model_id, torch_dtype=torch.bfloat16)
-            for i,path in enumerate(self.lora_paths):
-                self.pipe.load_lora_weights(path,adapter_name=f"lora_{i}")
-            self.pipe.to("cuda")
-        self.transformer = FluxTransformer2DModel.from_pretrained(
-            self.model_id,
-            subfolder="transformer",
-            torch_dtype=torch.bfloat16
-        )
-        quantize_(self.transformer, int8_weight_only())
-
-    def generate_image(self, prompt: str, seed: int = None, steps: int = 40, lora_0_weight: float = 0.3 ,lora_1_weight: float = 1.0, width: int = 1024, height: int = 576,img2img_str=0.7) -> torch.Tensor:
+
+        self.loras = LoraManager(self.pipe, self.lora_dir, max_resident=self.max_resident_loras)
+        for i,path in enumerate(self.lora_paths):
+            self.loras.register(f"lora_{i}", path)
+            self.loras.load(f"lora_{i}")
+
+        activation_bytes = (1024 // 16) * (576 // 16) * BYTES_PER_LATENT_TOKEN
+        self.plan = plan_placement(self.pipe, activation_bytes, memory_budget=self.memory_budget, device=self.device)
+        if self.verbose:
+            print(self.plan.to_str())
+        apply_placement(self.pipe, self.plan)
+        self.profiler.wrap(self.pipe.vae, "decode", "vae_decode")
+
+    @traced("flux.generate_image", lambda self, prompt, seed=None, steps=40, *args, **kwargs: {"steps": steps})
+    def generate_image(self, prompt: str, seed: int = None, steps: int = 40, lora_0_weight: float = 0.3 ,lora_1_weight: float = 1.0, width: int = 1024, height: int = 576,img2img_str=0.7, lora_weights: dict = None, step_callback=None, preview_every: int = 0) -> torch.Tensor:
         """
         Generates an image based on the provided prompt.
 
@@ -66,55 +139,281 @@ class FluxWrapper:
             width (int, optional): The width of the generated image. Defaults to 1024.
             height (int, optional): The height of the generated image. Defaults to 576.
             steps (int, optional): The number of inference steps. Defaults to 40.
+            lora_weights (dict, optional): Adapter name to weight, replaces lora_0_weight and lora_1_weight when given.
+            step_callback (Callable, optional): Called after every step as step_callback(step, total_steps, step_time, preview),
+                where preview is a low resolution PIL image or None. Returning False stops the generation early.
+            preview_every (int, optional): Build a latent preview every this many steps, 0 for never. Defaults to 0.
 
         Returns:
             torch.Tensor: The generated image.
         """
-        prompt_embeds, pooled_prompt_embeds = get_weighted_text_embeddings_flux1(
-            pipe=self.pipe,
-            prompt=prompt
-        )
-        if seed is None:
-            seed = random.randint(0, 100000)
+        with self.profiler.generation():
+            with self.profiler.phase("text_encode"):
+                prompt_embeds, pooled_prompt_embeds = get_weighted_text_embeddings_flux1(
+                    pipe=self.pipe,
+                    prompt=prompt
+                )
+            if seed is None:
+                seed = random.randint(0, 100000)
+
+            if lora_weights is None:
+                lora_weights = self._default_lora_weights(lora_0_weight, lora_1_weight)
+            with self.profiler.phase("adapter_switch"):
+                self.loras.activate(lora_weights)
+
+            images = self._denoise(prompt_embeds, pooled_prompt_embeds, [int(seed)], int(steps), width, height, img2img_str, step_callback, int(preview_every))
+
+        return images[0]
+
+    @traced("flux.generate_images", lambda self, prompts, *args, **kwargs: {"images": len(prompts)})
+    def generate_images(self, prompts: list[str], seeds: list[int] = None, steps=40, lora_0_weight=0.3, lora_1_weight=1.0, width=1024, height=576, img2img_str=0.7, lora_weights=None, memory_budget: int = None, batch_size: int = None) -> list[Image.Image]:
+        """
+        Generates one image per prompt, packing compatible requests into batched pipeline calls.
+
+        Requests are compatible when they share resolution, steps, img2img strength and LoRA mix.
+        Any of those arguments can be given as a single value or as a list with one entry per prompt.
+
+        Args:
+            prompts (list[str]): The text prompts to render.
+            seeds (list[int], optional): One seed per prompt. Random seeds are drawn when None.
+            steps (int | list[int], optional): The number of inference steps. Defaults to 40.
+            lora_0_weight (float | list[float], optional): Weight of the first LoRA. Defaults to 0.3.
+            lora_1_weight (float | list[float], optional): Weight of the second LoRA. Defaults to 1.0.
+            width (int | list[int], optional): The width of the generated images. Defaults to 1024.
+            height (int | list[int], optional): The height of the generated images. Defaults to 576.
+            img2img_str (float | list[float], optional): Strength of the img2img pass. Defaults to 0.7.
+            lora_weights (dict | list[dict], optional): Adapter name to weight, replaces lora_0_weight and lora_1_weight when given.
+            memory_budget (int, optional): Bytes available for activations. The headroom left by the placement plan when None.
+            batch_size (int, optional): Fixed batch size, overrides the memory based estimate.
+
+        Returns:
+            list[Image.Image]: The generated images, in the same order as the prompts.
+        """
+        num_requests = len(prompts)
+        if seeds is None:
+            seeds = [random.randint(0, 100000) for _ in range(num_requests)]
+        if len(seeds) != num_requests:
+            raise ValueError("seeds must have one entry per prompt")
+
+        def per_request(value):
+            if isinstance(value, (list, tuple)):
+                if len(value) != num_requests:
+                    raise ValueError("per request arguments must have one entry per prompt")
+                return list(value)
+            return [value] * num_requests
+
+        if lora_weights is None:
+            lora_weights = [self._default_lora_weights(w_0, w_1) for w_0, w_1 in zip(per_request(lora_0_weight), per_request(lora_1_weight))]
+        else:
+            lora_weights = per_request(lora_weights)
+
+        settings = list(zip(
+            per_request(width),
+            per_request(height),
+            [int(s) for s in per_request(steps)],
+            per_request(img2img_str),
+            [LoraManager.mix_key(weights) for weights in lora_weights],
+        ))
+
+        groups = {}
+        for idx, key in enumerate(settings):
+            groups.setdefault(key, []).append(idx)
+
+        images = [None] * num_requests
+        for (w, h, n_steps, strength, mix), indices in groups.items():
+            size = batch_size or self.estimate_batch_size(w, h, memory_budget)
+            with self.profiler.phase("adapter_switch"):
+                self.loras.activate(dict(mix))
+
+            for start in range(0, len(indices), size):
+                batch = indices[start:start + size]
+                with self.profiler.generation():
+                    with self.profiler.phase("text_encode"):
+                        embeds = [get_weighted_text_embeddings_flux1(pipe=self.pipe, prompt=prompts[i]) for i in batch]
+                        prompt_embeds, pooled_prompt_embeds = stack_prompt_embeds(embeds)
+
+                    batch_images = self._denoise(prompt_embeds, pooled_prompt_embeds, [seeds[i] for i in batch], n_steps, w, h, strength)
+                for i, image in zip(batch, batch_images):
+                    images[i] = image
+
+        return images
+
+    def _default_lora_weights(self, lora_0_weight: float, lora_1_weight: float) -> dict:
+        """
+        Maps the legacy two-slider weights onto the adapters loaded from `lora_paths`.
+
+        Args:
+            lora_0_weight (float): Weight of the first LoRA.
+            lora_1_weight (float): Weight of the second LoRA.
+
+        Returns:
+            dict: Adapter name to weight.
+        """
+        weights = [lora_0_weight, lora_1_weight]
+        return {f"lora_{i}": weights[i] for i in range(min(len(self.lora_paths), len(weights)))}
+
+    def estimate_batch_size(self, width: int, height: int, memory_budget: int = None, max_batch_size: int = 8) -> int:
+        """
+        Estimates how many images of the given size fit in a single pipeline call.
+
+        Args:
+            width (int): The width of the generated images.
+            height (int): The height of the generated images.
+            memory_budget (int, optional): Bytes available for activations. The headroom left by the placement plan when None.
+            max_batch_size (int, optional): Upper bound on the batch size. Defaults to 8.
+
+        Returns:
+            int: The batch size, at least 1.
+        """
+        latent_tokens = (width // 16) * (height // 16)
+        per_sample = latent_tokens * BYTES_PER_LATENT_TOKEN + width * height * BYTES_PER_DECODED_PIXEL
+
+        if memory_budget is None:
+            # the plan already accounts for one sample on top of the resident weights
+            memory_budget = self.plan.memory_budget - self.plan.expected_peak + per_sample
+            if self.device.startswith("cuda"):
+                free, _ = torch.cuda.mem_get_info()
+                memory_budget = min(memory_budget, free - RESERVED_BYTES)
+
+        return max(1, min(max_batch_size, int(memory_budget // per_sample)))
+
+    def latent_preview(self, latents: torch.Tensor, width: int, height: int) -> Image.Image:
+        """
+        Builds a low resolution preview of the first sample from packed latents, without running the VAE.
+
+        Args:
+            latents (torch.Tensor): The packed latents of the current step.
+            width (int): The width of the generated image.
+            height (int): The height of the generated image.
+
+        Returns:
+            Image.Image: The preview, at 1/8 of the output resolution.
+        """
+        latents = self.pipe._unpack_latents(latents[:1], height, width, self.pipe.vae_scale_factor)
+        factors = torch.tensor(LATENT_RGB_FACTORS, device=latents.device)
+        bias = torch.tensor(LATENT_RGB_BIAS, device=latents.device)
+        rgb = torch.einsum("bchw,cr->bhwr", latents.float(), factors) + bias
+        rgb = ((rgb.clamp(-1, 1) + 1) * 127.5).to(torch.uint8)
+        return Image.fromarray(rgb[0].cpu().numpy())
+
+    def _step_callback(self, step_callback, preview_every: int, width: int, height: int, step_offset: int, total_steps: int):
+        """
+        Adapts a progress callback to the diffusers callback_on_step_end interface.
+
+        Args:
+            step_callback (Callable): Called as step_callback(step, total_steps, step_time, preview), or None. Returning False interrupts the generation.
+            preview_every (int): Build a latent preview every this many steps, 0 for never.
+            width (int): The width of the generated image.
+            height (int): The height of the generated image.
+            step_offset (int): Steps already run by earlier passes of the same generation.
+            total_steps (int): Steps of all passes of the generation.
+
+        Returns:
+            Callable: The diffusers step end callback.
+        """
+        last_step = time.perf_counter()
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            nonlocal last_step
+            if self.profiler.enabled:
+                self.profiler.sync()
+            now = time.perf_counter()
+            step_time = now - last_step
+            last_step = now
+            if self.profiler.enabled:
+                self.profiler.record("step", step_time)
+
+            if step_callback is None:
+                return callback_kwargs
+
+            done = step_offset + step + 1
+            preview = None
+            if preview_every and done % preview_every == 0:
+                preview = self.latent_preview(callback_kwargs["latents"], width, height)
+
+            if step_callback(done, total_steps, step_time, preview) is False:
+                pipe._interrupt = True
+            return callback_kwargs
+
+        return on_step_end
+
+    def _denoise(self, prompt_embeds, pooled_prompt_embeds, seeds: list[int], steps: int, width: int, height: int, img2img_str: float, step_callback=None, preview_every: int = 0) -> list[Image.Image]:
+        """
+        Runs the pipeline on a batch of prompt embeddings with one generator per sample.
+
+        Args:
+            prompt_embeds (torch.Tensor): The batched prompt embeddings.
+            pooled_prompt_embeds (torch.Tensor): The batched pooled prompt embeddings.
+            seeds (list[int]): One seed per sample.
+            steps (int): The number of inference steps.
+            width (int): The width of the generated images.
+            height (int): The height of the generated images.
+            img2img_str (float): Strength of the img2img pass.
+            step_callback (Callable, optional): Progress callback, see _step_callback.
+            preview_every (int, optional): Build a latent preview every this many steps, 0 for never.
+
+        Returns:
+            list[Image.Image]: The generated images.
+        """
+        # the img2img pass only runs the last `strength` fraction of the schedule
+        total_steps = steps + (int(steps * img2img_str) if self.img2img else 0)
+
+        def callbacks(offset):
+            # built right before each pass so the first step time starts with the pass
+            if step_callback is None and not self.profiler.enabled:
+                return {}
+            return {
+                "callback_on_step_end": self._step_callback(step_callback, preview_every, width, height, offset, total_steps),
+                "callback_on_step_end_tensor_inputs": ["latents"],
+            }
 
-        self.pipe.set_adapters(["lora_0", "lora_1"], adapter_weights=[lora_0_weight, lora_1_weight])
-        
         if self.img2img:
 
-            np_img = np.random.rand(width,height,3) * 255
-            noise_image = Image.fromarray(np_img.astype('uint8'))
+            noise_images = []
+            for _ in seeds:
+                np_img = np.random.rand(width,height,3) * 255
+                noise_images.append(Image.fromarray(np_img.astype('uint8')))
 
             # first generation, no img2img
-            image = self.pipe(
-                prompt_embeds=prompt_embeds,
-                pooled_prompt_embeds=pooled_prompt_embeds,
-                num_inference_steps=steps,
-                generator=torch.Generator("cuda").manual_seed(seed),
-                width=width,
-                height=height,
-                strength=1.0,
-                image=noise_image
-            ).images[0]
-
-            image = self.pipe(
-                prompt_embeds=prompt_embeds,
-                pooled_prompt_embeds=pooled_prompt_embeds,
-                num_inference_steps=steps,
-                generator=torch.Generator("cuda").manual_seed(seed),
-                width=width,
-                height=height,
-                strength=img2img_str,
-                image=image
-            ).images[0]
-            
+            with self.profiler.phase("first_pass"):
+                images = self.pipe(
+                    prompt_embeds=prompt_embeds,
+                    pooled_prompt_embeds=pooled_prompt_embeds,
+                    num_inference_steps=steps,
+                    generator=[torch.Generator(self.plan.generator_device).manual_seed(seed) for seed in seeds],
+                    width=width,
+                    height=height,
+                    strength=1.0,
+                    image=noise_images,
+                    **callbacks(0)
+                ).images
+
+            if self.pipe.interrupt:
+                return images
+
+            with self.profiler.phase("img2img_pass"):
+                images = self.pipe(
+                    prompt_embeds=prompt_embeds,
+                    pooled_prompt_embeds=pooled_prompt_embeds,
+                    num_inference_steps=steps,
+                    generator=[torch.Generator(self.plan.generator_device).manual_seed(seed) for seed in seeds],
+                    width=width,
+                    height=height,
+                    strength=img2img_str,
+                    image=images,
+                    **callbacks(steps)
+                ).images
+
         else:
-            image = self.pipe(
-                prompt_embeds=prompt_embeds,
-                pooled_prompt_embeds=pooled_prompt_embeds,
-                num_inference_steps=steps,
-                generator=torch.Generator("cuda").manual_seed(seed),
-                width=width,
-                height=height
-            ).images[0]
-
-        return image
\ No newline at end of file
+            with self.profiler.phase("first_pass"):
+                images = self.pipe(
+                    prompt_embeds=prompt_embeds,
+                    pooled_prompt_embeds=pooled_prompt_embeds,
+                    num_inference_steps=steps,
+                    generator=[torch.Generator(self.plan.generator_device).manual_seed(seed) for seed in seeds],
+                    width=width,
+                    height=height,
+                    **callbacks(0)
+                ).images
+
+        return images
@@ -0,0 +1,392 @@
+import ipaddress
+import os
+import queue
+import random
+import secrets
+import socket
+import threading
+import time
+import numpy as np
+
+from collections import deque
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+from PIL import Image
+
+DEFAULT_ADDRESS = ("localhost", 6000)
+
+
+def default_authkey() -> bytes:
+    """
+    Reads the key shared by the image worker and its clients from the environment.
+
+    Returns:
+        bytes: The value of IMAGE_WORKER_AUTHKEY, or None when it is not set.
+    """
+    key = os.getenv("IMAGE_WORKER_AUTHKEY")
+    return key.encode() if key else None
+
+
+def key_file_path(address: tuple) -> str:
+    """
+    Returns where a worker started without a key writes the random key it generated.
+
+    Args:
+        address (tuple): The (host, port) of the worker.
+
+    Returns:
+        str: IMAGE_WORKER_KEY_FILE, or ~/.simulated_agents/image_worker_<port>.key.
+    """
+    return os.getenv("IMAGE_WORKER_KEY_FILE") or os.path.join(os.path.expanduser("~"), ".simulated_agents", f"image_worker_{address[1]}.key")
+
+
+def is_loopback(host: str) -> bool:
+    """
+    Tells whether a host name or address only reaches this machine.
+    """
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def worker_authkey(address: tuple, authkey: bytes = None) -> bytes:
+    """
+    Picks the key an image worker requires from its clients.
+
+    Connections unpickle what they receive, so the key is what keeps other users from running code in the
+    worker. Without an explicit key or IMAGE_WORKER_AUTHKEY, a random key is generated for this run and
+    written to key_file_path with 0600 permissions, where clients on the same host read it.
+
+    Args:
+        address (tuple): The (host, port) the worker listens on.
+        authkey (bytes, optional): The key. Read from IMAGE_WORKER_AUTHKEY when None.
+
+    Returns:
+        bytes: The key.
+
+    Raises:
+        ValueError: When the worker listens on a non-loopback address without a key that was set explicitly.
+    """
+    authkey = authkey or default_authkey()
+    if authkey:
+        return authkey
+    if not is_loopback(address[0]):
+        raise ValueError(f"listening on {address[0]} needs a key, set IMAGE_WORKER_AUTHKEY for the worker and its clients")
+    authkey = secrets.token_hex(32).encode()
+    path = key_file_path(address)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # O_CREAT keeps the mode of a file that already existed
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(authkey)
+    return authkey
+
+
+def client_authkey(address: tuple) -> bytes:
+    """
+    Finds the key to present to an image worker: IMAGE_WORKER_AUTHKEY, or the key file the worker wrote.
+
+    Args:
+        address (tuple): The (host, port) of the worker.
+
+    Returns:
+        bytes: The key.
+
+    Raises:
+        ValueError: When neither is available.
+    """
+    authkey = default_authkey()
+    if authkey:
+        return authkey
+    try:
+        with open(key_file_path(address), "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        raise ValueError(f"no key for the image worker at {address[0]}:{address[1]}, set IMAGE_WORKER_AUTHKEY or start the worker on this host")
+
+
+def parse_address(address: str) -> tuple:
+    """
+    Parses a "host:port" string.
+
+    Args:
+        address (str): The address to parse.
+
+    Returns:
+        tuple: The (host, port) pair.
+    """
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class ImageWorker:
+    """
+    Serves image generation requests from a single loaded FluxWrapper to any number of local clients.
+
+    Requests arrive over a multiprocessing connection and are queued, then rendered one batch at a
+    time by a single generation thread. Pixels are returned through shared memory blocks, the client
+    copies them out and unlinks the block before closing its connection. Blocks still left when a
+    connection closes, e.g. because the client died, are unlinked by the worker.
+
+    Attributes:
+        image_gen (FluxWrapper): The wrapper that owns the loaded pipeline.
+        address (tuple): The (host, port) the worker listens on.
+        authkey (bytes): The key clients must present.
+        requests (queue.Queue): Requests waiting for the generation thread.
+        latencies (deque): (queue wait, total latency) of recent requests, in seconds.
+        completed (int): Number of requests served.
+        failed (int): Number of requests that raised an error.
+    """
+
+    def __init__(self, image_gen, address: tuple = DEFAULT_ADDRESS, authkey: bytes = None, history: int = 1000) -> None:
+        """
+        Initializes the ImageWorker.
+
+        Args:
+            image_gen (FluxWrapper): The wrapper that owns the loaded pipeline.
+            address (tuple): The (host, port) to listen on. Defaults to localhost:6000.
+            authkey (bytes): The key clients must present. See worker_authkey when None.
+            history (int): Number of recent requests kept for latency stats. Defaults to 1000.
+        """
+        self.image_gen = image_gen
+        self.address = address
+        self.authkey = worker_authkey(address, authkey)
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=history)
+        self.completed = 0
+        self.failed = 0
+        self.busy = False
+
+    def serve_forever(self) -> None:
+        """
+        Starts the generation thread and accepts client connections until the process is stopped.
+        """
+        threading.Thread(target=self._generation_loop, daemon=True).start()
+
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"image worker listening on {self.address[0]}:{self.address[1]}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def stats(self) -> dict:
+        """
+        Summarizes queue depth and recent request latencies.
+
+        Returns:
+            dict: Queue depth, counters and latency percentiles in seconds, plus the pipeline's
+                per-phase stats under "profile" when the generator has profiling enabled.
+        """
+        waits = sorted(wait for wait, _ in self.latencies)
+        totals = sorted(total for _, total in self.latencies)
+
+        def percentile(values, q):
+            if not values:
+                return None
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        profiler = getattr(self.image_gen, "profiler", None)
+
+        return {
+            "queue_depth": self.requests.qsize(),
+            "busy": self.busy,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_wait_p50": percentile(waits, 0.5),
+            "queue_wait_p95": percentile(waits, 0.95),
+            "latency_p50": percentile(totals, 0.5),
+            "latency_p95": percentile(totals, 0.95),
+            "profile": profiler.stats() if profiler is not None and profiler.enabled else None,
+        }
+
+    def _handle_connection(self, conn) -> None:
+        """
+        Answers the messages of one client connection until it closes, then unlinks the shared memory
+        blocks sent on it that the client did not claim.
+
+        Args:
+            conn (Connection): The client connection.
+        """
+        # names of the shared memory blocks sent on this connection
+        sent = []
+        try:
+            with conn:
+                while True:
+                    try:
+                        message = conn.recv()
+                    except EOFError:
+                        return
+
+                    kind = message.get("type") if isinstance(message, dict) else None
+                    if kind == "stats":
+                        conn.send(self.stats())
+                    elif kind == "generate":
+                        request = {"kwargs": message.get("kwargs", {}), "submitted": time.perf_counter(), "done": threading.Event()}
+                        self.requests.put(request)
+                        request["done"].wait()
+                        sent += [image["name"] for image in request["result"].get("images", [])]
+                        conn.send(request["result"])
+                    else:
+                        conn.send({"error": f"unknown message type: {kind}"})
+        finally:
+            self._unlink_unclaimed(sent)
+
+    def _generation_loop(self) -> None:
+        """
+        Renders queued requests one at a time on the loaded pipeline.
+        """
+        while True:
+            request = self.requests.get()
+            self.busy = True
+            started = time.perf_counter()
+            try:
+                images = self.image_gen.generate_images(**request["kwargs"])
+                result = {"images": [self._to_shared_memory(image) for image in images]}
+                self.completed += 1
+            except Exception as e:
+                result = {"error": repr(e)}
+                self.failed += 1
+            finished = time.perf_counter()
+            self.busy = False
+
+            queue_wait = started - request["submitted"]
+            latency = finished - request["submitted"]
+            self.latencies.append((queue_wait, latency))
+            result["queue_wait"] = queue_wait
+            result["latency"] = latency
+            print(f"request done in {latency:.1f}s ({queue_wait:.1f}s queued), queue depth {self.requests.qsize()}")
+
+            request["result"] = result
+            request["done"].set()
+
+    @staticmethod
+    def _unlink_unclaimed(names: list) -> None:
+        """
+        Unlinks the shared memory blocks a client left behind. Blocks it already unlinked are skipped.
+
+        Args:
+            names (list): The block names.
+        """
+        for name in names:
+            try:
+                shm = SharedMemory(name=name)
+            except FileNotFoundError:
+                continue
+            shm.close()
+            shm.unlink()
+
+    @staticmethod
+    def _to_shared_memory(image: Image.Image) -> dict:
+        """
+        Copies an image into a new shared memory block that the client takes ownership of.
+
+        Args:
+            image (Image.Image): The image to share.
+
+        Returns:
+            dict: The block name and array shape.
+        """
+        pixels = np.asarray(image.convert("RGB"))
+        shm = SharedMemory(create=True, size=pixels.nbytes)
+        np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[:] = pixels
+        # the client unlinks the block, so the worker's tracker must not clean it up as well
+        resource_tracker.unregister(shm._name, "shared_memory")
+        shm.close()
+        return {"name": shm.name, "shape": pixels.shape}
+
+
+class ImageWorkerClient:
+    """
+    Sends image generation requests to an ImageWorker. Mirrors the FluxWrapper generation methods.
+
+    Attributes:
+        address (tuple): The (host, port) of the worker.
+        authkey (bytes): The key presented to the worker, None to look it up on every connection, see client_authkey.
+    """
+
+    def __init__(self, address: tuple = DEFAULT_ADDRESS, authkey: bytes = None) -> None:
+        """
+        Initializes the ImageWorkerClient.
+
+        Args:
+            address (tuple | str): The (host, port) or "host:port" of the worker. Defaults to localhost:6000.
+            authkey (bytes): The key presented to the worker. See client_authkey when None.
+        """
+        if isinstance(address, str):
+            address = parse_address(address)
+        self.address = address
+        self.authkey = authkey
+
+    def generate_image(self, prompt: str, seed: int = None, steps: int = 40, lora_0_weight: float = 0.3 ,lora_1_weight: float = 1.0, width: int = 1024, height: int = 576,img2img_str=0.7, lora_weights: dict = None) -> Image.Image:
+        """
+        Generates an image on the worker. See FluxWrapper.generate_image.
+
+        Returns:
+            Image.Image: The generated image.
+        """
+        if seed is None:
+            seed = random.randint(0, 100000)
+        return self.generate_images([prompt], [int(seed)], steps=steps, lora_0_weight=lora_0_weight, lora_1_weight=lora_1_weight,
+                                    width=width, height=height, img2img_str=img2img_str, lora_weights=lora_weights)[0]
+
+    def generate_images(self, prompts: list[str], seeds: list[int] = None, **kwargs) -> list[Image.Image]:
+        """
+        Generates one image per prompt on the worker. See FluxWrapper.generate_images.
+
+        Returns:
+            list[Image.Image]: The generated images, in the same order as the prompts.
+        """
+        with Client(self.address, authkey=self.authkey or client_authkey(self.address)) as conn:
+            conn.send({"type": "generate", "kwargs": {"prompts": prompts, "seeds": seeds, **kwargs}})
+            result = conn.recv()
+            if "error" in result:
+                raise RuntimeError(f"image worker error: {result['error']}")
+            # the worker unlinks the blocks not copied out by the time the connection closes
+            return [self._from_shared_memory(image) for image in result["images"]]
+
+    def stats(self) -> dict:
+        """
+        Reads the worker's queue depth and latency stats.
+
+        Returns:
+            dict: See ImageWorker.stats.
+        """
+        return self._request({"type": "stats"})
+
+    def _request(self, message: dict) -> dict:
+        """
+        Sends one message on a fresh connection, so concurrent callers never share a connection.
+
+        Args:
+            message (dict): The message to send.
+
+        Returns:
+            dict: The worker's reply.
+        """
+        with Client(self.address, authkey=self.authkey or client_authkey(self.address)) as conn:
+            conn.send(message)
+            return conn.recv()
+
+    @staticmethod
+    def _from_shared_memory(image: dict) -> Image.Image:
+        """
+        Copies an image out of a shared memory block and releases the block.
+
+        Args:
+            image (dict): The block name and array shape.
+
+        Returns:
+            Image.Image: The image.
+        """
+        shm = SharedMemory(name=image["name"])
+        pixels = np.ndarray(image["shape"], dtype=np.uint8, buffer=shm.buf).copy()
+        shm.close()
+        shm.unlink()
+        return Image.fromarray(pixels)
@@ -0,0 +1,222 @@
+import os
+import re
+
+from collections import Counter, OrderedDict
+
+
+class LoraManager:
+    """
+    Loads LoRA adapters into a diffusers pipeline on demand and keeps frequently used weight mixes fused.
+
+    Adapters are addressed by name. Names come from the files found under `lora_dir` (the file stem)
+    or from explicit `register` calls. A file registered under a second name becomes an alias of the
+    first, so it is loaded once and takes one resident slot. At most `max_resident` adapters are kept
+    loaded, the least recently used one is unloaded first. A weight mix that has been requested
+    `fuse_after` times is fused into the transformer weights, so repeated generations with that mix skip
+    adapter switching and the per-step LoRA matmuls. Fusing merges the LoRA deltas into the weights in
+    place, so only one mix can be fused at a time, and it is unfused before any other mix is applied.
+
+    Attributes:
+        pipe: The diffusers pipeline the adapters are loaded into.
+        lora_dir (str): Directory scanned for `.safetensors` adapters.
+        max_resident (int): Maximum number of adapters kept loaded.
+        fuse_after (int): Number of requests after which a weight mix gets fused.
+        available (Dict[str, str]): Adapter name to weights path.
+        aliases (Dict[str, str]): Other names of the available adapters, to the name they are loaded under.
+        resident (OrderedDict): Loaded adapter names, least recently used first.
+        usage (Counter): Number of requests per weight mix.
+        fused (tuple): The weight mix currently fused into the weights, if any.
+        active (tuple): The weight mix currently set as unfused adapters, if any.
+        stats (Counter): Counts of loads, unloads, cache hits, switches and fuses.
+    """
+
+    def __init__(self, pipe, lora_dir: str = "lora", max_resident: int = 4, fuse_after: int = 3) -> None:
+        """
+        Initializes the LoraManager and discovers the adapters in `lora_dir`.
+
+        Args:
+            pipe: The diffusers pipeline the adapters are loaded into.
+            lora_dir (str): Directory scanned for `.safetensors` adapters. Defaults to "lora".
+            max_resident (int): Maximum number of adapters kept loaded. Defaults to 4.
+            fuse_after (int): Number of requests after which a weight mix gets fused. Defaults to 3.
+        """
+        self.pipe = pipe
+        self.lora_dir = lora_dir
+        self.max_resident = max_resident
+        self.fuse_after = fuse_after
+        self.available = {}
+        self.aliases = {}
+        self.resident = OrderedDict()
+        self.usage = Counter()
+        self.fused = None
+        self.active = None
+        self.stats = Counter()
+        self.discover()
+
+    @staticmethod
+    def adapter_name(path: str) -> str:
+        """
+        Derives a valid adapter name from a weights path.
+
+        Args:
+            path (str): Path to the LoRA weights.
+
+        Returns:
+            str: The file stem with every character that is not alphanumeric replaced by an underscore.
+        """
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return re.sub(r"\W", "_", stem)
+
+    def discover(self) -> list[str]:
+        """
+        Scans `lora_dir` for adapters and registers any that are not known yet.
+
+        Returns:
+            list[str]: The names of all available adapters.
+        """
+        if os.path.isdir(self.lora_dir):
+            for file in sorted(os.listdir(self.lora_dir)):
+                if file.endswith(".safetensors"):
+                    path = os.path.join(self.lora_dir, file)
+                    if self._name_of(path) is None:
+                        self.register(self.adapter_name(path), path)
+        return list(self.available)
+
+    def register(self, name: str, path: str) -> None:
+        """
+        Makes an adapter available under the given name without loading it. When the file is already
+        available under another name, the new name becomes an alias of it.
+
+        Args:
+            name (str): The adapter name.
+            path (str): Path to the LoRA weights.
+        """
+        known = self._name_of(path)
+        if known is not None and known != name:
+            self.aliases[name] = known
+        else:
+            self.aliases.pop(name, None)
+            self.available[name] = path
+
+    def resolve(self, name: str) -> str:
+        """
+        Returns the name an adapter is loaded under, following aliases.
+        """
+        return self.aliases.get(name, name)
+
+    def _name_of(self, path: str) -> str:
+        """
+        Returns the name a weights file is available under, comparing resolved paths, or None.
+        """
+        path = os.path.realpath(path)
+        for name, known in self.available.items():
+            if os.path.realpath(known) == path:
+                return name
+        return None
+
+    def load(self, name: str, pinned: tuple = ()) -> None:
+        """
+        Loads an adapter if it is not resident yet, evicting the least recently used adapters over the limit.
+
+        Args:
+            name (str): The adapter name.
+            pinned (tuple): Adapter names that must not be evicted to make room.
+        """
+        name = self.resolve(name)
+        if name not in self.available:
+            raise ValueError(f"Unknown LoRA adapter: {name}")
+
+        if name in self.resident:
+            self.resident.move_to_end(name)
+            return
+
+        self._unfuse()
+        self.pipe.load_lora_weights(self.available[name], adapter_name=name)
+        self.resident[name] = self.available[name]
+        self.stats["loads"] += 1
+
+        for resident in list(self.resident):
+            if len(self.resident) <= self.max_resident:
+                break
+            if resident != name and resident not in pinned:
+                self.unload(resident)
+
+    def unload(self, name: str) -> None:
+        """
+        Removes a resident adapter from the pipeline.
+
+        Args:
+            name (str): The adapter name.
+        """
+        name = self.resolve(name)
+        if name not in self.resident:
+            return
+
+        self._unfuse()
+        self.pipe.delete_adapters(name)
+        del self.resident[name]
+        if self.active is not None and name in dict(self.active):
+            self.active = None
+        self.stats["unloads"] += 1
+
+    def activate(self, weights: dict) -> None:
+        """
+        Applies a weight mix to the pipeline, loading adapters and fusing the mix as needed.
+
+        Args:
+            weights (dict): Adapter name to weight. Adapters with a weight of zero are skipped.
+        """
+        resolved = {}
+        for name, weight in weights.items():
+            resolved[self.resolve(name)] = resolved.get(self.resolve(name), 0.0) + weight
+        mix = self.mix_key(resolved)
+        self.usage[mix] += 1
+
+        if mix in (self.fused, self.active):
+            self.stats["hits"] += 1
+            return
+
+        self._unfuse()
+        self.stats["switches"] += 1
+
+        if not mix:
+            if self.resident:
+                self.pipe.disable_lora()
+            self.active = mix
+            return
+
+        names = [name for name, _ in mix]
+        for name in names:
+            self.load(name, pinned=names)
+
+        self.pipe.enable_lora()
+        self.pipe.set_adapters(names, adapter_weights=[weight for _, weight in mix])
+
+        if self.usage[mix] >= self.fuse_after:
+            self.pipe.fuse_lora(adapter_names=names, lora_scale=1.0)
+            self.fused = mix
+            self.active = None
+            self.stats["fuses"] += 1
+        else:
+            self.active = mix
+
+    @staticmethod
+    def mix_key(weights: dict) -> tuple:
+        """
+        Builds a hashable key for a weight mix.
+
+        Args:
+            weights (dict): Adapter name to weight.
+
+        Returns:
+            tuple: Sorted (name, weight) pairs with zero weights dropped.
+        """
+        return tuple(sorted((name, float(weight)) for name, weight in weights.items() if weight))
+
+    def _unfuse(self) -> None:
+        """
+        Restores the unfused transformer weights if a mix is currently fused.
+        """
+        if self.fused is not None:
+            self.pipe.unfuse_lora()
+            self.fused = None
@@ -0,0 +1,172 @@
+import os
+import torch
+
+from pydantic import BaseModel
+
+# bytes per output pixel the VAE decode needs while decoding one image in a single tile
+BYTES_PER_DECODED_PIXEL = 128 * 2 * 4
+# edge length of a VAE tile when tiling is enabled
+VAE_TILE_SIZE = 512
+
+PIPELINE_COMPONENTS = ["transformer", "text_encoder", "text_encoder_2", "vae"]
+
+
+class PlacementPlan(BaseModel):
+    """
+    Where the pipeline weights live and how the VAE decodes, with the peak memory this is expected to need.
+
+    Attributes:
+        mode (str): One of "full", "model_offload" or "sequential_offload".
+        device (str): The device the denoising runs on.
+        generator_device (str): The device the torch generators are created on.
+        vae_tiling (bool): Decode the latents tile by tile.
+        vae_slicing (bool): Decode a batch one image at a time.
+        memory_budget (int): The budget the plan was made for, in bytes.
+        expected_peak (int): Expected peak memory on `device`, in bytes.
+        fits (bool): Whether the expected peak is within the budget.
+    """
+    mode: str
+    device: str
+    generator_device: str
+    vae_tiling: bool
+    vae_slicing: bool
+    memory_budget: int
+    expected_peak: int
+    fits: bool
+
+    def to_str(self):
+        output_string = f"placement: {self.mode} on {self.device}"
+        if self.vae_tiling:
+            output_string += ", vae tiling"
+        if self.vae_slicing:
+            output_string += ", vae slicing"
+        output_string += f", expected peak {self.expected_peak / 1024**3:.2f} GiB of {self.memory_budget / 1024**3:.2f} GiB"
+        if not self.fits:
+            output_string += " (over budget)"
+        return output_string
+
+
+def default_device() -> str:
+    """
+    Picks the device to run on.
+
+    Returns:
+        str: "cuda" when a GPU is available, otherwise "cpu".
+    """
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def default_memory_budget(device: str) -> int:
+    """
+    Reads the total memory of the device.
+
+    Args:
+        device (str): The device to read the memory of.
+
+    Returns:
+        int: Total memory in bytes, system RAM for the CPU.
+    """
+    if device.startswith("cuda"):
+        return torch.cuda.get_device_properties(torch.device(device)).total_memory
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def module_bytes(module) -> int:
+    """
+    Sums the size of the parameters and buffers of a module.
+
+    Args:
+        module (torch.nn.Module): The module to measure.
+
+    Returns:
+        int: Size in bytes.
+    """
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def plan_placement(pipe, activation_bytes: int, width: int = 1024, height: int = 576, memory_budget: int = None, device: str = None) -> PlacementPlan:
+    """
+    Picks the fastest placement whose expected peak memory fits in the budget.
+
+    Candidates are tried from fastest to most frugal: everything on the device, model CPU offload,
+    then sequential CPU offload, each first without and then with VAE tiling and slicing. On the
+    CPU there is nothing to offload to, so only the VAE options are varied. When nothing fits the
+    most frugal plan is returned with `fits` set to False.
+
+    Args:
+        pipe: The diffusers pipeline, with its weights still on the CPU.
+        activation_bytes (int): Expected activation memory of one denoising step for one image.
+        width (int): The width of the generated images. Defaults to 1024.
+        height (int): The height of the generated images. Defaults to 576.
+        memory_budget (int, optional): Bytes available on the device. The device total when None.
+        device (str, optional): The device to run on. Picked automatically when None.
+
+    Returns:
+        PlacementPlan: The chosen plan.
+    """
+    device = device or default_device()
+    if memory_budget is None:
+        memory_budget = default_memory_budget(device)
+
+    components = [getattr(pipe, name, None) for name in PIPELINE_COMPONENTS]
+    components = [component for component in components if isinstance(component, torch.nn.Module)]
+    component_sizes = [module_bytes(component) for component in components]
+    weights = sum(component_sizes)
+    largest_component = max(component_sizes, default=0)
+    largest_leaf = max(
+        (module_bytes(m) for component in components for m in component.modules() if not list(m.children())),
+        default=0,
+    )
+
+    decode_full = width * height * BYTES_PER_DECODED_PIXEL
+    decode_tiled = min(decode_full, VAE_TILE_SIZE * VAE_TILE_SIZE * BYTES_PER_DECODED_PIXEL)
+
+    if device == "cpu":
+        resident = {"full": weights}
+    else:
+        resident = {
+            "full": weights,
+            "model_offload": largest_component,
+            "sequential_offload": largest_leaf,
+        }
+
+    plan = None
+    for mode, resident_bytes in resident.items():
+        for tiled in (False, True):
+            expected_peak = resident_bytes + activation_bytes + (decode_tiled if tiled else decode_full)
+            plan = PlacementPlan(
+                mode=mode,
+                device=device,
+                generator_device=device,
+                vae_tiling=tiled,
+                vae_slicing=tiled,
+                memory_budget=memory_budget,
+                expected_peak=expected_peak,
+                fits=expected_peak <= memory_budget,
+            )
+            if plan.fits:
+                return plan
+
+    return plan
+
+
+def apply_placement(pipe, plan: PlacementPlan) -> None:
+    """
+    Moves the pipeline according to the plan and enables the chosen VAE options.
+
+    Args:
+        pipe: The diffusers pipeline, with its weights still on the CPU.
+        plan (PlacementPlan): The plan to apply.
+    """
+    if plan.mode == "model_offload":
+        pipe.enable_model_cpu_offload(device=plan.device)
+    elif plan.mode == "sequential_offload":
+        pipe.enable_sequential_cpu_offload(device=plan.device)
+    else:
+        pipe.to(plan.device)
+
+    if plan.vae_tiling:
+        pipe.vae.enable_tiling()
+    if plan.vae_slicing:
+        pipe.vae.enable_slicing()
@@ -0,0 +1,205 @@
+import contextlib
+import resource
+import sys
+import time
+import torch
+
+from collections import defaultdict, deque
+
+
+class PipelineProfiler:
+    """
+    Opt-in per-phase timings and peak memory for the diffusion pipeline, aggregated over many generations.
+
+    Phases recorded by FluxWrapper: "text_encode", "adapter_switch", "first_pass", "img2img_pass", "step" and "vae_decode".
+    A pass includes its steps and VAE decode. The first step of a pass also includes the pipeline's setup before the loop.
+
+    Attributes:
+        device (str): The device the pipeline runs on. CUDA work is synchronized before a phase is timed.
+        enabled (bool): Whether phases are recorded.
+        history (int): The number of samples kept per phase for the percentiles.
+        phases (dict): Phase name to {"count", "total", "max", "samples"}.
+        generations (int): The number of profiled generations.
+        peak_memory (int): The highest peak memory seen in a generation, in bytes.
+        last_peak_memory (int): The peak memory of the last generation, in bytes.
+    """
+
+    def __init__(self, device: str, enabled: bool = False, history: int = 1000) -> None:
+        """
+        Initializes the profiler.
+
+        Args:
+            device (str): The device the pipeline runs on.
+            enabled (bool, optional): Whether phases are recorded. Defaults to False.
+            history (int, optional): The number of samples kept per phase for the percentiles. Defaults to 1000.
+        """
+        self.device = device
+        self.enabled = enabled
+        self.history = history
+        self._torch_profile = None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears the aggregated stats.
+        """
+        self.phases = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0, "samples": deque(maxlen=self.history)})
+        self.generations = 0
+        self.peak_memory = 0
+        self.last_peak_memory = 0
+
+    def sync(self) -> None:
+        """
+        Waits for queued CUDA work so that timings cover it.
+        """
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize()
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Adds one sample to a phase.
+
+        Args:
+            name (str): The phase name.
+            seconds (float): The time spent in the phase.
+        """
+        phase = self.phases[name]
+        phase["count"] += 1
+        phase["total"] += seconds
+        phase["max"] = max(phase["max"], seconds)
+        phase["samples"].append(seconds)
+
+    @contextlib.contextmanager
+    def _phase(self, name: str):
+        label = torch.profiler.record_function(name) if self._torch_profile is not None else contextlib.nullcontext()
+        with label:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.sync()
+                self.record(name, time.perf_counter() - start)
+
+    def phase(self, name: str):
+        """
+        Times a block as one sample of a phase, and labels it in a captured torch.profiler trace.
+
+        Args:
+            name (str): The phase name.
+
+        Returns:
+            A context manager, a no-op while profiling is disabled.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._phase(name)
+
+    @contextlib.contextmanager
+    def _generation(self):
+        if self.device.startswith("cuda"):
+            torch.cuda.reset_peak_memory_stats()
+        try:
+            yield
+        finally:
+            self.generations += 1
+            self.last_peak_memory = self.memory_peak()
+            self.peak_memory = max(self.peak_memory, self.last_peak_memory)
+
+    def generation(self):
+        """
+        Marks one generation call, whose peak memory is recorded when it ends.
+
+        Returns:
+            A context manager, a no-op while profiling is disabled.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._generation()
+
+    def memory_peak(self) -> int:
+        """
+        Reads the peak memory since the current generation started.
+
+        On CUDA this is the peak of the caching allocator. On CPU it is the peak resident set size of the process,
+        which cannot be reset, so it only grows across generations.
+
+        Returns:
+            int: The peak memory in bytes.
+        """
+        if self.device.startswith("cuda"):
+            return torch.cuda.max_memory_allocated()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def wrap(self, obj, attr: str, name: str) -> None:
+        """
+        Replaces a method of an object with one that records its calls as a phase.
+
+        Args:
+            obj: The object, e.g. the pipeline's VAE.
+            attr (str): The method name, e.g. "decode".
+            name (str): The phase name.
+        """
+        method = getattr(obj, attr)
+
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return method(*args, **kwargs)
+
+        setattr(obj, attr, timed)
+
+    @contextlib.contextmanager
+    def capture(self, path: str):
+        """
+        Captures a torch.profiler trace of the calls made inside the block and writes it as a Chrome trace.
+        Profiling is enabled for the duration of the block so the phases show up as labelled ranges.
+
+        Args:
+            path (str): Where to write the trace.
+        """
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self.device.startswith("cuda"):
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+        enabled = self.enabled
+        self.enabled = True
+        try:
+            with torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True) as prof:
+                self._torch_profile = prof
+                yield prof
+        finally:
+            self._torch_profile = None
+            self.enabled = enabled
+        prof.export_chrome_trace(path)
+        print(f"torch profiler trace saved to {path}")
+
+    def stats(self) -> dict:
+        """
+        Summarizes the recorded phases.
+
+        Returns:
+            dict: "generations", "peak_memory_bytes", "last_peak_memory_bytes" and "phases",
+                which maps each phase to its count, total, mean, p50, p95 and max in seconds.
+        """
+        def percentile(values, q):
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        phases = {}
+        for name, phase in self.phases.items():
+            samples = sorted(phase["samples"])
+            phases[name] = {
+                "count": phase["count"],
+                "total": phase["total"],
+                "mean": phase["total"] / phase["count"],
+                "p50": percentile(samples, 0.5),
+                "p95": percentile(samples, 0.95),
+                "max": phase["max"],
+            }
+
+        return {
+            "generations": self.generations,
+            "peak_memory_bytes": self.peak_memory,
+            "last_peak_memory_bytes": self.last_peak_memory,
+            "phases": phases,
+        }
@@ -1,7 +1,6 @@
 import os
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
-from elevenlabs import save
+from tracing import traced
 
 class TTSWrapper:
     """
@@ -10,7 +9,7 @@ class TTSWrapper:
     Attributes:
         api (str): The API to use for audio generation.
         poll_rate (int): The rate at which to poll the API for task status.
-        client (ElevenLabs): The ElevenLabs client object.
+        client (ElevenLabs): The ElevenLabs client object, created on first use.
     """
 
     def __init__(self, api: str = "eleven_labs", voice: str = "Rebekah Nemethy - Pro Narration") -> None:
@@ -24,16 +23,25 @@ class TTSWrapper:
         self.api = api
         self.voice = voice
         self.voice_id = ""
+        self._client = None
         if self.api == "eleven_labs":
             api_key = os.getenv("ELEVENLABS_API_KEY")
             if not api_key:
                 raise ValueError("ELEVENLABS_API_KEY environment variable is not set.")
-            self.client = ElevenLabs()
-        else:
-            self.client = None
 
         load_dotenv()
 
+    @property
+    def client(self):
+        """
+        The ElevenLabs client, imported and created on first use. None for the other APIs.
+        """
+        if self._client is None and self.api == "eleven_labs":
+            from elevenlabs.client import ElevenLabs
+            self._client = ElevenLabs()
+        return self._client
+
+    @traced("tts.make_api_call", lambda self, prompt, seed=0, idx=None: {"api": self.api, "idx": idx})
     def make_api_call(self, prompt: str, seed:int=0, idx:int=None) -> str:
         """
         Makes an API call to generate the audio given the prompt.
@@ -66,6 +74,7 @@ class TTSWrapper:
             else:
                 path = f"out_audio/{prompt[:10]}.mp3"
 
+            from elevenlabs import save
             save(audio, path)
 
             return path
@@ -6,8 +6,9 @@ import requests
 import time
 import urllib.request
 
+from io import BytesIO
 from PIL import Image
-from runwayml import RunwayML
+from tracing import traced
 
 class VideoWrapper:
     """
@@ -16,7 +17,7 @@ class VideoWrapper:
     Attributes:
         api (str): The API to use for video generation.
         poll_rate (int): The rate at which to poll the API for task status.
-        client (RunwayML): The RunwayML client object.
+        client (RunwayML): The RunwayML client object, created on first use.
     """
 
     def __init__(self, api: str = "kling", poll_rate: int = 10) -> None:
@@ -29,11 +30,11 @@ class VideoWrapper:
         """
         self.api = api
         self.poll_rate = poll_rate 
+        self._client = None
         if self.api == "runway":
             api_key = os.getenv("RUNWAYML_API_SECRET")
             if not api_key:
                 raise ValueError("RUNWAYML_API_SECRET environment variable is not set.")
-            self.client = RunwayML()
 
         elif self.api == "kling":
             self.api_key = os.getenv("Kling_API_KEY")
@@ -42,8 +43,16 @@ class VideoWrapper:
             self.secret_key = os.getenv("Kling_API_SECRET")  
             if not self.secret_key:
                 raise ValueError("Kling_API_SECRET environment variable is not set.")
-        else:
-            self.client = None
+
+    @property
+    def client(self):
+        """
+        The RunwayML client, imported and created on first use. None for the other APIs.
+        """
+        if self._client is None and self.api == "runway":
+            from runwayml import RunwayML
+            self._client = RunwayML()
+        return self._client
 
     def encode_jwt_token(self, access_key, secret_key):
         headers = {"alg": "HS256", "typ": "JWT"}
@@ -55,6 +64,7 @@ class VideoWrapper:
         return jwt.encode(payload, secret_key, algorithm="HS256")
     
 
+    @traced("video.make_api_call", lambda self, prompt, img, duration=5, idx=None: {"api": self.api, "duration": duration, "idx": idx})
     def make_api_call(self, prompt: str, img: np.ndarray, duration:int=5, idx:int=None, ) -> str:
         """
         Makes an API call to generate a video from the provided image and prompt.
@@ -73,11 +83,10 @@ class VideoWrapper:
         else:
             raise ValueError("img must be a numpy array or a PIL image")
     
-        name = "tmp.jpg"
-        pil_image.save(name)
-
-        with open(name, "rb") as f:
-            base64_image = base64.b64encode(f.read()).decode("utf-8")
+        # encode in memory, a shared tmp file would race between concurrent sessions
+        buffered = BytesIO()
+        pil_image.convert("RGB").save(buffered, format="JPEG")
+        base64_image = base64.b64encode(buffered.getvalue()).decode("utf-8")
 
         if self.api == "runway":
             
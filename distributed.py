@@ -0,0 +1,100 @@
+import argparse
+import os
+import subprocess
+import sys
+
+from production.broker import open_broker
+from production.worker import KINDS
+
+# Parse command-line arguments
+parser = argparse.ArgumentParser(description="Distributed episode production")
+subparsers = parser.add_subparsers(dest="role", required=True)
+
+coordinator_parser = subparsers.add_parser("coordinator", help="Shard episodes over the workers")
+coordinator_parser.add_argument('--broker', type=str, default='broker', help='sqlite:///path/tasks.db or file:///path/dir, a plain path picks by extension')
+coordinator_parser.add_argument('--shared_dir', type=str, default='shared', help='Output directory every worker can reach at the same path')
+coordinator_parser.add_argument('--scenario_file_path', type=str, default='config_files/scenario.yaml', help='Path to the scenario file')
+coordinator_parser.add_argument('--narratives_file', type=str, default=None, help='Text or JSONL file of narratives, one episode per line, "-" for stdin')
+coordinator_parser.add_argument('--narrative', type=str, default='today we are writing a story about a young boy learning about the universe', help='The episode to produce when no narratives file is given')
+coordinator_parser.add_argument('--iterations', type=int, default=3, help='Number of story beats')
+coordinator_parser.add_argument('--duration', type=int, default=5, help='Length of the generated video clips in seconds')
+coordinator_parser.add_argument('--local_workers', type=int, default=0, help='Also start this many local worker processes serving every kind')
+coordinator_parser.add_argument('--fake_providers', action='store_true', help='Local workers use stand-ins instead of the LLM, Flux, Kling and ElevenLabs providers')
+
+worker_parser = subparsers.add_parser("worker", help="Serve tasks")
+worker_parser.add_argument('--broker', type=str, default='broker', help='sqlite:///path/tasks.db or file:///path/dir, a plain path picks by extension')
+worker_parser.add_argument('--kinds', type=str, default=",".join(KINDS), help=f'Comma separated task kinds to serve, of {", ".join(KINDS)}')
+worker_parser.add_argument('--name', type=str, default=None, help='Worker name, host-pid when omitted')
+worker_parser.add_argument('--concurrency', type=int, default=1, help='Number of tasks run at the same time')
+worker_parser.add_argument('--lease_seconds', type=float, default=60.0, help='Lease length, a task is re-dispatched this long after its worker stopped heartbeating')
+worker_parser.add_argument('--heartbeat_interval', type=float, default=10.0, help='Seconds between heartbeats')
+worker_parser.add_argument('--image_worker', type=str, default=None, help='host:port of a running image_worker.py, loads a local Flux pipeline when omitted')
+worker_parser.add_argument('--fake_providers', action='store_true', help='Use stand-ins instead of the LLM, Flux, Kling and ElevenLabs providers')
+
+args = parser.parse_args()
+
+broker = open_broker(args.broker)
+
+if args.role == "worker":
+    from content_generation.assembly import AssemblyEngine
+    from production.worker import DistributedWorker, StageHandlers
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    handlers = StageHandlers(assembly=AssemblyEngine())
+
+    # only load the providers of the kinds this worker serves
+    print("loading content generation capabilities")
+    if args.fake_providers:
+        from production.fakes import FakeImageGen, FakeLLMWrapper, FakeTTSWrapper, FakeVideoWrapper
+
+        handlers.llm_factory = FakeLLMWrapper
+        handlers.image_gen = FakeImageGen()
+        handlers.video_gen = FakeVideoWrapper()
+        handlers.tts = FakeTTSWrapper()
+    else:
+        if "image" in kinds:
+            if args.image_worker:
+                from content_generation import ImageWorkerClient
+                handlers.image_gen = ImageWorkerClient(args.image_worker)
+            else:
+                from content_generation import FluxWrapper
+                handlers.image_gen = FluxWrapper("black-forest-labs/FLUX.1-dev", ["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"])
+        if "video" in kinds:
+            from content_generation import VideoWrapper
+            handlers.video_gen = VideoWrapper(api="kling")
+        if "tts" in kinds:
+            from content_generation import TTSWrapper
+            handlers.tts = TTSWrapper(api="eleven_labs")
+    print("loading complete")
+
+    DistributedWorker(broker, handlers, kinds, name=args.name, concurrency=args.concurrency,
+                      lease_seconds=args.lease_seconds, heartbeat_interval=args.heartbeat_interval).run()
+
+else:
+    from agents.batch import read_narratives
+    from production.coordinator import Coordinator
+
+    local_workers = []
+    for i in range(args.local_workers):
+        command = [sys.executable, os.path.abspath(__file__), "worker", "--broker", args.broker, "--name", f"local_{i}", "--concurrency", "4"]
+        if args.fake_providers:
+            command.append("--fake_providers")
+        elif i > 0:
+            # one local Flux pipeline is enough on a single GPU
+            command += ["--kinds", ",".join(kind for kind in KINDS if kind != "image")]
+        local_workers.append(subprocess.Popen(command))
+
+    coordinator = Coordinator(broker, os.path.abspath(args.shared_dir), args.scenario_file_path, args.iterations, args.duration)
+    if args.narratives_file:
+        for episode in read_narratives(args.narratives_file):
+            coordinator.submit(episode["id"], episode["narrative"], episode.get("iterations"))
+    else:
+        coordinator.submit("episode_000000", args.narrative)
+
+    try:
+        stats = coordinator.run()
+        print(f"{stats['done']} episodes done, {stats['failed']} failed in {stats['wall_time']:.1f}s ({stats['episodes_per_hour']:.1f} episodes/hour)")
+        print(f"episodes written to {args.shared_dir}")
+    finally:
+        for worker in local_workers:
+            worker.terminate()
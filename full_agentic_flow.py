@@ -1,8 +1,14 @@
 import argparse
+import hashlib
+import os
+import time
+import tracing
 
 from utils import *
 from agents import *
-from content_generation import *
+from PIL import Image
+
+from content_generation import AssemblyEngine, AssetCreationError, AssetStore, ImageWorkerClient, PreviewCascade, TTSWrapper, VideoWrapper, image_digest
 
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description="Simulated Agents")
@@ -11,29 +17,51 @@ parser.add_argument('--scenario_file_path', type=str, default='config_files/scen
 parser.add_argument('--variations', type=int, default=1, help='Number of variations')
 parser.add_argument('--interactive', action='store_true', help='Interactive mode')
 parser.add_argument('--narrative', type=str, default='today we are writing a story about a young boy learning about the universe', help='what are we writing an episode about')
+parser.add_argument('--image_worker', type=str, default=None, help='host:port of a running image_worker.py, loads a local Flux pipeline when omitted')
+parser.add_argument('--per_shot_prompts', action='store_true', help='augment the image and video prompts with two calls per shot instead of one structured call per variation')
+parser.add_argument('--preview', action='store_true', help='render low resolution previews first and only render, animate and voice the approved shots')
+parser.add_argument('--skip_screening', action='store_true', help='with --preview, approve every preview instead of asking the preview_screen agent')
+parser.add_argument('--branches', type=int, default=1, help='Fork the simulation into this many alternative scripts and render the one the producer scores best')
+parser.add_argument('--fork_at', type=int, default=1, help='with --branches, story beat the branches diverge at, the beats before it are run once and shared')
+parser.add_argument('--asset_dir', type=str, default='assets', help='Directory of the content addressed store keeping every generated image, video and VO')
+parser.add_argument('--asset_budget_gb', type=float, default=20.0, help='Least recently used assets are evicted at startup once the store is larger than this')
+parser.add_argument('--trace', type=str, default=None, help='write a Chrome trace / Perfetto timeline of the run to this path')
+parser.add_argument('--otlp_endpoint', type=str, default=None, help='also send trace spans to this OTLP/HTTP endpoint')
 
 args = parser.parse_args()
 
+if args.trace or args.otlp_endpoint:
+    tracing.enable(args.trace, args.otlp_endpoint)
+
 all_scenes = []
 
-# Create and clear necessary directories
-directories = ['out_imgs', 'out_vids', 'out_audio', 'combined_assets', 'final_vids']
+# the providers write into out_vids and out_audio before their output is moved into the asset store
+directories = ['out_vids', 'out_audio', 'combined_assets', 'final_vids']
 for directory in directories:
-    create_directory(directory)
+    os.makedirs(directory, exist_ok=True)
+
+# generated assets are kept across runs, only the least recently used ones are evicted
+asset_store = AssetStore(args.asset_dir, int(args.asset_budget_gb * 1024 ** 3))
+gc_stats = asset_store.gc()
+print(f"asset store: {gc_stats['size'] / 1024 ** 2:.0f} MB, {gc_stats['evicted']} assets evicted")
+episode_id = time.strftime("episode_%Y%m%d_%H%M%S")
 
 #load all the agents
 print("loading agents")
 synthetic_agents, helper_agents = instantiate_agents(args.scenario_file_path)
-script_writer = get_agent_by_name("script_writer", synthetic_agents)
-producer = get_agent_by_name("producer", synthetic_agents)
+scheduler = RoundScheduler.from_scenario(args.scenario_file_path, synthetic_agents)
+script_writer = scheduler.writer
 img_prompt_agent = get_agent_by_name("img_prompt", helper_agents)
 vid_prompt_agent = get_agent_by_name("vid_prompt", helper_agents)
 
-character_agents = [script_writer, producer]
-
 #load all the content generation capabilities
 print("loading content generation capabilities")
-image_gen = FluxWrapper("black-forest-labs/FLUX.1-dev", ["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"])
+if args.image_worker:
+    image_gen = ImageWorkerClient(args.image_worker)
+else:
+    from content_generation import FluxWrapper
+
+    image_gen = FluxWrapper("black-forest-labs/FLUX.1-dev", ["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"])
 video_gen = VideoWrapper(api="kling")
 tts = TTSWrapper(api="eleven_labs")
 print("loading complete")
@@ -41,54 +69,121 @@ print("loading complete")
 #instantiate the first observation
 observation = args.narrative
 all_scenes.append(observation)
-final_script = None
 
 # Simulate the scene
 print("simulating scene")
-for i in range(args.iterations):
-    for agent in character_agents:
-        if agent.name == "script_writer":
-            if i == 0:
-                script = script_writer.process_observation(observation, all_scenes, use_structured=True)
-            else:
-                script = script_writer.process_observation(f"please make the following changes to the orignal script: {observation}", all_scenes, use_structured=True)
-            
-            script_str = script.to_str()
-            print(script_str)
-            all_scenes.append(script_str)
-        
-        elif agent.name == "producer":
-
-            observation = producer.process_observation(f"what do you think of : {script_str} tell the script writer what they should change", all_scenes)
-            print(observation)
-            all_scenes.append(observation)
-
-final_script = script
+if args.branches > 1:
+    best = scheduler.branch(observation, args.iterations, args.branches, args.fork_at, checkpoint_dir="checkpoints", on_turn=lambda branch, agent_name, text: print(text))[0]
+    print(f"rendering branch {best['branch']} of {args.branches}, score {best['score']}: {best['verdict']}")
+    final_script = best["script"]
+else:
+    final_script = scheduler.run(observation, args.iterations, all_scenes, on_turn=lambda agent_name, text: print(text))
 
 script_len = len(final_script.shots)
 
 # Generate the content
+print("augmenting prompts")
+img_texts = []
+vid_texts = []
+for i in range(args.variations):
+    if args.per_shot_prompts:
+        for j,shot in enumerate(final_script.shots):
+            with tracing.trace_context(variation=i, shot=j):
+                # later variations ask again so that they get their own prompts
+                augmented_prompt = img_prompt_agent.basic_api_call(shot.txt2img_prompt, use_cache=(i == 0))
+            img_texts.append(f"{script_writer.lora_key_word},\n\n {augmented_prompt}, \n\n Costume: {script_writer.flux_caption}")
+    else:
+        # every variation gets its own prompts, written on a copy of the script
+        variation_script = final_script.model_copy(deep=True)
+        with tracing.trace_context(variation=i):
+            vid_texts.append(augment_shot_prompts(variation_script, script_writer, img_prompt_agent, vid_prompt_agent))
+        img_texts += [shot.txt2img_prompt for shot in variation_script.shots]
+
+for agent in (img_prompt_agent, vid_prompt_agent):
+    if agent.cache is not None:
+        print(f"{agent.name} cache: {agent.cache.format_stats()}")
+
+# render every shot of every variation in batched pipeline calls
+print("generating images")
+
+def image_inputs(prompt, seed):
+    return {"model": "black-forest-labs/FLUX.1-dev", "prompt": prompt, "seed": seed, "steps": 40, "width": 1024, "height": 576}
+
+# seeds follow from the prompt, so a prompt seen before finds its stored image
+seeds = [int(hashlib.sha256(f"{k // script_len}:{prompt}".encode()).hexdigest()[:8], 16) % 100000 for k, prompt in enumerate(img_texts)]
+img_paths = {}
+img_keys = {}
+
+def store_image(k, seed, img):
+    inputs = image_inputs(img_texts[k], seed)
+    img_paths[k] = asset_store.put_image(inputs, img)
+    img_keys[k] = AssetStore.key("image", inputs)
+
+if args.preview:
+    screen_agent = None if args.skip_screening else get_agent_by_name("preview_screen", helper_agents)
+    cascade = PreviewCascade(image_gen, screen_agent)
+
+# an approved retry is stored under its retry seed, which follows from the shot's seed
+attempts = cascade.retries + 1 if args.preview else 1
+for k, prompt in enumerate(img_texts):
+    for attempt in range(attempts):
+        key = AssetStore.key("image", image_inputs(prompt, PreviewCascade.retry_seed(seeds[k], attempt)))
+        path = asset_store.get(key)
+        if path is not None:
+            img_paths[k] = path
+            img_keys[k] = key
+            break
+missing = [k for k in range(len(img_texts)) if k not in img_paths]
+print(f"{len(img_texts) - len(missing)} images found in the asset store")
+
+if missing and args.preview:
+    shot_actions = [shot.shot_action for shot in final_script.shots] * args.variations
+    result = cascade.run([img_texts[k] for k in missing], [shot_actions[k] for k in missing], [seeds[k] for k in missing], video_seconds=10)
+    for m, img in zip(result["approved"], result["images"]):
+        store_image(missing[m], result["seeds"][m], img)
+    print(PreviewCascade.format_report(result["report"]))
+elif missing:
+    for k, img in zip(missing, image_gen.generate_images([img_texts[k] for k in missing], [seeds[k] for k in missing])):
+        store_image(k, seeds[k], img)
+
 print("generating content")
+assembly = AssemblyEngine()
 for i in range(args.variations):
+    shot_clips = []
     combined_video_paths = []
     for j,shot in enumerate(final_script.shots):
-        print("generating image")
-        img_name = f"out_imgs/scene_{i}.png"
-
-        augmented_prompt = img_prompt_agent.basic_api_call(shot.txt2img_prompt)
-        img_text = f"{script_writer.lora_key_word},\n\n {augmented_prompt}, \n\n Costume: {script_writer.flux_caption}"
-        img = image_gen.generate_image(img_text)
-        img.save(img_name)
-        print("generating video")
-        vid_text = vid_prompt_agent.basic_api_call(shot.txt2img_prompt)
-        vid_path = video_gen.make_api_call(vid_text, img, duration=10)
-        print("generating VO")
-        audio_text = shot.vo
-        audio_path = tts.make_api_call(audio_text)
-        combined_output_path = f"combined_assets/scene_{j:04d}_variation_{i:04d}.mp4"
-        combine_video_audio(vid_path, audio_path, combined_output_path)
-        combined_video_paths.append(combined_output_path)
-
+        if i * script_len + j not in img_paths:
+            # the preview of this shot was rejected
+            continue
+        img_path = img_paths[i * script_len + j]
+        img = Image.open(img_path).convert("RGB")
+        with tracing.trace_context(variation=i, shot=j):
+            print("generating video")
+            vid_text = vid_prompt_agent.basic_api_call(shot.txt2img_prompt, use_cache=(i == 0)) if args.per_shot_prompts else vid_texts[i][j]
+            vid_inputs = {"api": video_gen.api, "prompt": vid_text, "image": image_digest(img), "duration": 10}
+            audio_text = shot.vo
+            audio_inputs = {"api": tts.api, "prompt": audio_text, "seed": 0}
+            try:
+                vid_path = asset_store.fetch("video", vid_inputs, lambda: video_gen.make_api_call(vid_text, img, duration=10))
+                print("generating VO")
+                audio_path = asset_store.fetch("audio", audio_inputs, lambda: tts.make_api_call(audio_text))
+            except AssetCreationError as e:
+                # the provider reported its error already, the cut goes on without this shot
+                print(f"shot {j} of variation {i} failed: {e}")
+                continue
+        asset_store.record(episode_id, f"variation_{i:04d}/scene_{j:04d}.png", img_keys[i * script_len + j])
+        asset_store.record(episode_id, f"variation_{i:04d}/scene_{j:04d}_video", AssetStore.key("video", vid_inputs))
+        asset_store.record(episode_id, f"variation_{i:04d}/scene_{j:04d}_audio", AssetStore.key("audio", audio_inputs))
+        shot_clips.append((vid_path, audio_path))
+        combined_video_paths.append(f"combined_assets/scene_{j:04d}_variation_{i:04d}.mp4")
+
+    if not shot_clips:
+        print(f"every shot of variation {i} was rejected or failed")
+        continue
     print("editing everything together")
     final_video_path = f'final_vids/final_video_variation_{i:04d}.mp4'
-    concatenate_videos(combined_video_paths, final_video_path)
\ No newline at end of file
+    with tracing.trace_context(variation=i):
+        assembly.assemble(shot_clips, final_video_path, shot_paths=combined_video_paths)
+
+manifest_path = asset_store.write_manifest(episode_id, f"final_vids/{episode_id}_manifest.json")
+print(f"asset manifest written to {manifest_path}")
@@ -1,6 +1,11 @@
 import argparse
 import os
-import shutil
+import queue
+import threading
+import tracing
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
 
 import gradio as gr
 
@@ -8,7 +13,7 @@ from functools import partial
 
 from utils import *
 from agents import *
-from content_generation import *
+from content_generation import AssemblyEngine, AssetCreationError, AssetStore, ImageWorkerClient, TTSWrapper, VideoWrapper, image_digest
 
 
 parser = argparse.ArgumentParser(description="Simulated Agents")
@@ -19,61 +24,158 @@ parser.add_argument('--debug', action='store_true', help='Debug mode')
 parser.add_argument('--interactive', action='store_true', help='Interactive mode')
 parser.add_argument('--show_simulated_thinking', action='store_true', help='show the simulated thinking')
 parser.add_argument('--narrative', type=str, default='today we are writing a story about a young boy learning about the universe', help='what are we writing an episode about')
+parser.add_argument('--image_worker', type=str, default=None, help='host:port of a running image_worker.py, loads a local Flux pipeline when omitted')
+parser.add_argument('--asset_dir', type=str, default='assets', help='Directory of the content addressed store keeping every generated video, VO and final cut')
+parser.add_argument('--asset_budget_gb', type=float, default=20.0, help='Least recently used assets are evicted at startup once the store is larger than this')
+parser.add_argument('--checkpoint_dir', type=str, default='checkpoints', help='Directory the simulation of every session is checkpointed to after each turn')
+parser.add_argument('--fake_providers', action='store_true', help='Use local stand-ins for the LLM, image, video and TTS providers, e.g. for load tests')
+parser.add_argument('--fake_llm_latency', type=str, default='0', help='with --fake_providers, LLM latency, a number of seconds or kind:mean:spread')
+parser.add_argument('--fake_image_latency', type=str, default='0', help='with --fake_providers, image latency')
+parser.add_argument('--fake_video_latency', type=str, default='0', help='with --fake_providers, video latency')
+parser.add_argument('--fake_tts_latency', type=str, default='0', help='with --fake_providers, TTS latency')
+parser.add_argument('--server_port', type=int, default=9000, help='Port the app listens on')
+parser.add_argument('--llm_concurrency', type=int, default=16, help='Maximum number of concurrent LLM events')
+parser.add_argument('--video_concurrency', type=int, default=4, help='Maximum number of concurrent video generation jobs')
+parser.add_argument('--tts_concurrency', type=int, default=4, help='Maximum number of concurrent TTS jobs')
+parser.add_argument('--profile', action='store_true', help='Record per-phase timings and peak memory of the image pipeline from startup')
+parser.add_argument('--trace', type=str, default=None, help='write a Chrome trace / Perfetto timeline to this path on exit')
+parser.add_argument('--otlp_endpoint', type=str, default=None, help='also send trace spans to this OTLP/HTTP endpoint')
 
 args = parser.parse_args()
 
-os.makedirs('out_imgs', exist_ok=True)
+if args.trace or args.otlp_endpoint:
+    tracing.enable(args.trace, args.otlp_endpoint)
+
+# the providers write into these before their output is moved into the asset store
 os.makedirs('out_vids', exist_ok=True)
 os.makedirs('out_audio', exist_ok=True)
-os.makedirs('final_vids', exist_ok=True)
 
-# Create and clear necessary directories
-directories = ['out_imgs', 'out_vids', 'out_audio', 'combined_assets', 'final_vids']
-for directory in directories:
-    if os.path.exists(directory):
-        shutil.rmtree(directory)
-    os.makedirs(directory, exist_ok=True)
+# generated assets are kept across launches, only the least recently used ones are evicted
+asset_store = AssetStore(args.asset_dir, int(args.asset_budget_gb * 1024 ** 3))
+gc_stats = asset_store.gc()
+print(f"asset store: {gc_stats['size'] / 1024 ** 2:.0f} MB, {gc_stats['evicted']} assets evicted")
 
 iterations = args.iterations
 
-history = []
-
-all_scenes = []
-
-current_iteration = 0
-
 interactive = args.interactive
 
 show_simulated_thinking = args.show_simulated_thinking
 
+llm_factory = None
+if args.fake_providers:
+    from production.fakes import FakeImageGen, FakeLLMWrapper, FakeTTSWrapper, FakeVideoWrapper
+
+    llm_factory = lambda: FakeLLMWrapper(args.fake_llm_latency)
+
 print("loading agents")
-synthetic_agents, helper_agents = instantiate_agents(args.scenario_file_path)
-script_writer = get_agent_by_name("script_writer", synthetic_agents)
-producer = get_agent_by_name("producer", synthetic_agents)
+_, helper_agents = instantiate_agents(args.scenario_file_path, llm_factory)
 img_prompt_agent = get_agent_by_name("img_prompt", helper_agents)
 vid_prompt_agent = get_agent_by_name("vid_prompt", helper_agents)
 
-character_agents = [script_writer, producer]
+class Session:
+    """
+    Simulation state of one Gradio session. Each session gets its own synthetic agents, so their memories are never shared.
+
+    Attributes:
+        id (str): Short unique id, used to keep the session's files apart.
+        script_writer (SyntheticAgent): The session's script writer.
+        scheduler (RoundScheduler): The round schedule of the scenario's synthetic agents.
+        character_agents (list): The agents taking turns in the simulation.
+        narrative (str): What the episode is about.
+        observation (str): The latest observation.
+        all_scenes (list): Every observation and script of the simulation so far.
+        current_iteration (int): Number of interactive iterations run.
+        final_script (ShotList): The latest script, the final one once the simulation is complete.
+        checkpoint (SimulationCheckpoint): Every turn of the session's simulation, see checkpoint_dir.
+    """
 
-observation = args.narrative
-all_scenes.append(observation)
+    def __init__(self) -> None:
+        """
+        Initializes a Session with fresh agents and the narrative from the command line.
+        """
+        self.id = uuid.uuid4().hex[:8]
+        synthetic_agents, _ = instantiate_agents(args.scenario_file_path, llm_factory)
+        self.scheduler = RoundScheduler.from_scenario(args.scenario_file_path, synthetic_agents)
+        self.script_writer = self.scheduler.writer
+        self.character_agents = self.scheduler.agents
+        self.narrative = args.narrative
+        self.observation = self.narrative
+        self.all_scenes = [self.observation]
+        self.current_iteration = 0
+        self.final_script = None
+        self.checkpoint = SimulationCheckpoint(os.path.join(args.checkpoint_dir, f"{self.id}.jsonl"))
+
+    def record_turn(self, agent_name, script=None) -> None:
+        """
+        Checkpoints the turn just taken.
+
+        Args:
+            agent_name (str): The agent whose turn it was.
+            script (ShotList, optional): The script the turn wrote.
+        """
+        self.checkpoint.record(agent_name, self.character_agents, self.all_scenes, self.observation, script)
+
+    def restore(self, path, upto=None) -> dict:
+        """
+        Continues the simulation of a checkpoint, e.g. one downloaded from another session, in this session.
+
+        Args:
+            path (str): The checkpoint file. It is copied, later turns are only written to this session's checkpoint.
+            upto (int, optional): Number of turns to keep, to restart from an earlier turn. Every turn when None.
+
+        Returns:
+            dict: The restored state, see SimulationCheckpoint.load.
+        """
+        own_path = os.path.join(args.checkpoint_dir, f"{self.id}.jsonl")
+        if os.path.abspath(path) != os.path.abspath(own_path):
+            SimulationCheckpoint(path).fork(own_path, upto)
+        self.checkpoint = SimulationCheckpoint(own_path)
+        state = self.checkpoint.resume(self.character_agents, upto)
+        self.narrative = state["narrative"]
+        self.all_scenes = state["all_scenes"]
+        self.observation = state["observation"]
+        self.final_script = state["script"]
+        self.current_iteration = sum(agent_name == self.script_writer.name for agent_name, _ in state["history"])
+        return state
 
 print("loading content generation capabilities")
-image_gen = FluxWrapper("black-forest-labs/FLUX.1-dev", ["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"])
-video_gen = VideoWrapper(api="kling")
-tts = TTSWrapper(api="eleven_labs")
+if args.fake_providers:
+    image_gen = FakeImageGen(args.fake_image_latency)
+elif args.image_worker:
+    image_gen = ImageWorkerClient(args.image_worker)
+else:
+    from content_generation import FluxWrapper
+
+    image_gen = FluxWrapper("black-forest-labs/FLUX.1-dev", ["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"], profile=args.profile)
+if args.fake_providers:
+    video_gen = FakeVideoWrapper(args.fake_video_latency)
+    tts = FakeTTSWrapper(args.fake_tts_latency)
+else:
+    video_gen = VideoWrapper(api="kling")
+    tts = TTSWrapper(api="eleven_labs")
+assembly = AssemblyEngine()
 print("loading complete")
 
-final_script = None
+NUM_SHOTS = 6
 
-def update_textboxes():
+# shared by the per-shot buttons and the render all action, so both respect the same limits
+gpu_lock = threading.Lock()
+llm_slots = threading.Semaphore(args.llm_concurrency)
+video_slots = threading.Semaphore(args.video_concurrency)
+tts_slots = threading.Semaphore(args.tts_concurrency)
+
+def update_textboxes(session):
     """
     A function to fill the generation tabs inputs with the generated content for each shot.
 
+    Args:
+        session (Session): The session state.
+
     Returns:
         list: A list of text responses for each shot.
     """
-    global final_script
+    final_script = session.final_script
+    script_writer = session.script_writer
     text_responses = []
     num_shots = len(final_script.shots)
     for i in range(num_shots):
@@ -87,17 +189,20 @@ def update_textboxes():
         text_responses.append(vo_text)
     return text_responses
 
-def augment_text_prompt(prompt):
+def augment_text_prompt(prompt, session):
     """
     Augments the given prompt using the image prompt agent.
 
     Args:
         prompt (str): The prompt to augment.
+        session (Session): The session state.
 
     Returns:
         str: The augmented prompt.
     """
-    augmented_prompt = img_prompt_agent.basic_api_call(prompt)
+    script_writer = session.script_writer
+    with llm_slots:
+        augmented_prompt = img_prompt_agent.basic_api_call(prompt)
     output = f"{script_writer.lora_key_word},\n\n{augmented_prompt}\n\n Costume: {script_writer.flux_caption}" 
 
     return output
@@ -112,35 +217,276 @@ def augment_video_prompt(prompt):
     Returns:
         str: The augmented prompt.
     """
-    augmented_prompt = vid_prompt_agent.basic_api_call(prompt)
+    with llm_slots:
+        augmented_prompt = vid_prompt_agent.basic_api_call(prompt)
 
     return augmented_prompt
 
-def create_video():
+def generate_image_preview(prompt, seed, steps, lora_0_weight, lora_1_weight, progress=gr.Progress()):
+    """
+    Generates an image while streaming step progress and low resolution latent previews.
+
+    Args:
+        prompt (str): The text prompt for generating the image.
+        seed (int): The random seed for generating the image.
+        steps (int): The number of inference steps.
+        lora_0_weight (float): Weight of the first LoRA.
+        lora_1_weight (float): Weight of the second LoRA.
+        progress (gr.Progress): Gradio progress tracker.
+
+    Yields:
+        Image: Latent previews, then the final image.
+    """
+    # step callbacks can't cross the process boundary of an image worker
+    if isinstance(image_gen, ImageWorkerClient):
+        yield image_gen.generate_image(prompt, seed, steps, lora_0_weight, lora_1_weight)
+        return
+
+    updates = queue.Queue()
+    cancelled = threading.Event()
+    result = {}
+
+    def on_step(step, total_steps, step_time, preview):
+        updates.put((step, total_steps, step_time, preview))
+        return not cancelled.is_set()
+
+    def run():
+        try:
+            with gpu_lock:
+                result["image"] = image_gen.generate_image(prompt, seed, steps, lora_0_weight, lora_1_weight, step_callback=on_step, preview_every=5)
+        except Exception as e:
+            result["error"] = e
+        finally:
+            updates.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    # closing the generator (the stop button) interrupts the pipeline at its next step
+    try:
+        while (update := updates.get()) is not None:
+            step, total_steps, step_time, preview = update
+            progress((step, total_steps), desc=f"step {step}/{total_steps} ({step_time:.2f}s/step)")
+            if preview is not None:
+                yield preview
+    finally:
+        cancelled.set()
+
+    if "error" in result:
+        raise result["error"]
+    yield result["image"]
+
+def generate_video(prompt, img, duration, session, idx):
+    """
+    Generates the video for a shot into a file owned by the session.
+
+    Args:
+        prompt (str): The text prompt for generating the video.
+        img (np.ndarray): The image to use as the prompt.
+        duration (int): The length of the video in seconds.
+        session (Session): The session state.
+        idx (int): The shot index.
+
+    Returns:
+        str: The path to the generated video.
+    """
+    inputs = {"api": video_gen.api, "prompt": prompt, "image": image_digest(img), "duration": int(duration)}
+
+    def create():
+        with video_slots:
+            return video_gen.make_api_call(prompt, img, duration, idx=f"{session.id}_{idx}")
+
+    try:
+        path = asset_store.fetch("video", inputs, create)
+    except AssetCreationError as e:
+        raise gr.Error(str(e))
+    asset_store.record(session.id, f"scene_{int(idx):04d}_video", AssetStore.key("video", inputs))
+    return path
+
+def generate_audio(prompt, seed, session, idx):
+    """
+    Generates the VO for a shot into a file owned by the session.
+
+    Args:
+        prompt (str): The VO text.
+        seed (int): The TTS seed.
+        session (Session): The session state.
+        idx (int): The shot index.
+
+    Returns:
+        str: The path to the generated audio.
+    """
+    inputs = {"api": tts.api, "prompt": prompt, "seed": int(seed)}
+
+    def create():
+        with tts_slots:
+            return tts.make_api_call(prompt, int(seed), idx=f"{session.id}_{idx}")
+
+    try:
+        path = asset_store.fetch("audio", inputs, create)
+    except AssetCreationError as e:
+        raise gr.Error(str(e))
+    asset_store.record(session.id, f"scene_{int(idx):04d}_audio", AssetStore.key("audio", inputs))
+    return path
+
+def create_video(session, *media):
     """
     Creates a final video by combining video and audio files.
 
+    Args:
+        session (Session): The session state.
+        *media (str): The paths shown in the session's video components, then in its audio components.
+
     Returns:
         str: The path to the final video.
     """
-    video_path = "out_vids"
-    audio_path = "out_audio"
-    out_path = "final_vids/final_video.mp4"
+    num_shots = len(media) // 2
+    video_files = media[:num_shots]
+    audio_files = media[num_shots:]
+
+    shots = []
+
+    for i, (video_file, audio_file) in enumerate(zip(video_files, audio_files)):
+        if video_file is None or audio_file is None:
+            continue
+        shots.append((video_file, audio_file))
+
+    # stored clips are named by their key, so their paths identify the cut
+    inputs = {"shots": shots}
+
+    def create():
+        out_path = os.path.join(asset_store.root, "tmp", f"final_video_{session.id}.mp4")
+        return assembly.assemble(shots, out_path)
+
+    path = asset_store.fetch("final", inputs, create)
+    asset_store.record(session.id, "final_video", AssetStore.key("final", inputs))
+    return path
+
+def render_all_shots(session, progress=gr.Progress()):
+    """
+    Renders every shot of the final script at once: prompt augmentation, image, video and VO run concurrently
+    within their resource limits, then the final cut is assembled.
 
-    video_files = sorted(os.listdir(video_path))
-    audio_files = sorted(os.listdir(audio_path))
+    Args:
+        session (Session): The session state.
+        progress (gr.Progress): Gradio progress tracker.
 
-    clips = []
+    Yields:
+        list: Updates for the image, video and audio components of every shot and the final video,
+            sent as each shot stage finishes.
+    """
+    if session.final_script is None:
+        raise gr.Error("Run the simulation first")
+
+    shots = session.final_script.shots[:NUM_SHOTS]
+    rendered = {"image": [None] * NUM_SHOTS, "video": [None] * NUM_SHOTS, "audio": [None] * NUM_SHOTS}
+    updates = queue.Queue()
+
+    def render_visuals(idx, shot):
+        try:
+            img_prompt = augment_text_prompt(shot.txt2img_prompt, session)
+            if not isinstance(image_gen, ImageWorkerClient):
+                with gpu_lock:
+                    img = image_gen.generate_image(img_prompt)
+            else:
+                img = image_gen.generate_image(img_prompt)
+        except Exception as e:
+            updates.put(("error", idx, f"image: {e!r}"))
+            updates.put(("error", idx, "video: skipped, no image"))
+            return
+        updates.put(("image", idx, img))
+
+        try:
+            vid_prompt = augment_video_prompt(shot.txt2img_prompt)
+            updates.put(("video", idx, generate_video(vid_prompt, img, 5, session, idx)))
+        except Exception as e:
+            updates.put(("error", idx, f"video: {e!r}"))
+
+    def render_audio(idx, shot):
+        try:
+            updates.put(("audio", idx, generate_audio(shot.vo, 0, session, idx)))
+        except Exception as e:
+            updates.put(("error", idx, f"audio: {e!r}"))
+
+    def outputs(kind=None, idx=None, value=None):
+        # only the finished stage is sent, every other component keeps its value
+        values = [gr.update() for _ in range(3 * NUM_SHOTS + 1)]
+        if kind == "final":
+            values[-1] = value
+        elif kind is not None:
+            values[["image", "video", "audio"].index(kind) * NUM_SHOTS + idx] = value
+        return values
+
+    # every shot has an image, a video and an audio stage, each reports exactly once
+    total_stages = 3 * len(shots)
+    errors = []
+    with ThreadPoolExecutor(max_workers=2 * len(shots)) as executor:
+        for idx, shot in enumerate(shots):
+            executor.submit(render_visuals, idx, shot)
+            executor.submit(render_audio, idx, shot)
+
+        for done_stages in range(1, total_stages + 1):
+            kind, idx, value = updates.get()
+            if kind == "error":
+                errors.append(f"shot {idx} {value}")
+                print(f"render all shots, shot {idx} {value}")
+                continue
+            rendered[kind][idx] = value
+            progress((done_stages, total_stages), desc=f"shot {idx} {kind} done")
+            yield outputs(kind, idx, value)
+
+    if errors:
+        raise gr.Error("Some shots failed: " + "; ".join(errors))
+
+    progress((total_stages, total_stages), desc="editing everything together")
+    yield outputs("final", value=create_video(session, *rendered["video"], *rendered["audio"]))
+
+def profile_stats():
+    """
+    Reads the image pipeline's aggregated per-phase stats, from the image worker when one is used.
 
-    for video_file, audio_file in zip(video_files, audio_files):
-        video_file_path = os.path.join(video_path, video_file)
-        audio_file_path = os.path.join(audio_path, audio_file)
-        combine_video_audio(video_file_path, audio_file_path, f"combined_assets/{video_file}")
-        clips.append(f"combined_assets/{video_file}")
+    Returns:
+        tuple: A markdown summary and one table row per phase with times in milliseconds.
+    """
+    if isinstance(image_gen, ImageWorkerClient):
+        stats = image_gen.stats()["profile"]
+    else:
+        # the stand-in image generator has no profiler
+        profiler = getattr(image_gen, "profiler", None)
+        stats = profiler.stats() if profiler is not None and profiler.enabled else None
+    if stats is None:
+        return "Profiling is disabled.", []
+
+    summary = f"{stats['generations']} generations, peak memory {stats['peak_memory_bytes'] / 1024**3:.2f} GiB (last {stats['last_peak_memory_bytes'] / 1024**3:.2f} GiB)"
+    rows = [
+        [name, phase["count"]] + [round(phase[key] * 1000, 1) for key in ("mean", "p50", "p95", "max", "total")]
+        for name, phase in stats["phases"].items()
+    ]
+    return summary, rows
+
+def set_profiling(enabled):
+    """
+    Turns profiling of the local image pipeline on or off.
 
-    concatenate_videos(clips, out_path)
+    Args:
+        enabled (bool): Whether to record phases.
 
-    return out_path
+    Returns:
+        tuple: See profile_stats.
+    """
+    if hasattr(image_gen, "profiler"):
+        image_gen.profiler.enabled = enabled
+    return profile_stats()
+
+def reset_profiling():
+    """
+    Clears the local image pipeline's aggregated stats.
+
+    Returns:
+        tuple: See profile_stats.
+    """
+    if hasattr(image_gen, "profiler"):
+        image_gen.profiler.reset()
+    return profile_stats()
 
 def user(user_message, history: list):
     """
@@ -156,33 +502,52 @@ def user(user_message, history: list):
     history.append({"role": "user", "content": user_message})
     return "", history
 
-def run_agents(history: list):
+def format_turn(agent_name, text, is_script):
+    """
+    Formats a turn for the chat history.
+
+    Args:
+        agent_name (str): The agent whose turn it was.
+        text (str): The script or critique.
+        is_script (bool): Whether the turn wrote the script.
+
+    Returns:
+        dict: The chat message.
+    """
+    if is_script:
+        return {"role": "assistant", "content": f"<b style='color:green;'>{agent_name}: \n\n {text}</b>"}
+    return {"role": "assistant", "content": f"<b style='color:white;'>{agent_name} thinks: \n\n {text}</b>"}
+
+def run_agents(history: list, session):
     """
     Runs the agents to process the scene and generate content. This is the main script generation loop.
 
+    Every turn is checkpointed, and a session restored from a checkpoint continues after its last turn.
+
     Args:
         history (list): The chat history.
+        session (Session): The session state.
 
     Yields:
         list: The updated chat history.
     """
-    global current_iteration
-    global iterations
-    global all_scenes
-    global observation
-    global interactive
-    global final_script
+    script_writer = session.script_writer
+    all_scenes = session.all_scenes
+    observation = session.observation
 
     message = history[-1]["content"]
 
     if interactive:
-        iteration = 0
-        if current_iteration < iterations:
+        if not session.checkpoint.exists():
+            session.checkpoint.start(session.narrative, iterations, session.character_agents, all_scenes)
+
+        if session.current_iteration < iterations:
             if message != "":
                 observation = message
+                session.observation = observation
                 all_scenes.append(observation)
             
-            if iteration == 0:
+            if session.current_iteration == 0:
                 script = script_writer.process_observation(observation, all_scenes, use_structured=True)
             else:
                 script = script_writer.process_observation(f"please make the following changes to the orignal script: {observation}", all_scenes, use_structured=True)
@@ -190,10 +555,11 @@ def run_agents(history: list):
             script_str = script.to_str()
             print(script_str)
             all_scenes.append(script_str)
-            new_script = f"<b style='color:green;'>{script_writer.name}: \n\n {script_str}</b>"
-            history.append({"role": "assistant", "content": new_script})
+            history.append(format_turn(script_writer.name, script_str, True))
 
-            iteration += 1
+            session.final_script = script
+            session.current_iteration += 1
+            session.record_turn(script_writer.name, script)
             history.append({"role": "assistant", "content": "<b style='color:white'>: Would do you think?</b>"})
 
             yield history
@@ -202,82 +568,112 @@ def run_agents(history: list):
             yield history
 
     else:
-        # Simulate the scene
+        # Simulate the scene, skipping the turns restored from a checkpoint
         print("simulating scene")
-        for i in range(iterations):
-                
-            for agent in character_agents:
-                if agent.name == "script_writer":
-                    if i == 0:
-                        script = script_writer.process_observation(observation, all_scenes, use_structured=True)
-                    else:
-                        script = script_writer.process_observation(f"please make the following changes to the orignal script: {observation}", all_scenes, use_structured=True)
-                    
-                    script_str = script.to_str()
-                    print(script_str)
-                    all_scenes.append(script_str)
-                    new_script = f"<b style='color:green;'>{agent.name}: \n\n {script_str}</b>"
-                    history.append({"role": "assistant", "content": new_script})
-                    
-                    yield history
-
-                elif agent.name == "producer":
-
-                    observation = producer.process_observation(f"what do you think of : {script_str} tell the script writer what they should change", all_scenes)
-                    print(observation)
-                    all_scenes.append(observation)
-                    critique = f"<b style='color:white;'>{agent.name} thinks: \n\n {observation}</b>"
-                    history.append({"role": "assistant", "content": critique})
-                    
-                    yield history
-
-        final_script = script_writer.process_observation(f"please make the following changes to the orignal script: {observation}", all_scenes, use_structured=True)
-        final_script_str = final_script.to_str()
-        new_script = f"<b style='color:green;'>script writer: \n\n {final_script_str}</b>"
-        history.append({"role": "assistant", "content": new_script})
+        for agent_name, text, script in session.scheduler.steps(session.narrative, iterations, all_scenes, session.checkpoint):
+            print(text)
+            if script is not None:
+                session.final_script = script
+            elif agent_name in session.scheduler.notes:
+                session.observation = text
+            history.append(format_turn(agent_name, text, script is not None))
+
+            yield history
 
         history.append({"role": "assistant", "content": "The scene is complete"})
         yield history
 
+def load_checkpoint(file, restart_turn, session):
+    """
+    Restores a checkpointed simulation into the session.
+
+    Args:
+        file (str): Path of the uploaded checkpoint.
+        restart_turn (float): Number of turns to keep, every turn when empty.
+        session (Session): The session state.
+
+    Returns:
+        list: The chat history of the restored turns.
+    """
+    if file is None:
+        raise gr.Error("Upload a checkpoint first")
+    upto = None if restart_turn is None or restart_turn < 0 else int(restart_turn)
+    state = session.restore(file, upto)
+    history = [{"role": "user", "content": state["narrative"]}]
+    history += [format_turn(agent_name, text, agent_name == session.script_writer.name) for agent_name, text in state["history"]]
+    return history
+
+def export_checkpoint(session):
+    """
+    Returns the session's checkpoint file for download.
+
+    Args:
+        session (Session): The session state.
+
+    Returns:
+        str: Path of the checkpoint.
+    """
+    if not session.checkpoint.exists():
+        raise gr.Error("Run the simulation first")
+    return session.checkpoint.path
+
 
 # below the gradio interface is defined
 with gr.Blocks() as demo:
+    session = gr.State(Session)
+
     with gr.Tab("Simulation"):
         chatbot = gr.Chatbot(type="messages")
         
         if interactive:
             msg = gr.Textbox()
             msg.submit(user, [msg, chatbot], [msg, chatbot], queue=False).then(
-                run_agents, chatbot, chatbot
+                run_agents, [chatbot, session], chatbot, concurrency_id="llm", concurrency_limit=args.llm_concurrency
             )
         else:
             msg = gr.Button("run simulation")
             msg.click(user, [msg, chatbot], [msg, chatbot], queue=False).then(
-                run_agents, chatbot, chatbot
+                run_agents, [chatbot, session], chatbot, concurrency_id="llm", concurrency_limit=args.llm_concurrency, api_name="run_simulation"
             )
 
+        with gr.Accordion("Checkpoint", open=False):
+            checkpoint_file = gr.File(label="checkpoint", type="filepath")
+            restart_turn = gr.Number(label="restart at turn (empty keeps every turn)", value=None, precision=0)
+            with gr.Row():
+                load_checkpoint_button = gr.Button("Load checkpoint")
+                export_checkpoint_button = gr.Button("Download checkpoint")
+            load_checkpoint_button.click(load_checkpoint, inputs=[checkpoint_file, restart_turn, session], outputs=chatbot)
+            export_checkpoint_button.click(export_checkpoint, inputs=session, outputs=checkpoint_file)
+
     with gr.Tab("Generation"):
         text_boxes = []
+        videos = []
+        audios = []
+        images = []
         update_button = gr.Button("Update Textboxes")
-        update_button.click(update_textboxes, outputs=text_boxes)
-        for i in range(0, 6, 3):
+        update_button.click(update_textboxes, inputs=session, outputs=text_boxes, api_name="update_textboxes")
+        render_all_button = gr.Button("Render all shots", variant="primary")
+        for i in range(0, NUM_SHOTS, 3):
             with gr.Row():
                 for j in range(3):
-                    if i + j < 6:
+                    if i + j < NUM_SHOTS:
                         with gr.Column():
                             with gr.Tab("image"):
                               image = gr.Image(label=f"Image for Story Beat {i + j}")
                               action_box = gr.Textbox(label=f"scene {i + j}", value="")
                               textbox = gr.Textbox(label=f"Prompt for Story Beat {i + j}", value="")
                               augment_img_prompt_button = gr.Button("Augment Prompt", variant="primary")
-                              augment_img_prompt_button.click(augment_text_prompt, inputs=textbox, outputs=textbox)
+                              augment_img_prompt_button.click(augment_text_prompt, inputs=[textbox, session], outputs=textbox, concurrency_id="llm", api_name=f"augment_image_prompt_{i + j}")
                               seed = gr.Number(label="seed", value=0)
                               steps = gr.Number(label="steps", value=40)
                               lora_0_weight = gr.Slider(label="lora_0_weight", minimum=0.0, maximum=1.0, value=0.5, step=0.1)
                               lora_1_weight = gr.Slider(label="lora_1_weight", minimum=0.0, maximum=1.0, value=1.0, step=0.1)
                               image_gen_button = gr.Button(f"Generate Image {i + j}",
                                         variant="primary")
-                              image_gen_button.click(image_gen.generate_image, inputs=[textbox,seed,steps,lora_0_weight,lora_1_weight], outputs=image)
+                              stop_button = gr.Button("Stop")
+                              # a single pipeline serves every session, one generation at a time
+                              image_gen_event = image_gen_button.click(generate_image_preview, inputs=[textbox,seed,steps,lora_0_weight,lora_1_weight], outputs=image, concurrency_id="gpu", concurrency_limit=1, api_name=f"generate_image_{i + j}")
+                              stop_button.click(None, cancels=[image_gen_event])
                               text_boxes.append(action_box)
                               text_boxes.append(textbox)
 
@@ -286,20 +682,39 @@ with gr.Blocks() as demo:
                               textbox_2 = gr.Textbox(label=f"Prompt for Story Beat {i + j}", value="")
                               augment_vid_prompt_button = gr.Button("Augment Prompt", variant="primary")
                               duration = gr.Dropdown(label="duration", choices=[5, 10], value=5)
-                              augment_vid_prompt_button.click(augment_video_prompt, inputs=textbox_2, outputs=textbox_2)
+                              augment_vid_prompt_button.click(augment_video_prompt, inputs=textbox_2, outputs=textbox_2, concurrency_id="llm", api_name=f"augment_video_prompt_{i + j}")
                               video_gen_button = gr.Button(f"Generate Video {i + j}",
                                         variant="primary")
-                              video_gen_button.click(partial(video_gen.make_api_call, idx=i + j), inputs=[textbox_2,image,duration], outputs=video)
+                              video_gen_button.click(partial(generate_video, idx=i + j), inputs=[textbox_2,image,duration,session], outputs=video, concurrency_id="video", concurrency_limit=args.video_concurrency, api_name=f"generate_video_{i + j}")
                               textbox_3 = gr.Textbox(label=f"Prompt for VO {i + j}", value="")
                               tts_seed = gr.Number(label="seed", value=0)
-                              audio = gr.Audio()
+                              audio = gr.Audio(type="filepath")
                               audio_gen_button = gr.Button(f"Generate Audio {i + j}",
                                         variant="primary")
-                              audio_gen_button.click(partial(tts.make_api_call, idx=i + j), inputs=[textbox_3,tts_seed], outputs=audio)
+                              audio_gen_button.click(partial(generate_audio, idx=i + j), inputs=[textbox_3,tts_seed,session], outputs=audio, concurrency_id="tts", concurrency_limit=args.tts_concurrency, api_name=f"generate_audio_{i + j}")
                               text_boxes.append(textbox_2)
                               text_boxes.append(textbox_3)
+                              images.append(image)
+                              videos.append(video)
+                              audios.append(audio)
     with gr.Tab("output"): 
         final_video = gr.Video(label=f"final video")                      
-        gr.Button("create_video").click(create_video, outputs=final_video)
-
-demo.launch(debug=args.debug, share=args.share, server_port=9000)
\ No newline at end of file
+        gr.Button("create_video").click(create_video, inputs=[session] + videos + audios, outputs=final_video, concurrency_id="assembly", concurrency_limit=2, api_name="create_video")
+
+    with gr.Tab("Profiling"):
+        # the worker's profiling is set with its --profile flag
+        profile_enabled = gr.Checkbox(label="Profile image generation", value=args.profile, interactive=hasattr(image_gen, "profiler"))
+        profile_summary = gr.Markdown()
+        profile_table = gr.Dataframe(headers=["phase", "count", "mean ms", "p50 ms", "p95 ms", "max ms", "total ms"])
+        with gr.Row():
+            refresh_profile_button = gr.Button("Refresh")
+            reset_profile_button = gr.Button("Reset")
+        profile_enabled.change(set_profiling, inputs=profile_enabled, outputs=[profile_summary, profile_table])
+        refresh_profile_button.click(profile_stats, outputs=[profile_summary, profile_table])
+        reset_profile_button.click(reset_profiling, outputs=[profile_summary, profile_table])
+
+    # the fan-out limits itself with the shared resource semaphores
+    render_all_button.click(render_all_shots, inputs=session, outputs=images + videos + audios + [final_video])
+
+demo.queue(default_concurrency_limit=args.llm_concurrency)
+demo.launch(debug=args.debug, share=args.share, server_port=args.server_port)
\ No newline at end of file
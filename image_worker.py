@@ -0,0 +1,26 @@
+import argparse
+
+from content_generation import FluxWrapper, ImageWorker, parse_address, worker_authkey
+
+# Parse command-line arguments
+parser = argparse.ArgumentParser(description="Image generation worker")
+parser.add_argument('--model_id', type=str, default='black-forest-labs/FLUX.1-dev', help='Flux model to load')
+parser.add_argument('--lora_paths', type=str, nargs='*', default=["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"], help='LoRA weights to load')
+parser.add_argument('--address', type=str, default='localhost:6000', help='host:port to listen on')
+parser.add_argument('--device', type=str, default=None, help='Device to run on, picked automatically when omitted')
+parser.add_argument('--memory_budget_gb', type=float, default=None, help='Memory budget in GiB, the device total when omitted')
+parser.add_argument('--profile', action='store_true', help='Record per-phase timings and peak memory, reported by the stats message')
+parser.add_argument('--verbose', action='store_true', help='Print the chosen device placement plan')
+
+args = parser.parse_args()
+
+memory_budget = int(args.memory_budget_gb * 1024**3) if args.memory_budget_gb else None
+address = parse_address(args.address)
+# refuse a public address without a key before spending minutes on loading the pipeline
+authkey = worker_authkey(address)
+
+print("loading content generation capabilities")
+image_gen = FluxWrapper(args.model_id, args.lora_paths, device=args.device, memory_budget=memory_budget, profile=args.profile, verbose=args.verbose)
+print("loading complete")
+
+ImageWorker(image_gen, address, authkey).serve_forever()
@@ -0,0 +1,7 @@
+from .job_queue import JobQueue, JobCancelled
+from .pipeline import EpisodePipeline
+from .service import ProductionService
+from .server import serve
+from .broker import Broker, FileBroker, SQLiteBroker, open_broker
+from .coordinator import Coordinator
+from .worker import DistributedWorker, StageHandlers
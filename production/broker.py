@@ -0,0 +1,608 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from abc import ABC, abstractmethod
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    grp TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_status_kind_created ON tasks (status, kind, created);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+class Broker(ABC):
+    """
+    Hands out tasks to distributed workers under time-limited leases.
+
+    A task is "pending" until a worker leases it, then "leased" until the worker completes or fails it.
+    Workers extend their leases with heartbeats. A lease that expires, because its worker died or
+    lost the connection, is handed out again, until the task has been attempted `max_attempts` times.
+    Completing a task is first-wins, so a task that ran twice after a re-dispatch keeps one result.
+
+    Subclasses implement the storage and every abstract method. Tasks are dicts with id, kind, group,
+    payload, status, owner, lease_expires, attempts, result, error, created and updated.
+
+    Attributes:
+        max_attempts (int): Leases handed out per task before it is marked failed.
+    """
+
+    def __init__(self, max_attempts: int = 3) -> None:
+        """
+        Initializes the Broker.
+
+        Args:
+            max_attempts (int, optional): Leases handed out per task before it is marked failed. Defaults to 3.
+        """
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def put(self, kind: str, payload: dict, group: str = None, task_id: str = None) -> str:
+        """
+        Adds a pending task.
+
+        Args:
+            kind (str): The task kind, workers lease the kinds they serve.
+            payload (dict): JSON serializable task arguments.
+            group (str, optional): The episode the task belongs to.
+            task_id (str, optional): The task id. A random id when None.
+
+        Returns:
+            str: The task id.
+        """
+
+    @abstractmethod
+    def lease(self, worker: str, kinds: list[str], lease_seconds: float) -> dict:
+        """
+        Atomically takes the oldest pending task of the given kinds, or one whose lease expired.
+
+        Args:
+            worker (str): The leasing worker.
+            kinds (list[str]): The task kinds the worker serves.
+            lease_seconds (float): How long the lease lasts without a heartbeat.
+
+        Returns:
+            dict: The leased task, or None when there is none.
+        """
+
+    @abstractmethod
+    def heartbeat(self, worker: str, task_id: str, lease_seconds: float) -> bool:
+        """
+        Extends a lease.
+
+        Args:
+            worker (str): The worker holding the lease.
+            task_id (str): The leased task.
+            lease_seconds (float): The new lease length from now.
+
+        Returns:
+            bool: False when the worker no longer holds the lease.
+        """
+
+    @abstractmethod
+    def complete(self, worker: str, task_id: str, result: dict) -> bool:
+        """
+        Stores the result of a task.
+
+        Args:
+            worker (str): The worker that ran the task.
+            task_id (str): The task.
+            result (dict): JSON serializable result.
+
+        Returns:
+            bool: False when the task was already finished, e.g. by a worker it was re-dispatched to.
+        """
+
+    @abstractmethod
+    def fail(self, worker: str, task_id: str, error: str) -> None:
+        """
+        Releases a task after an error, to be retried until it has been attempted `max_attempts` times.
+
+        Args:
+            worker (str): The worker that ran the task.
+            task_id (str): The task.
+            error (str): The error message.
+        """
+
+    @abstractmethod
+    def get_many(self, task_ids: list[str]) -> dict:
+        """
+        Reads tasks.
+
+        Args:
+            task_ids (list[str]): The task ids.
+
+        Returns:
+            dict: Task id to task, for the tasks that exist.
+        """
+
+    @abstractmethod
+    def register_worker(self, worker: str, info: dict) -> None:
+        """
+        Records that a worker is alive.
+
+        Args:
+            worker (str): The worker name.
+            info (dict): What the worker serves, e.g. its kinds and host.
+        """
+
+    @abstractmethod
+    def workers(self) -> dict:
+        """
+        Lists the known workers.
+
+        Returns:
+            dict: Worker name to its info plus "last_seen".
+        """
+
+    @abstractmethod
+    def counts(self) -> dict:
+        """
+        Counts tasks per status.
+
+        Returns:
+            dict: Status to number of tasks.
+        """
+
+
+class SQLiteBroker(Broker):
+    """
+    Broker backed by a SQLite database, for workers on one host or a local disk shared by containers.
+
+    Attributes:
+        db_path (str): Path to the SQLite database.
+        max_attempts (int): Leases handed out per task before it is marked failed.
+    """
+
+    def __init__(self, db_path: str = "tasks.db", max_attempts: int = 3) -> None:
+        """
+        Initializes the SQLiteBroker and creates the schema if needed.
+
+        Args:
+            db_path (str, optional): Path to the SQLite database. Defaults to "tasks.db".
+            max_attempts (int, optional): Leases handed out per task before it is marked failed. Defaults to 3.
+        """
+        super().__init__(max_attempts)
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection that returns rows as sqlite3.Row.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        """
+        Converts a tasks row to a task dict.
+
+        Args:
+            row (sqlite3.Row): The row.
+
+        Returns:
+            dict: The task.
+        """
+        task = dict(row)
+        task["group"] = task.pop("grp")
+        task["payload"] = json.loads(task["payload"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+    def put(self, kind: str, payload: dict, group: str = None, task_id: str = None) -> str:
+        task_id = task_id or uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO tasks (id, kind, grp, payload, status, created, updated) VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                (task_id, kind, group, json.dumps(payload), now, now),
+            )
+        return task_id
+
+    def lease(self, worker: str, kinds: list[str], lease_seconds: float) -> dict:
+        now = time.time()
+        marks = ", ".join("?" for _ in kinds)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # leases of dead workers run out, their tasks are retried or given up on
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = 'lease expired too many times', owner = NULL, updated = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                f"SELECT id FROM tasks WHERE kind IN ({marks}) AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "ORDER BY created LIMIT 1",
+                (*kinds, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                (worker, now + lease_seconds, now, row["id"]),
+            )
+            task = conn.execute("SELECT * FROM tasks WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+        return self._to_dict(task)
+
+    def heartbeat(self, worker: str, task_id: str, lease_seconds: float) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                (now + lease_seconds, now, task_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, worker: str, task_id: str, result: dict) -> bool:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', owner = ?, result = ?, error = NULL, updated = ? WHERE id = ? AND status NOT IN ('done', 'failed')",
+                (worker, json.dumps(result), time.time(), task_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, worker: str, task_id: str, error: str) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, owner = NULL, error = ?, updated = ? "
+                "WHERE id = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), task_id, worker),
+            )
+
+    def get_many(self, task_ids: list[str]) -> dict:
+        tasks = {}
+        task_ids = list(task_ids)
+        with closing(self._connect()) as conn:
+            # stay under SQLite's bound parameter limit
+            for start in range(0, len(task_ids), 500):
+                chunk = task_ids[start:start + 500]
+                marks = ", ".join("?" for _ in chunk)
+                for row in conn.execute(f"SELECT * FROM tasks WHERE id IN ({marks})", chunk):
+                    tasks[row["id"]] = self._to_dict(row)
+        return tasks
+
+    def register_worker(self, worker: str, info: dict) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO workers (name, info, last_seen) VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE SET info = excluded.info, last_seen = excluded.last_seen",
+                (worker, json.dumps(info), time.time()),
+            )
+
+    def workers(self) -> dict:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM workers").fetchall()
+        return {row["name"]: {**json.loads(row["info"]), "last_seen": row["last_seen"]} for row in rows}
+
+    def counts(self) -> dict:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+
+class FileBroker(Broker):
+    """
+    Broker backed by a directory, which can be a network share mounted by workers on several hosts.
+
+    Every task is a JSON file in the subdirectory of its status. A process changes a task by first renaming
+    its file into tmp/ under a name of its own. Only one process can win that rename, and it then rereads,
+    updates and renames the file into its new status directory. Other processes never see a half-updated
+    task. A task is missing from the status directories for that moment, so readers that miss one look
+    again while it is in tmp/. A task left in tmp/ by a process that died while changing it is returned to
+    pending/ after `orphan_seconds`.
+
+    Attributes:
+        root (str): The broker directory.
+        max_attempts (int): Leases handed out per task before it is marked failed.
+        orphan_seconds (float): Age after which a task left in tmp/ is recovered.
+    """
+
+    STATUSES = ("pending", "leased", "done", "failed")
+
+    def __init__(self, root: str = "broker", max_attempts: int = 3, orphan_seconds: float = 60.0) -> None:
+        """
+        Initializes the FileBroker and creates its directories if needed.
+
+        Args:
+            root (str, optional): The broker directory. Defaults to "broker".
+            max_attempts (int, optional): Leases handed out per task before it is marked failed. Defaults to 3.
+            orphan_seconds (float, optional): Age after which a task left in tmp/ is recovered. Defaults to 60.
+        """
+        super().__init__(max_attempts)
+        self.root = root
+        self.orphan_seconds = orphan_seconds
+        for directory in (*self.STATUSES, "workers", "tmp"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def _path(self, status: str, task_id: str) -> str:
+        return os.path.join(self.root, status, f"{task_id}.json")
+
+    def _read(self, path: str) -> dict:
+        """
+        Reads a task file.
+
+        Returns:
+            dict: The task, or None when the file was moved away in the meantime.
+        """
+        try:
+            with open(path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write(self, path: str, task: dict) -> None:
+        """
+        Writes a task file atomically.
+        """
+        tmp_path = os.path.join(self.root, "tmp", f"{uuid.uuid4().hex}.json")
+        with open(tmp_path, 'w') as file:
+            json.dump(task, file)
+        os.replace(tmp_path, path)
+
+    def _take(self, path: str, task_id: str) -> tuple:
+        """
+        Takes a task file out of its status directory by renaming it into tmp/, so no other process can change it.
+
+        The taken file is named <task id>.<time taken>.<random>.taken, its age is what _recover_orphans goes by.
+
+        Args:
+            path (str): The task file.
+            task_id (str): The task id.
+
+        Returns:
+            tuple: The taken path and the task, or (None, None) when another process took or moved it first.
+        """
+        taken_path = os.path.join(self.root, "tmp", f"{task_id}.{time.time():.3f}.{uuid.uuid4().hex}.taken")
+        try:
+            os.rename(path, taken_path)
+        except FileNotFoundError:
+            return None, None
+        with open(taken_path, 'r') as file:
+            return taken_path, json.load(file)
+
+    def _place(self, taken_path: str, task: dict, status: str) -> None:
+        """
+        Writes a taken task and renames it into a status directory.
+
+        Args:
+            taken_path (str): The path returned by _take.
+            task (dict): The task, updated.
+            status (str): Its new status.
+        """
+        task["status"] = status
+        task["updated"] = time.time()
+        with open(taken_path, 'w') as file:
+            json.dump(task, file)
+        os.rename(taken_path, self._path(status, task["id"]))
+
+    def _release(self, taken_path: str, task: dict) -> None:
+        """
+        Returns a taken task unchanged to its status directory.
+        """
+        os.rename(taken_path, self._path(task["status"], task["id"]))
+
+    def put(self, kind: str, payload: dict, group: str = None, task_id: str = None) -> str:
+        task_id = task_id or uuid.uuid4().hex
+        if any(os.path.exists(self._path(status, task_id)) for status in self.STATUSES):
+            return task_id
+        now = time.time()
+        task = {
+            "id": task_id, "kind": kind, "group": group, "payload": payload, "status": "pending", "owner": None,
+            "lease_expires": None, "attempts": 0, "result": None, "error": None, "created": now, "updated": now,
+        }
+        self._write(self._path("pending", task_id), task)
+        return task_id
+
+    def _expire(self, task: dict, error: str) -> str:
+        """
+        Clears the owner of a task given up by its worker.
+
+        Returns:
+            str: "failed" after `max_attempts` leases, otherwise "pending".
+        """
+        task["owner"] = None
+        task["error"] = error
+        return "failed" if task["attempts"] >= self.max_attempts else "pending"
+
+    def _recover_orphans(self) -> None:
+        """
+        Returns tasks left in tmp/ by a process that died while changing them to pending/, or failed/ after
+        `max_attempts` leases. Done tasks stay done.
+        """
+        now = time.time()
+        for name in os.listdir(os.path.join(self.root, "tmp")):
+            parts = name.split(".")
+            if not name.endswith(".taken") or len(parts) < 5 or now - float(f"{parts[-4]}.{parts[-3]}") < self.orphan_seconds:
+                continue
+            task_id = ".".join(parts[:-4])
+            taken_path, task = self._take(os.path.join(self.root, "tmp", name), task_id)
+            if task is None:
+                continue
+            if task["status"] in ("done", "failed"):
+                self._release(taken_path, task)
+            else:
+                self._place(taken_path, task, self._expire(task, "lost while its worker updated it"))
+
+    def _reclaim_expired(self) -> None:
+        """
+        Moves tasks whose lease expired back to pending/, or to failed/ after `max_attempts` leases.
+        """
+        self._recover_orphans()
+        now = time.time()
+        for name in os.listdir(os.path.join(self.root, "leased")):
+            task = self._read(os.path.join(self.root, "leased", name))
+            if task is None or task["lease_expires"] is None or task["lease_expires"] >= now:
+                continue
+            taken_path, task = self._take(os.path.join(self.root, "leased", name), task["id"])
+            if task is None:
+                continue
+            # the lease may have been extended since it was read
+            if task["lease_expires"] is None or task["lease_expires"] >= now:
+                self._release(taken_path, task)
+            else:
+                status = self._expire(task, task["error"])
+                if status == "failed":
+                    task["error"] = "lease expired too many times"
+                self._place(taken_path, task, status)
+
+    def lease(self, worker: str, kinds: list[str], lease_seconds: float) -> dict:
+        self._reclaim_expired()
+        candidates = []
+        for name in os.listdir(os.path.join(self.root, "pending")):
+            task = self._read(os.path.join(self.root, "pending", name))
+            if task is not None and task["kind"] in kinds:
+                candidates.append(task)
+
+        for candidate in sorted(candidates, key=lambda task: task["created"]):
+            taken_path, task = self._take(self._path("pending", candidate["id"]), candidate["id"])
+            if task is None:
+                continue
+            task["owner"] = worker
+            task["lease_expires"] = time.time() + lease_seconds
+            task["attempts"] += 1
+            self._place(taken_path, task, "leased")
+            return task
+        return None
+
+    def heartbeat(self, worker: str, task_id: str, lease_seconds: float) -> bool:
+        taken_path, task = self._take(self._path("leased", task_id), task_id)
+        if task is None:
+            return False
+        if task["owner"] != worker:
+            self._release(taken_path, task)
+            return False
+        task["lease_expires"] = time.time() + lease_seconds
+        self._place(taken_path, task, "leased")
+        return True
+
+    def complete(self, worker: str, task_id: str, result: dict) -> bool:
+        # a task being changed by another process is in no status directory for a moment, look again
+        for _ in range(100):
+            if os.path.exists(self._path("done", task_id)) or os.path.exists(self._path("failed", task_id)):
+                return False
+            for status in ("leased", "pending"):
+                taken_path, task = self._take(self._path(status, task_id), task_id)
+                if task is not None:
+                    task["owner"] = worker
+                    task["result"] = result
+                    task["error"] = None
+                    self._place(taken_path, task, "done")
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def fail(self, worker: str, task_id: str, error: str) -> None:
+        taken_path, task = self._take(self._path("leased", task_id), task_id)
+        if task is None:
+            return
+        if task["owner"] != worker:
+            self._release(taken_path, task)
+            return
+        self._place(taken_path, task, self._expire(task, error))
+
+    def get_many(self, task_ids: list[str]) -> dict:
+        tasks = {}
+        missing = list(task_ids)
+        # a task being changed by another process is in no status directory for a moment, look again
+        for _ in range(100):
+            self._read_into(tasks, missing)
+            missing = [task_id for task_id in missing if task_id not in tasks]
+            if not missing:
+                break
+            if not self._taken(missing):
+                # it may have been placed since it was looked for
+                self._read_into(tasks, missing)
+                break
+            time.sleep(0.01)
+        return tasks
+
+    def _read_into(self, tasks: dict, task_ids: list[str]) -> None:
+        """
+        Reads the tasks found in a status directory into tasks.
+        """
+        for task_id in task_ids:
+            for status in self.STATUSES:
+                task = self._read(self._path(status, task_id))
+                if task is not None:
+                    tasks[task_id] = task
+                    break
+
+    def _taken(self, task_ids: list[str]) -> bool:
+        """
+        Tells whether any of the tasks is currently taken into tmp/.
+        """
+        prefixes = tuple(f"{task_id}." for task_id in task_ids)
+        return any(name.endswith(".taken") and name.startswith(prefixes) for name in os.listdir(os.path.join(self.root, "tmp")))
+
+    def register_worker(self, worker: str, info: dict) -> None:
+        self._write(os.path.join(self.root, "workers", f"{worker}.json"), {**info, "last_seen": time.time()})
+
+    def workers(self) -> dict:
+        workers = {}
+        for name in os.listdir(os.path.join(self.root, "workers")):
+            info = self._read(os.path.join(self.root, "workers", name))
+            if info is not None:
+                workers[name[:-len(".json")]] = info
+        return workers
+
+    def counts(self) -> dict:
+        return {status: len(os.listdir(os.path.join(self.root, status))) for status in self.STATUSES}
+
+
+def open_broker(url: str, max_attempts: int = 3) -> Broker:
+    """
+    Opens a broker from a URL: "sqlite:///path/to/tasks.db" or "file:///path/to/dir".
+    A plain path is a SQLite database when it ends in .db and a broker directory otherwise.
+
+    Args:
+        url (str): The broker URL.
+        max_attempts (int, optional): Leases handed out per task before it is marked failed. Defaults to 3.
+
+    Returns:
+        Broker: The broker.
+    """
+    if url.startswith("sqlite://"):
+        return SQLiteBroker(url[len("sqlite://"):], max_attempts)
+    if url.startswith("file://"):
+        return FileBroker(url[len("file://"):], max_attempts)
+    if url.endswith(".db"):
+        return SQLiteBroker(url, max_attempts)
+    return FileBroker(url, max_attempts)
+
+
+def default_worker_name() -> str:
+    """
+    Builds a worker name unique across hosts and processes.
+
+    Returns:
+        str: host-pid.
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
@@ -0,0 +1,185 @@
+import os
+import time
+
+from .broker import Broker
+
+
+class Coordinator:
+    """
+    Shards episodes over distributed workers: one "script" task per episode, then "image", "tts", "video" and
+    "mux" tasks per shot as their inputs become available, and a final "assemble" task.
+
+    Task ids are derived from the episode id and shot index, and putting an existing task is a no-op, so a
+    restarted coordinator given the same episodes picks up the finished tasks instead of redoing them.
+
+    Attributes:
+        broker (Broker): Where tasks are sent.
+        output_dir (str): Storage shared with every worker, episodes are written to output_dir/<episode id>/.
+        scenario_file_path (str): Path to the scenario file, as seen by the workers.
+        iterations (int): Number of story beats per episode.
+        duration (int): Length of the generated video clips in seconds.
+        poll_interval (float): Seconds between checks of the task states.
+        episodes (dict): Episode id to its state.
+    """
+
+    def __init__(self, broker: Broker, output_dir: str = "shared", scenario_file_path: str = "config_files/scenario.yaml", iterations: int = 3, duration: int = 5, poll_interval: float = 1.0) -> None:
+        """
+        Initializes the Coordinator.
+
+        Args:
+            broker (Broker): Where tasks are sent.
+            output_dir (str, optional): Storage shared with every worker. Defaults to "shared".
+            scenario_file_path (str, optional): Path to the scenario file, as seen by the workers. Defaults to "config_files/scenario.yaml".
+            iterations (int, optional): Number of story beats per episode. Defaults to 3.
+            duration (int, optional): Length of the generated video clips in seconds. Defaults to 5.
+            poll_interval (float, optional): Seconds between checks of the task states. Defaults to 1.
+        """
+        self.broker = broker
+        self.output_dir = output_dir
+        self.scenario_file_path = scenario_file_path
+        self.iterations = iterations
+        self.duration = duration
+        self.poll_interval = poll_interval
+        self.episodes = {}
+
+    def submit(self, episode_id: str, narrative: str, iterations: int = None) -> None:
+        """
+        Starts an episode by sending its script task.
+
+        Args:
+            episode_id (str): The episode id, also the name of its output directory.
+            narrative (str): What the episode is about.
+            iterations (int, optional): Number of story beats. The coordinator default when None.
+        """
+        episode_dir = os.path.join(self.output_dir, episode_id)
+        os.makedirs(episode_dir, exist_ok=True)
+        episode = {"id": episode_id, "dir": episode_dir, "status": "running", "tasks": set(), "error": None, "started": time.time()}
+        self.episodes[episode_id] = episode
+        self._put(episode, "script", "script", {
+            "narrative": narrative,
+            "iterations": int(iterations or self.iterations),
+            "scenario_file_path": self.scenario_file_path,
+            "output": os.path.join(episode_dir, "script.json"),
+        })
+
+    def _put(self, episode: dict, kind: str, name: str, payload: dict) -> str:
+        """
+        Sends a task of an episode once.
+
+        Args:
+            episode (dict): The episode state.
+            kind (str): The task kind.
+            name (str): The task name within the episode, e.g. "image.0003".
+            payload (dict): The task arguments.
+
+        Returns:
+            str: The task id.
+        """
+        task_id = f"{episode['id']}.{name}"
+        if task_id not in episode["tasks"]:
+            self.broker.put(kind, payload, group=episode["id"], task_id=task_id)
+            episode["tasks"].add(task_id)
+        return task_id
+
+    def _advance(self, episode: dict, tasks: dict) -> None:
+        """
+        Sends the tasks whose inputs are ready and updates the episode status.
+
+        Args:
+            episode (dict): The episode state.
+            tasks (dict): Task id to task, for the tasks of the episode.
+        """
+        failed = [task for task in tasks.values() if task["status"] == "failed"]
+        if failed:
+            episode["status"] = "failed"
+            episode["error"] = f"{failed[0]['id']}: {failed[0]['error']}"
+            return
+
+        def done(name):
+            task = tasks.get(f"{episode['id']}.{name}")
+            return task if task is not None and task["status"] == "done" else None
+
+        script = done("script")
+        if script is None:
+            return
+
+        shots = script["result"]["shots"]
+        muxed = []
+        for j, shot in enumerate(shots):
+            shot_path = os.path.join(episode["dir"], f"scene_{j:04d}")
+            idx = f"{episode['id']}_{j:04d}"
+            self._put(episode, "image", f"image.{j:04d}", {"prompt": shot["img_text"], "seed": j, "output": f"{shot_path}.png"})
+            self._put(episode, "tts", f"tts.{j:04d}", {"prompt": shot["vo"], "idx": idx, "output": f"{shot_path}.mp3"})
+
+            image = done(f"image.{j:04d}")
+            if image is not None:
+                self._put(episode, "video", f"video.{j:04d}", {
+                    "prompt": shot["vid_text"], "image": image["result"]["path"], "duration": self.duration, "idx": idx, "output": f"{shot_path}_video.mp4",
+                })
+
+            video, audio = done(f"video.{j:04d}"), done(f"tts.{j:04d}")
+            if video is not None and audio is not None:
+                self._put(episode, "mux", f"mux.{j:04d}", {"video": video["result"]["path"], "audio": audio["result"]["path"], "output": f"{shot_path}.mp4"})
+
+            mux = done(f"mux.{j:04d}")
+            if mux is not None:
+                muxed.append(mux["result"]["path"])
+
+        if len(muxed) == len(shots):
+            self._put(episode, "assemble", "assemble", {"shots": muxed, "output": os.path.join(episode["dir"], "final_video.mp4")})
+
+        if done("assemble") is not None:
+            episode["status"] = "done"
+            episode["finished"] = time.time()
+
+    def step(self) -> None:
+        """
+        Reads the tasks of the running episodes once and advances them.
+        """
+        running = [episode for episode in self.episodes.values() if episode["status"] == "running"]
+        task_ids = [task_id for episode in running for task_id in episode["tasks"]]
+        tasks = self.broker.get_many(task_ids)
+        for episode in running:
+            self._advance(episode, {task_id: tasks[task_id] for task_id in episode["tasks"] if task_id in tasks})
+            if episode["status"] == "done":
+                print(f"episode {episode['id']} done in {episode['finished'] - episode['started']:.1f}s")
+            elif episode["status"] == "failed":
+                print(f"episode {episode['id']} failed, {episode['error']}")
+
+    def run(self) -> dict:
+        """
+        Advances the submitted episodes until all of them are done or failed.
+
+        Returns:
+            dict: Counts of done and failed episodes, the wall time and episodes per hour.
+        """
+        start = time.time()
+        last_report = 0.0
+        while any(episode["status"] == "running" for episode in self.episodes.values()):
+            self.step()
+            if time.time() - last_report > 10:
+                last_report = time.time()
+                print(f"tasks: {self.broker.counts()}, live workers: {len(self.live_workers())}")
+            time.sleep(self.poll_interval)
+
+        wall_time = time.time() - start
+        done = sum(episode["status"] == "done" for episode in self.episodes.values())
+        return {
+            "done": done,
+            "failed": sum(episode["status"] == "failed" for episode in self.episodes.values()),
+            "wall_time": wall_time,
+            "episodes_per_hour": done / wall_time * 3600 if wall_time else 0.0,
+        }
+
+    def live_workers(self, timeout: float = 60.0) -> dict:
+        """
+        Lists the workers that announced themselves recently.
+
+        Args:
+            timeout (float, optional): Seconds since the last announcement. Defaults to 60.
+
+        Returns:
+            dict: Worker name to its info.
+        """
+        now = time.time()
+        return {name: info for name, info in self.broker.workers().items() if now - info["last_seen"] < timeout}
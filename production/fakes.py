@@ -0,0 +1,325 @@
+import math
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+
+from PIL import Image
+
+from agents.llm_wrapper import Shot, ShotList, ShotPrompt, ShotPromptList
+from content_generation.assembly import ffmpeg_exe
+
+
+class LatencyModel:
+    """
+    Seeded latency distribution for the stand-in providers.
+
+    Attributes:
+        kind (str): "constant", "uniform" or "lognormal".
+        mean (float): Constant value, center of the uniform range, or median of the lognormal, in seconds.
+        spread (float): Half width of the uniform range, or sigma of the lognormal.
+        rng (random.Random): The seeded generator samples are drawn from.
+    """
+
+    def __init__(self, kind: str = "constant", mean: float = 0.0, spread: float = 0.0, seed: int = 0) -> None:
+        """
+        Initializes the LatencyModel.
+
+        Args:
+            kind (str, optional): "constant", "uniform" or "lognormal". Defaults to "constant".
+            mean (float, optional): Constant value, center of the uniform range, or median of the lognormal. Defaults to 0.
+            spread (float, optional): Half width of the uniform range, or sigma of the lognormal. Defaults to 0.
+            seed (int, optional): Seed of the generator. Defaults to 0.
+        """
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"unknown latency distribution: {kind}")
+        self.kind = kind
+        self.mean = mean
+        self.spread = spread
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec, seed: int = 0) -> "LatencyModel":
+        """
+        Builds a LatencyModel from a number or a "kind:mean:spread" string, e.g. "lognormal:1.5:0.4".
+
+        Args:
+            spec (float | str | LatencyModel): The latency specification.
+            seed (int, optional): Seed of the generator. Defaults to 0.
+
+        Returns:
+            LatencyModel: The latency model.
+        """
+        if isinstance(spec, LatencyModel):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("constant", float(spec), seed=seed)
+        kind, *values = spec.split(":")
+        if not values:
+            return cls("constant", float(kind), seed=seed)
+        return cls(kind, *[float(value) for value in values], seed=seed)
+
+    def sample(self) -> float:
+        """
+        Draws one latency.
+
+        Returns:
+            float: Seconds, never negative.
+        """
+        if self.kind == "uniform":
+            return max(0.0, self.rng.uniform(self.mean - self.spread, self.mean + self.spread))
+        if self.kind == "lognormal":
+            return self.rng.lognormvariate(math.log(self.mean), self.spread) if self.mean > 0 else 0.0
+        return self.mean
+
+    def wait(self) -> float:
+        """
+        Sleeps for one sampled latency.
+
+        Returns:
+            float: The seconds slept.
+        """
+        latency = self.sample()
+        time.sleep(latency)
+        return latency
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximates the token count of a text, at about four characters per token.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The approximate number of tokens.
+    """
+    return max(1, len(text) // 4)
+
+
+def canned_shot_list(num_shots: int = 6) -> ShotList:
+    """
+    Builds a fixed ShotList, shaped like the script writer's output.
+
+    Args:
+        num_shots (int, optional): Number of shots. Defaults to 6.
+
+    Returns:
+        ShotList: The script.
+    """
+    return ShotList(shots=[
+        Shot(
+            shot_action=f"Taylor Trace examines clue number {i} in a neon-lit office.",
+            txt2img_prompt=f"3D animation of a detective examining clue number {i} in a neon-lit office",
+            vo=f"Clue number {i} told Taylor more than it meant to.",
+        )
+        for i in range(num_shots)
+    ])
+
+
+class FakeLLMWrapper:
+    """
+    Stand-in for LLMWrapper that answers without calling a provider.
+
+    Attributes:
+        llm (str): Always "fake".
+        latency (LatencyModel): Latency of each call.
+        num_shots (int): Number of shots in structured responses.
+        shot_list (ShotList): The structured response. The canned ShotList when None.
+        calls (int): Number of calls made.
+        prompt_tokens (int): Approximate tokens sent.
+        completion_tokens (int): Approximate tokens returned.
+    """
+
+    def __init__(self, latency=0.0, num_shots: int = 6, shot_list: ShotList = None, seed: int = 0) -> None:
+        """
+        Initializes the FakeLLMWrapper.
+
+        Args:
+            latency (float | str | LatencyModel, optional): Latency of each call, see LatencyModel.parse. Defaults to 0.
+            num_shots (int, optional): Number of shots in structured responses. Defaults to 6.
+            shot_list (ShotList, optional): The structured response, e.g. loaded from a script.json. Defaults to None.
+            seed (int, optional): Seed of the latency distribution. Defaults to 0.
+        """
+        self.llm = "fake"
+        self.latency = LatencyModel.parse(latency, seed)
+        self.num_shots = num_shots
+        self.shot_list = shot_list
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # the counters are updated from the pipeline's thread pools
+        self._lock = threading.Lock()
+
+    def _record(self, messages: list, response: str) -> None:
+        """
+        Counts a call and its approximate token usage.
+        """
+        prompt_tokens = 0
+        for message in messages:
+            content = message["content"]
+            if not isinstance(content, str):
+                content = " ".join(part.get("text", "") for part in content)
+            prompt_tokens += count_tokens(content)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += count_tokens(response)
+
+    def make_api_call(self, messages: list) -> str:
+        """
+        Answers with a short text derived from the last message.
+        """
+        self.latency.wait()
+        content = messages[-1]["content"]
+        if not isinstance(content, str):
+            content = content[0]["text"]
+        response = f"fake response to: {content[:80]}"
+        self._record(messages, response)
+        return response
+
+    def make_api_call_structured(self, messages: list, response_model: type = ShotList):
+        """
+        Answers with the configured or canned ShotList, or for a ShotPromptList with prompts for every "shot N:" line of the last message.
+        """
+        self.latency.wait()
+        if response_model is ShotPromptList:
+            shots = re.findall(r"^shot (\d+): (.*)$", messages[-1]["content"], re.MULTILINE)
+            response = ShotPromptList(prompts=[
+                ShotPrompt(shot=int(i), image_prompt=f"fake image prompt for: {text[:80]}", video_prompt=f"fake video prompt for: {text[:80]}")
+                for i, text in shots
+            ])
+            self._record(messages, response.model_dump_json())
+            return response
+        if self.shot_list is not None:
+            response = self.shot_list.model_copy(deep=True)
+        else:
+            response = canned_shot_list(self.num_shots)
+        self._record(messages, response.to_str())
+        return response
+
+
+class FakeImageGen:
+    """
+    Stand-in for FluxWrapper that returns flat colored images.
+
+    Attributes:
+        latency (LatencyModel): Latency of each image.
+        calls (int): Number of images generated.
+        width (int): Width of the returned images.
+        height (int): Height of the returned images.
+    """
+
+    def __init__(self, latency=0.0, width: int = 256, height: int = 144, seed: int = 0) -> None:
+        """
+        Initializes the FakeImageGen.
+
+        Args:
+            latency (float | str | LatencyModel, optional): Latency of each image, see LatencyModel.parse. Defaults to 0.
+            width (int, optional): Width of the returned images. Defaults to 256.
+            height (int, optional): Height of the returned images. Defaults to 144.
+            seed (int, optional): Seed of the latency distribution. Defaults to 0.
+        """
+        self.latency = LatencyModel.parse(latency, seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.width = width
+        self.height = height
+
+    def generate_image(self, prompt: str, seed: int = None, *args, **kwargs) -> Image.Image:
+        """
+        Returns a flat image whose color depends on the prompt and seed.
+        """
+        self.latency.wait()
+        with self._lock:
+            self.calls += 1
+        rng = random.Random(f"{prompt}{seed}")
+        return Image.new("RGB", (self.width, self.height), tuple(rng.randrange(256) for _ in range(3)))
+
+    def generate_images(self, prompts: list[str], seeds: list[int] = None, **kwargs) -> list[Image.Image]:
+        """
+        Returns one flat image per prompt.
+        """
+        seeds = seeds or [None] * len(prompts)
+        return [self.generate_image(prompt, seed) for prompt, seed in zip(prompts, seeds)]
+
+
+class FakeVideoWrapper:
+    """
+    Stand-in for VideoWrapper that writes a short h264 test clip with ffmpeg.
+
+    Attributes:
+        api (str): Always "fake".
+        latency (LatencyModel): Latency of each call, before the clip is written.
+        calls (int): Number of clips generated.
+    """
+
+    def __init__(self, latency=0.0, seed: int = 0) -> None:
+        """
+        Initializes the FakeVideoWrapper.
+
+        Args:
+            latency (float | str | LatencyModel, optional): Latency of each call, see LatencyModel.parse. Defaults to 0.
+            seed (int, optional): Seed of the latency distribution. Defaults to 0.
+        """
+        self.api = "fake"
+        self.latency = LatencyModel.parse(latency, seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def make_api_call(self, prompt: str, img, duration: int = 5, idx=None) -> str:
+        """
+        Writes a test pattern clip where VideoWrapper would write the generated video.
+        """
+        self.latency.wait()
+        with self._lock:
+            self.calls += 1
+        name = f"{idx}" if idx is not None else prompt[:10].replace('"', '')
+        path = f"out_vids/{name}_img2video.mp4"
+        os.makedirs("out_vids", exist_ok=True)
+        subprocess.run([ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"testsrc2=size=320x180:rate=24:duration={duration}",
+                        "-c:v", "libx264", "-pix_fmt", "yuv420p", path], check=True)
+        return path
+
+
+class FakeTTSWrapper:
+    """
+    Stand-in for TTSWrapper that writes a tone as long as the VO would take to read.
+
+    Attributes:
+        api (str): Always "fake".
+        latency (LatencyModel): Latency of each call, before the audio is written.
+        words_per_second (float): Reading speed used for the audio length.
+        calls (int): Number of VOs generated.
+    """
+
+    def __init__(self, latency=0.0, words_per_second: float = 2.5, seed: int = 0) -> None:
+        """
+        Initializes the FakeTTSWrapper.
+
+        Args:
+            latency (float | str | LatencyModel, optional): Latency of each call, see LatencyModel.parse. Defaults to 0.
+            words_per_second (float, optional): Reading speed used for the audio length. Defaults to 2.5.
+            seed (int, optional): Seed of the latency distribution. Defaults to 0.
+        """
+        self.api = "fake"
+        self.latency = LatencyModel.parse(latency, seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.words_per_second = words_per_second
+
+    def make_api_call(self, prompt: str, seed: int = 0, idx=None) -> str:
+        """
+        Writes a tone where TTSWrapper would write the generated VO.
+        """
+        self.latency.wait()
+        with self._lock:
+            self.calls += 1
+        path = f"out_audio/{idx}.mp3" if idx is not None else f"out_audio/{prompt[:10]}.mp3"
+        os.makedirs("out_audio", exist_ok=True)
+        duration = max(1.0, min(10.0, len(prompt.split()) / self.words_per_second))
+        subprocess.run([ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration:.2f}",
+                        "-c:a", "libmp3lame", path], check=True)
+        return path
@@ -0,0 +1,267 @@
+import json
+import sqlite3
+import time
+import uuid
+
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    narrative TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker TEXT,
+    error TEXT,
+    artifacts TEXT NOT NULL DEFAULT '{}',
+    stage_times TEXT NOT NULL DEFAULT '{}',
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+"""
+
+JSON_COLUMNS = ("params", "artifacts", "stage_times")
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job when its cancellation was requested.
+    """
+
+
+class JobQueue:
+    """
+    Persistent episode job queue backed by SQLite.
+
+    Jobs move from "queued" to "running" when a worker claims them, then to "done", "failed" or "cancelled".
+    Every method opens its own connection, so the queue can be shared between threads and processes.
+
+    Attributes:
+        db_path (str): Path to the SQLite database.
+    """
+
+    def __init__(self, db_path: str = "jobs.db") -> None:
+        """
+        Initializes the JobQueue and creates the schema if needed.
+
+        Args:
+            db_path (str): Path to the SQLite database. Defaults to "jobs.db".
+        """
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection that returns rows as sqlite3.Row.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        """
+        Converts a jobs row to a dict with its JSON columns decoded.
+
+        Args:
+            row (sqlite3.Row): The row.
+
+        Returns:
+            dict: The job.
+        """
+        job = dict(row)
+        for column in JSON_COLUMNS:
+            job[column] = json.loads(job[column])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(self, narrative: str, params: dict = None) -> str:
+        """
+        Adds a job to the end of the queue.
+
+        Args:
+            narrative (str): What the episode is about.
+            params (dict, optional): Job parameters, see EpisodePipeline.run.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, narrative, params, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, narrative, json.dumps(params or {}), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker: str) -> dict:
+        """
+        Atomically takes the oldest queued job.
+
+        Args:
+            worker (str): Name of the claiming worker.
+
+        Returns:
+            dict: The claimed job, or None when the queue is empty.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                (worker, time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        return self.get(row["id"])
+
+    def get(self, job_id: str) -> dict:
+        """
+        Reads a job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            dict: The job, or None when it does not exist.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status: str = None, limit: int = 100) -> list[dict]:
+        """
+        Lists the most recent jobs.
+
+        Args:
+            status (str, optional): Only list jobs with this status.
+            limit (int, optional): Maximum number of jobs. Defaults to 100.
+
+        Returns:
+            list[dict]: The jobs, newest first.
+        """
+        with closing(self._connect()) as conn:
+            if status:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?", (status, limit)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def update_stage(self, job_id: str, stage: str, progress: float, stage_time: float = None) -> None:
+        """
+        Records the stage a running job is in.
+
+        Args:
+            job_id (str): The job id.
+            stage (str): The current stage.
+            progress (float): Overall progress between 0 and 1.
+            stage_time (float, optional): Seconds the previous stage took, stored under its name.
+
+        Raises:
+            JobCancelled: When cancellation of the job was requested.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT stage, stage_times, cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            stage_times = json.loads(row["stage_times"])
+            if stage_time is not None and row["stage"]:
+                stage_times[row["stage"]] = stage_time
+            conn.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, stage_times = ? WHERE id = ?",
+                (stage, progress, json.dumps(stage_times), job_id),
+            )
+            conn.execute("COMMIT")
+
+        if row["cancel_requested"]:
+            raise JobCancelled(job_id)
+
+    def add_artifact(self, job_id: str, name: str, path: str) -> None:
+        """
+        Records a file produced by a job.
+
+        Args:
+            job_id (str): The job id.
+            name (str): The artifact name used in download URLs.
+            path (str): Path to the file.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT artifacts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            artifacts = json.loads(row["artifacts"])
+            artifacts[name] = path
+            conn.execute("UPDATE jobs SET artifacts = ? WHERE id = ?", (json.dumps(artifacts), job_id))
+            conn.execute("COMMIT")
+
+    def finish(self, job_id: str, status: str, error: str = None) -> None:
+        """
+        Moves a running job to a final status.
+
+        Args:
+            job_id (str): The job id.
+            status (str): "done", "failed" or "cancelled".
+            error (str, optional): The error message of a failed job.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END WHERE id = ?",
+                (status, error, time.time(), status, job_id),
+            )
+
+    def cancel(self, job_id: str) -> dict:
+        """
+        Cancels a queued job immediately, or asks a running job to stop at its next stage boundary.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            dict: The job after the request, or None when it does not exist.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def requeue_running(self) -> int:
+        """
+        Puts jobs left running by a previous service process back in the queue.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, started = NULL, stage = NULL, progress = 0 WHERE status = 'running'")
+        return cursor.rowcount
+
+    def metrics(self) -> dict:
+        """
+        Summarizes the queue.
+
+        Returns:
+            dict: Job counts per status, and mean queue wait and run time in seconds over finished jobs.
+        """
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            waits = conn.execute(
+                "SELECT AVG(started - created), AVG(finished - started) FROM jobs WHERE status = 'done'"
+            ).fetchone()
+            oldest = conn.execute("SELECT MIN(created) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+        return {
+            "counts": {status: counts.get(status, 0) for status in ("queued", "running", "done", "failed", "cancelled")},
+            "mean_queue_wait": waits[0],
+            "mean_run_time": waits[1],
+            "oldest_queued_age": time.time() - oldest if oldest else None,
+        }
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from agents import RoundScheduler, augment_shot_prompts, instantiate_agents, get_agent_by_name
+from content_generation.assembly import AssemblyEngine
+from content_generation.cascade import PreviewCascade
+
+
+class EpisodePipeline:
+    """
+    Runs one episode job through the simulation and content stages, reporting stage progress to the job queue.
+
+    Stages: "simulation", "augment", "images", "media" (video and VO) and "assembly". Every job gets
+    fresh agents, while the content providers are shared by all workers. Image generation is
+    serialized since a single pipeline serves every worker.
+
+    Attributes:
+        scenario_file_path (str): Path to the scenario file.
+        image_gen: Image provider with a generate_images method.
+        video_gen: Video provider with a make_api_call method.
+        tts: TTS provider with a make_api_call method.
+        llm_factory (Callable): Creates the language model wrapper of each agent, Gemini when None.
+        output_dir (str): Directory the per-job artifact directories are created in.
+        max_workers (int): Maximum number of concurrent provider calls per stage.
+    """
+
+    def __init__(self, scenario_file_path: str, image_gen, video_gen, tts, llm_factory=None, output_dir: str = "jobs", max_workers: int = 6) -> None:
+        """
+        Initializes the EpisodePipeline.
+
+        Args:
+            scenario_file_path (str): Path to the scenario file.
+            image_gen: Image provider with a generate_images method.
+            video_gen: Video provider with a make_api_call method.
+            tts: TTS provider with a make_api_call method.
+            llm_factory (Callable, optional): Creates the language model wrapper of each agent, Gemini when None.
+            output_dir (str, optional): Directory the per-job artifact directories are created in. Defaults to "jobs".
+            max_workers (int, optional): Maximum number of concurrent provider calls per stage. Defaults to 6.
+        """
+        self.scenario_file_path = scenario_file_path
+        self.image_gen = image_gen
+        self.video_gen = video_gen
+        self.tts = tts
+        self.llm_factory = llm_factory
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.assembly = AssemblyEngine()
+        self.image_lock = threading.Lock()
+
+        for directory in ['out_vids', 'out_audio', output_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+    def run(self, job: dict, queue) -> None:
+        """
+        Runs a job. Supported params: "iterations" (default 3), "render" (default True), "duration" (default 5),
+        "combined_prompts" (default True, writes every image and video prompt in one structured call), "preview"
+        (default False, only shots whose preview is approved are rendered, see PreviewCascade) and "screen"
+        (default True, previews are screened by the preview_screen helper agent).
+
+        Args:
+            job (dict): The claimed job.
+            queue (JobQueue): The queue to report progress and artifacts to.
+
+        Raises:
+            JobCancelled: When cancellation of the job was requested.
+        """
+        job_id = job["id"]
+        params = job["params"]
+        iterations = int(params.get("iterations", 3))
+        duration = int(params.get("duration", 5))
+        job_dir = os.path.join(self.output_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        stage_start = time.perf_counter()
+
+        def enter_stage(stage, progress):
+            nonlocal stage_start
+            now = time.perf_counter()
+            queue.update_stage(job_id, stage, progress, now - stage_start)
+            stage_start = now
+
+        # simulation
+        enter_stage("simulation", 0.0)
+        synthetic_agents, helper_agents = instantiate_agents(self.scenario_file_path, self.llm_factory)
+        scheduler = RoundScheduler.from_scenario(self.scenario_file_path, synthetic_agents)
+        script_writer = scheduler.writer
+        img_prompt_agent = get_agent_by_name("img_prompt", helper_agents)
+        vid_prompt_agent = get_agent_by_name("vid_prompt", helper_agents)
+
+        turns = 0
+        total_turns = scheduler.total_turns(iterations)
+
+        def on_turn(agent_name, text):
+            nonlocal turns
+            turns += 1
+            # also raises JobCancelled between turns
+            queue.update_stage(job_id, "simulation", 0.4 * turns / total_turns)
+
+        final_script = scheduler.run(job["narrative"], iterations, on_turn=on_turn)
+
+        script_path = os.path.join(job_dir, "script.json")
+        with open(script_path, 'w') as json_file:
+            json.dump(final_script.to_json(), json_file, indent=4)
+        queue.add_artifact(job_id, "script.json", script_path)
+
+        if not params.get("render", True):
+            enter_stage("done", 1.0)
+            return
+
+        shots = final_script.shots
+
+        # augment
+        enter_stage("augment", 0.4)
+        if params.get("combined_prompts", True):
+            vid_texts = augment_shot_prompts(final_script, script_writer, img_prompt_agent, vid_prompt_agent)
+            img_texts = [shot.txt2img_prompt for shot in shots]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                augmented = list(executor.map(img_prompt_agent.basic_api_call, [shot.txt2img_prompt for shot in shots]))
+                vid_texts = list(executor.map(vid_prompt_agent.basic_api_call, [shot.txt2img_prompt for shot in shots]))
+            img_texts = [f"{script_writer.lora_key_word},\n\n {prompt}, \n\n Costume: {script_writer.flux_caption}" for prompt in augmented]
+
+        # images
+        enter_stage("images", 0.5)
+        shot_ids = list(range(len(shots)))
+        if params.get("preview", False):
+            # cheap previews first, only approved shots get a full render, a video and a VO
+            screen_agent = get_agent_by_name("preview_screen", helper_agents) if params.get("screen", True) else None
+            cascade = PreviewCascade(self.image_gen, screen_agent)
+            with self.image_lock:
+                result = cascade.run(img_texts, [shot.shot_action for shot in shots], video_seconds=duration)
+            for j, preview in enumerate(result["previews"]):
+                preview_path = os.path.join(job_dir, f"preview_{j:04d}.png")
+                preview.save(preview_path)
+                queue.add_artifact(job_id, f"preview_{j:04d}.png", preview_path)
+            report_path = os.path.join(job_dir, "preview_report.json")
+            with open(report_path, 'w') as json_file:
+                json.dump(result["report"], json_file, indent=4)
+            queue.add_artifact(job_id, "preview_report.json", report_path)
+            print(f"job {job_id}: {PreviewCascade.format_report(result['report'])}")
+            if not result["approved"]:
+                raise RuntimeError("every shot preview was rejected")
+            shot_ids = result["approved"]
+            imgs = result["images"]
+        else:
+            with self.image_lock:
+                imgs = self.image_gen.generate_images(img_texts)
+        for j, img in zip(shot_ids, imgs):
+            img_path = os.path.join(job_dir, f"scene_{j:04d}.png")
+            img.save(img_path)
+            queue.add_artifact(job_id, f"scene_{j:04d}.png", img_path)
+
+        # media
+        enter_stage("media", 0.7)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            vid_futures = [executor.submit(self.video_gen.make_api_call, vid_texts[j], img, duration, idx=f"{job_id}_{j}") for j, img in zip(shot_ids, imgs)]
+            audio_futures = [executor.submit(self.tts.make_api_call, shots[j].vo, idx=f"{job_id}_{j}") for j in shot_ids]
+            shot_clips = [(vid.result(), audio.result()) for vid, audio in zip(vid_futures, audio_futures)]
+        for j, (vid_path, audio_path) in zip(shot_ids, shot_clips):
+            # the providers report their errors and return None instead of raising
+            if not vid_path or not audio_path:
+                raise RuntimeError(f"shot {j}: the {'video' if not vid_path else 'VO'} provider returned no file")
+
+        # assembly
+        enter_stage("assembly", 0.9)
+        final_path = os.path.join(job_dir, "final_video.mp4")
+        shot_paths = [os.path.join(job_dir, f"scene_{j:04d}.mp4") for j in shot_ids]
+        self.assembly.assemble(shot_clips, final_path, shot_paths=shot_paths)
+        queue.add_artifact(job_id, "final_video.mp4", final_path)
+
+        enter_stage("done", 1.0)
@@ -0,0 +1,129 @@
+import json
+import mimetypes
+import os
+import re
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .service import ProductionService
+
+
+def make_handler(service: ProductionService):
+    """
+    Builds the HTTP request handler for a service.
+
+    Endpoints:
+        POST /jobs                          submit {"narrative": ..., "iterations": ..., "render": ..., "duration": ..., "combined_prompts": ..., "preview": ..., "screen": ...}
+        GET  /jobs                          list recent jobs, optionally ?status=queued
+        GET  /jobs/<id>                     job status, stage, progress, stage times and artifact names
+        POST /jobs/<id>/cancel              cancel a job
+        GET  /jobs/<id>/artifacts/<name>    download an artifact
+        GET  /metrics                       queue and worker metrics
+
+    Args:
+        service (ProductionService): The service the endpoints act on.
+
+    Returns:
+        type: A BaseHTTPRequestHandler subclass.
+    """
+    queue = service.queue
+
+    def public(job):
+        job = dict(job)
+        job["artifacts"] = sorted(job["artifacts"])
+        return job
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_file(self, path: str) -> None:
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, "rb") as file:
+                while chunk := file.read(1024 * 1024):
+                    self.wfile.write(chunk)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+
+            if path == "/metrics":
+                return self._send_json(200, service.metrics())
+
+            if path == "/jobs":
+                status = dict(re.findall(r"(\w+)=(\w+)", query)).get("status")
+                return self._send_json(200, [public(job) for job in queue.list(status)])
+
+            match = re.fullmatch(r"/jobs/(\w+)", path)
+            if match:
+                job = queue.get(match.group(1))
+                if job is None:
+                    return self._send_json(404, {"error": "job not found"})
+                return self._send_json(200, public(job))
+
+            match = re.fullmatch(r"/jobs/(\w+)/artifacts/([\w.\-]+)", path)
+            if match:
+                job = queue.get(match.group(1))
+                if job is None or match.group(2) not in job["artifacts"]:
+                    return self._send_json(404, {"error": "artifact not found"})
+                return self._send_file(job["artifacts"][match.group(2)])
+
+            self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path == "/jobs":
+                try:
+                    request = self._read_json()
+                except ValueError:
+                    return self._send_json(400, {"error": "invalid JSON"})
+                if not isinstance(request, dict):
+                    return self._send_json(400, {"error": "body must be a JSON object"})
+                narrative = request.pop("narrative", None)
+                if not narrative:
+                    return self._send_json(400, {"error": "narrative is required"})
+                job_id = queue.submit(narrative, request)
+                return self._send_json(202, public(queue.get(job_id)))
+
+            match = re.fullmatch(r"/jobs/(\w+)/cancel", self.path)
+            if match:
+                job = queue.cancel(match.group(1))
+                if job is None:
+                    return self._send_json(404, {"error": "job not found"})
+                return self._send_json(200, public(job))
+
+            self._send_json(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(service: ProductionService, host: str = "localhost", port: int = 8000) -> None:
+    """
+    Starts the service workers and serves the HTTP API until interrupted.
+
+    Args:
+        service (ProductionService): The service to expose.
+        host (str, optional): The host to bind. Defaults to "localhost".
+        port (int, optional): The port to bind. Defaults to 8000.
+    """
+    service.start()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"production service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,96 @@
+import threading
+import time
+import traceback
+
+from tracing import trace_context
+
+from .job_queue import JobCancelled, JobQueue
+from .pipeline import EpisodePipeline
+
+
+class ProductionService:
+    """
+    A pool of worker threads that take jobs from the queue and run them through the episode pipeline.
+
+    Attributes:
+        queue (JobQueue): The job queue.
+        pipeline (EpisodePipeline): The pipeline jobs are run through.
+        num_workers (int): Number of worker threads.
+        poll_interval (float): Seconds an idle worker waits before checking the queue again.
+        busy (set): Names of the workers currently running a job.
+    """
+
+    def __init__(self, queue: JobQueue, pipeline: EpisodePipeline, num_workers: int = 2, poll_interval: float = 1.0) -> None:
+        """
+        Initializes the ProductionService.
+
+        Args:
+            queue (JobQueue): The job queue.
+            pipeline (EpisodePipeline): The pipeline jobs are run through.
+            num_workers (int, optional): Number of worker threads. Defaults to 2.
+            poll_interval (float, optional): Seconds an idle worker waits before checking the queue again. Defaults to 1.
+        """
+        self.queue = queue
+        self.pipeline = pipeline
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.busy = set()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        """
+        Requeues jobs interrupted by a previous run and starts the workers.
+        """
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"requeued {requeued} interrupted jobs")
+
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._work, args=(f"worker_{i}",), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        Stops the workers after their current job.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def metrics(self) -> dict:
+        """
+        Summarizes the queue and the worker pool.
+
+        Returns:
+            dict: JobQueue.metrics plus worker counts.
+        """
+        return {**self.queue.metrics(), "workers": self.num_workers, "busy_workers": len(self.busy)}
+
+    def _work(self, name: str) -> None:
+        """
+        Worker loop: claims a job, runs it and records its outcome.
+
+        Args:
+            name (str): The worker name.
+        """
+        while not self._stop.is_set():
+            job = self.queue.claim(name)
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+
+            self.busy.add(name)
+            print(f"{name} running job {job['id']}")
+            try:
+                with trace_context(episode=job["id"]):
+                    self.pipeline.run(job, self.queue)
+                self.queue.finish(job["id"], "done")
+            except JobCancelled:
+                self.queue.finish(job["id"], "cancelled")
+            except Exception as e:
+                traceback.print_exc()
+                self.queue.finish(job["id"], "failed", repr(e))
+            finally:
+                self.busy.discard(name)
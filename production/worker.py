@@ -0,0 +1,280 @@
+import json
+import os
+import shutil
+import socket
+import threading
+import traceback
+
+from tracing import trace_context
+
+from .broker import Broker, default_worker_name
+
+KINDS = ("script", "image", "video", "tts", "mux", "assemble")
+
+
+class StageHandlers:
+    """
+    Runs the tasks a coordinator shards out, one run_<kind> method per task kind.
+
+    Every handler writes its output to the path given in the payload, which lives on storage shared by
+    the coordinator and all workers, and returns JSON serializable results. Handlers are idempotent, so a
+    task re-dispatched after its worker died simply overwrites the same output.
+
+    Attributes:
+        image_gen (FluxWrapper | ImageWorkerClient): Image generator, for "image" tasks.
+        video_gen (VideoWrapper): Video generator, for "video" tasks.
+        tts (TTSWrapper): Voice over generator, for "tts" tasks.
+        llm_factory (Callable): Creates the language model wrapper of each agent, for "script" tasks.
+        assembly (AssemblyEngine): Muxes and joins the clips, for "mux" and "assemble" tasks.
+    """
+
+    def __init__(self, image_gen=None, video_gen=None, tts=None, llm_factory=None, assembly=None) -> None:
+        """
+        Initializes the StageHandlers. Only the providers of the kinds a worker serves are needed.
+
+        Args:
+            image_gen (FluxWrapper | ImageWorkerClient, optional): Image generator.
+            video_gen (VideoWrapper, optional): Video generator.
+            tts (TTSWrapper, optional): Voice over generator.
+            llm_factory (Callable, optional): Creates the language model wrapper of each agent. Gemini LLMWrappers when None.
+            assembly (AssemblyEngine, optional): Muxes and joins the clips.
+        """
+        self.image_gen = image_gen
+        self.video_gen = video_gen
+        self.tts = tts
+        self.llm_factory = llm_factory
+        self.assembly = assembly
+        # the video and TTS providers write into these before their output is moved to the shared storage
+        if video_gen is not None:
+            os.makedirs("out_vids", exist_ok=True)
+        if tts is not None:
+            os.makedirs("out_audio", exist_ok=True)
+        # a worker running several tasks at once still renders one image at a time on its pipeline
+        self._image_lock = threading.Lock()
+
+    def handle(self, task: dict) -> dict:
+        """
+        Runs a task.
+
+        Args:
+            task (dict): The leased task.
+
+        Returns:
+            dict: The task result.
+        """
+        if task["kind"] not in KINDS:
+            raise ValueError(f"unknown task kind {task['kind']}")
+        with trace_context(episode=task["group"], task=task["id"]):
+            return getattr(self, f"run_{task['kind']}")(task["payload"])
+
+    def run_script(self, payload: dict) -> dict:
+        """
+        Simulates the episode and writes the image and video prompts of every shot.
+        """
+        from agents import RoundScheduler, get_agent_by_name, instantiate_agents
+        from agents.simulation import augment_shot_prompts
+
+        synthetic_agents, helper_agents = instantiate_agents(payload["scenario_file_path"], self.llm_factory)
+        scheduler = RoundScheduler.from_scenario(payload["scenario_file_path"], synthetic_agents)
+        script_writer = scheduler.writer
+        vid_prompt_agent = get_agent_by_name("vid_prompt", helper_agents)
+
+        script = scheduler.run(payload["narrative"], payload["iterations"])
+        vid_texts = augment_shot_prompts(script, script_writer, get_agent_by_name("img_prompt", helper_agents), vid_prompt_agent)
+
+        with open(payload["output"], 'w') as json_file:
+            json.dump(script.to_json(), json_file, indent=4)
+        return {"shots": [{"img_text": shot.txt2img_prompt, "vid_text": vid_text, "vo": shot.vo} for shot, vid_text in zip(script.shots, vid_texts)]}
+
+    def run_image(self, payload: dict) -> dict:
+        """
+        Renders the shot's image.
+        """
+        with self._image_lock:
+            img = self.image_gen.generate_image(payload["prompt"], payload.get("seed"))
+        img.save(payload["output"])
+        return {"path": payload["output"]}
+
+    def run_video(self, payload: dict) -> dict:
+        """
+        Generates the shot's video from its image.
+        """
+        from PIL import Image
+
+        with Image.open(payload["image"]) as img:
+            path = self.video_gen.make_api_call(payload["prompt"], img.convert("RGB"), duration=payload["duration"], idx=payload["idx"])
+        return self._move_output("video", path, payload["output"])
+
+    def run_tts(self, payload: dict) -> dict:
+        """
+        Generates the shot's voice over.
+        """
+        path = self.tts.make_api_call(payload["prompt"], idx=payload["idx"])
+        return self._move_output("tts", path, payload["output"])
+
+    @staticmethod
+    def _move_output(kind: str, path, output: str) -> dict:
+        """
+        Moves a provider's file to the task output.
+
+        Raises:
+            RuntimeError: When the provider returned no path or its file does not exist, e.g. after a failed download.
+        """
+        if not path or not os.path.isfile(path):
+            raise RuntimeError(f"the {kind} provider returned no file ({path!r}) for {output}")
+        shutil.move(path, output)
+        return {"path": output}
+
+    def run_mux(self, payload: dict) -> dict:
+        """
+        Trims the shot's video to its voice over and muxes them.
+        """
+        self.assembly.mux_shot(payload["video"], payload["audio"], payload["output"])
+        return {"path": payload["output"]}
+
+    def run_assemble(self, payload: dict) -> dict:
+        """
+        Joins the muxed shots into the final cut.
+        """
+        self.assembly.concat(payload["shots"], payload["output"])
+        return {"path": payload["output"]}
+
+
+class DistributedWorker:
+    """
+    Leases tasks of the kinds it serves from a broker, runs them and reports the results.
+
+    While a task runs, a heartbeat thread extends its lease, so only the tasks of a worker that died
+    or lost the broker are re-dispatched.
+
+    Attributes:
+        broker (Broker): Where tasks come from.
+        handlers (StageHandlers): Runs the tasks.
+        kinds (list[str]): The task kinds served.
+        name (str): The worker name, unique across hosts.
+        concurrency (int): Number of tasks run at the same time.
+        lease_seconds (float): Lease length, several heartbeat intervals long.
+        heartbeat_interval (float): Seconds between heartbeats.
+        poll_interval (float): Seconds an idle worker waits before asking for a task again.
+        held (set): Ids of the tasks currently running.
+        completed (int): Number of tasks completed.
+        failed (int): Number of tasks that raised.
+    """
+
+    def __init__(self, broker: Broker, handlers: StageHandlers, kinds: list[str], name: str = None, concurrency: int = 1, lease_seconds: float = 60.0, heartbeat_interval: float = 10.0, poll_interval: float = 1.0) -> None:
+        """
+        Initializes the DistributedWorker.
+
+        Args:
+            broker (Broker): Where tasks come from.
+            handlers (StageHandlers): Runs the tasks.
+            kinds (list[str]): The task kinds served.
+            name (str, optional): The worker name. host-pid when None.
+            concurrency (int, optional): Number of tasks run at the same time. Defaults to 1.
+            lease_seconds (float, optional): Lease length. Defaults to 60.
+            heartbeat_interval (float, optional): Seconds between heartbeats. Defaults to 10.
+            poll_interval (float, optional): Seconds an idle worker waits before asking for a task again. Defaults to 1.
+        """
+        self.broker = broker
+        self.handlers = handlers
+        self.kinds = list(kinds)
+        self.name = name or default_worker_name()
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.held = set()
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        """
+        Serves tasks until stop is called or the process is interrupted.
+        """
+        print(f"worker {self.name} serving {', '.join(self.kinds)}")
+        threads = [threading.Thread(target=self._heartbeat, daemon=True)]
+        threads += [threading.Thread(target=self._work, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self._stop.is_set():
+                self._stop.wait(1.0)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self) -> None:
+        """
+        Stops taking tasks. Running tasks finish in their threads.
+        """
+        self._stop.set()
+
+    def _heartbeat(self) -> None:
+        """
+        Extends the leases of the running tasks and announces the worker.
+        """
+        while not self._stop.is_set():
+            with self._lock:
+                task_ids = list(self.held)
+            try:
+                for task_id in task_ids:
+                    if not self.broker.heartbeat(self.name, task_id, self.lease_seconds):
+                        print(f"lost the lease of task {task_id}, it may be re-dispatched")
+                self.broker.register_worker(self.name, {
+                    "host": socket.gethostname(),
+                    "pid": os.getpid(),
+                    "kinds": self.kinds,
+                    "running": len(task_ids),
+                    "completed": self.completed,
+                    "failed": self.failed,
+                })
+            except Exception:
+                # an unreachable broker only costs leases, keep trying
+                traceback.print_exc()
+            self._stop.wait(self.heartbeat_interval)
+
+    def _work(self) -> None:
+        """
+        Worker loop: leases a task, runs it and reports its outcome.
+        """
+        while not self._stop.is_set():
+            try:
+                task = self.broker.lease(self.name, self.kinds, self.lease_seconds)
+            except Exception:
+                # a broker error must not end the loop, the task stays pending or its lease runs out
+                traceback.print_exc()
+                self._stop.wait(self.poll_interval)
+                continue
+            if task is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            with self._lock:
+                self.held.add(task["id"])
+            try:
+                self._run(task)
+            except Exception:
+                # the result could not be reported, the lease runs out and the task is re-dispatched
+                traceback.print_exc()
+                self._stop.wait(self.poll_interval)
+            finally:
+                with self._lock:
+                    self.held.discard(task["id"])
+
+    def _run(self, task: dict) -> None:
+        """
+        Runs a leased task and reports its result or error to the broker.
+        """
+        try:
+            result = self.handlers.handle(task)
+        except Exception as e:
+            traceback.print_exc()
+            self.failed += 1
+            self.broker.fail(self.name, task["id"], repr(e))
+            return
+        # even after a lost lease the result is kept if nobody finished the task first
+        if self.broker.complete(self.name, task["id"], result):
+            self.completed += 1
+        else:
+            print(f"task {task['id']} was re-dispatched and finished elsewhere")
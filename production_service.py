@@ -0,0 +1,48 @@
+import argparse
+import tracing
+
+from production import *
+
+# Parse command-line arguments
+parser = argparse.ArgumentParser(description="Headless episode production service")
+parser.add_argument('--host', type=str, default='localhost', help='Host to bind')
+parser.add_argument('--port', type=int, default=8000, help='Port to bind')
+parser.add_argument('--workers', type=int, default=2, help='Number of jobs run concurrently')
+parser.add_argument('--db_path', type=str, default='jobs.db', help='Path to the SQLite job queue')
+parser.add_argument('--output_dir', type=str, default='jobs', help='Directory job artifacts are written to')
+parser.add_argument('--scenario_file_path', type=str, default='config_files/scenario.yaml', help='Path to the scenario file')
+parser.add_argument('--image_worker', type=str, default=None, help='host:port of a running image_worker.py, loads a local Flux pipeline when omitted')
+parser.add_argument('--fake_providers', action='store_true', help='Use local stand-ins instead of the LLM, Flux, Kling and ElevenLabs providers')
+parser.add_argument('--trace', type=str, default=None, help='write a Chrome trace / Perfetto timeline to this path on exit')
+parser.add_argument('--otlp_endpoint', type=str, default=None, help='also send trace spans to this OTLP/HTTP endpoint')
+
+args = parser.parse_args()
+
+if args.trace or args.otlp_endpoint:
+    tracing.enable(args.trace, args.otlp_endpoint)
+
+print("loading content generation capabilities")
+if args.fake_providers:
+    from production.fakes import FakeImageGen, FakeLLMWrapper, FakeTTSWrapper, FakeVideoWrapper
+
+    llm_factory = FakeLLMWrapper
+    image_gen = FakeImageGen()
+    video_gen = FakeVideoWrapper()
+    tts = FakeTTSWrapper()
+else:
+    from content_generation import FluxWrapper, ImageWorkerClient, TTSWrapper, VideoWrapper
+
+    llm_factory = None
+    if args.image_worker:
+        image_gen = ImageWorkerClient(args.image_worker)
+    else:
+        image_gen = FluxWrapper("black-forest-labs/FLUX.1-dev", ["lora/ARCANE_STYLE_FADOO-FLUX.safetensors", "lora/taylrrdect-v5.safetensors"])
+    video_gen = VideoWrapper(api="kling")
+    tts = TTSWrapper(api="eleven_labs")
+print("loading complete")
+
+queue = JobQueue(args.db_path)
+pipeline = EpisodePipeline(args.scenario_file_path, image_gen, video_gen, tts, llm_factory=llm_factory, output_dir=args.output_dir)
+service = ProductionService(queue, pipeline, num_workers=args.workers)
+
+serve(service, args.host, args.port)
@@ -1,9 +1,9 @@
 import argparse
 import json
+import tracing
 
 from utils import *
 from agents import *
-from content_generation import *
 
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description="Simulated Agents")
@@ -13,62 +13,69 @@ parser.add_argument('--interactive', action='store_true', help='Interactive mode
 parser.add_argument('--augment_prompts', action='store_true', help='Interactive mode')
 
 parser.add_argument('--narrative', type=str, default='today we are writing a story about a young boy learning about the universe', help='what are we writing an episode about')
+parser.add_argument('--narratives_file', type=str, default=None, help='batch mode: text or JSONL file of narratives, one episode per line, "-" for stdin')
+parser.add_argument('--output', type=str, default='scripts.jsonl', help='batch mode: JSONL file the scripts are appended to, finished episodes are skipped on a rerun')
+parser.add_argument('--concurrency', type=int, default=8, help='batch mode: number of episodes simulated at the same time')
+parser.add_argument('--checkpoint', type=str, default=None, help='single mode: checkpoint every turn to this file and resume from it if it exists')
+parser.add_argument('--checkpoint_dir', type=str, default='checkpoints', help='batch mode: per-episode turn checkpoints, an interrupted episode resumes after its last turn; also holds the --branches checkpoints')
+parser.add_argument('--branches', type=int, default=1, help='single mode: fork the simulation into this many alternative scripts and keep the best ones')
+parser.add_argument('--fork_at', type=int, default=1, help='single mode: story beat the branches diverge at, the beats before it are run once and shared')
+parser.add_argument('--top_n', type=int, default=1, help='single mode: number of best branches written to branches.json')
+parser.add_argument('--fake_providers', action='store_true', help='Use a local stand-in instead of the LLM providers')
+parser.add_argument('--trace', type=str, default=None, help='write a Chrome trace / Perfetto timeline of the run to this path')
+parser.add_argument('--otlp_endpoint', type=str, default=None, help='also send trace spans to this OTLP/HTTP endpoint')
 
 args = parser.parse_args()
 
-all_scenes = []
-
-
-#load all the agents
-print("loading agents")
-synthetic_agents, helper_agents = instantiate_agents(args.scenario_file_path)
-script_writer = get_agent_by_name("script_writer", synthetic_agents)
-producer = get_agent_by_name("producer", synthetic_agents)
-img_prompt_agent = get_agent_by_name("img_prompt", helper_agents)
-
-character_agents = [script_writer, producer]
-
-
-#instantiate the first observation
-observation = args.narrative
-all_scenes.append(observation)
-final_script = None
-
-# Simulate the scene
-print("simulating scene")
-for i in range(args.iterations):
-    for agent in character_agents:
-        if agent.name == "script_writer":
-            if i == 0:
-                script = script_writer.process_observation(observation, all_scenes, use_structured=True)
-            else:
-                script = script_writer.process_observation(f"please make the following changes to the orignal script: {observation}", all_scenes, use_structured=True)
-            
-            script_str = script.to_str()
-            print(script_str)
-            all_scenes.append(script_str)
-        
-        elif agent.name == "producer":
-
-            observation = producer.process_observation(f"what do you think of : {script_str} tell the script writer what they should change", all_scenes)
-            print(observation)
-            all_scenes.append(observation)
-
-final_script = script_writer.process_observation(f"please make the following changes to the orignal script: {observation}", all_scenes, use_structured=True)
-
-if args.augment_prompts:
-    print("augmenting prompts")
-    for i,shot in enumerate(final_script.shots):
-
-        augmented_prompt = img_prompt_agent.basic_api_call(shot.txt2img_prompt)
-        img_prompt = f"{script_writer.lora_key_word},\n\n {augmented_prompt}, \n\n Costume: {script_writer.flux_caption}"
-        final_script.shots[i].txt2img_prompt = img_prompt
-
-script_json = final_script.to_json() 
-
-with open('script.json', 'w') as json_file:
-    json.dump(script_json, json_file, indent=4)
-
-print("script saved to script.json")
-
-
+if args.trace or args.otlp_endpoint:
+    tracing.enable(args.trace, args.otlp_endpoint)
+
+llm_factory = None
+if args.fake_providers:
+    from production.fakes import FakeLLMWrapper
+
+    llm_factory = FakeLLMWrapper
+
+if args.narratives_file:
+    from agents.batch import run_script_batch
+
+    print("running batch")
+    stats = run_script_batch(args.narratives_file, args.output, args.scenario_file_path, args.iterations, args.concurrency, args.augment_prompts, llm_factory, args.checkpoint_dir)
+    print(f"{stats['completed']} episodes written to {args.output}, {stats['skipped']} already done, {stats['failed']} failed")
+    print(f"{stats['wall_time']:.1f}s, {stats['episodes_per_hour']:.1f} episodes/hour")
+
+else:
+    #load all the agents
+    print("loading agents")
+    synthetic_agents, helper_agents = instantiate_agents(args.scenario_file_path, llm_factory)
+    scheduler = RoundScheduler.from_scenario(args.scenario_file_path, synthetic_agents)
+    script_writer = scheduler.writer
+    img_prompt_agent = get_agent_by_name("img_prompt", helper_agents)
+
+    # Simulate the scene
+    print("simulating scene")
+    if args.branches > 1:
+        best = scheduler.branch(args.narrative, args.iterations, args.branches, args.fork_at, args.top_n, checkpoint_dir=args.checkpoint_dir,
+                                on_turn=lambda branch, agent_name, text: print(f"[{'shared' if branch is None else f'branch {branch}'}] {text}"))
+        for rank, result in enumerate(best):
+            print(f"#{rank + 1}: branch {result['branch']}, score {result['score']}: {result['verdict']}")
+        with open('branches.json', 'w') as json_file:
+            json.dump([{"branch": result["branch"], "score": result["score"], "verdict": result["verdict"], "script": result["script"].to_json()} for result in best], json_file, indent=4)
+        print(f"best {len(best)} of {args.branches} branches saved to branches.json")
+        final_script = best[0]["script"]
+    else:
+        checkpoint = SimulationCheckpoint(args.checkpoint) if args.checkpoint else None
+        final_script = scheduler.run(args.narrative, args.iterations, on_turn=lambda agent_name, text: print(text), checkpoint=checkpoint)
+
+    if args.augment_prompts:
+        print("augmenting prompts")
+        augment_prompts(final_script, script_writer, img_prompt_agent)
+        if img_prompt_agent.cache is not None:
+            print(f"{img_prompt_agent.name} cache: {img_prompt_agent.cache.format_stats()}")
+
+    script_json = final_script.to_json() 
+
+    with open('script.json', 'w') as json_file:
+        json.dump(script_json, json_file, indent=4)
+
+    print("script saved to script.json")
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def scenario_file(tmp_path, monkeypatch):
+    """
+    Writes config_files/scenario.yaml with absolute agent config paths and runs the test in tmp_path, so the
+    directories the flows create stay out of the repository.
+    """
+    with open(os.path.join(REPO_ROOT, "config_files", "scenario.yaml")) as file:
+        scenario = yaml.safe_load(file)
+    for key in ("synthetic_agents", "helper_agents"):
+        scenario[key] = [os.path.join(REPO_ROOT, path) for path in scenario[key]]
+    path = tmp_path / "scenario.yaml"
+    path.write_text(yaml.safe_dump(scenario))
+    monkeypatch.chdir(tmp_path)
+    return str(path)
+
+
+@pytest.fixture
+def make_agents():
+    """
+    Creates synthetic agents answering with the stand-in LLM. Agents without a config of their own are producers
+    under another name, e.g. critics for a round schedule.
+    """
+    from agents import SyntheticAgent
+    from production.fakes import FakeLLMWrapper
+
+    def make(names=("script_writer", "producer"), llm=None):
+        agents = []
+        for name in names:
+            config = os.path.join(REPO_ROOT, "config_files", f"{name}.yaml")
+            if not os.path.exists(config):
+                config = os.path.join(REPO_ROOT, "config_files", "producer.yaml")
+            agent = SyntheticAgent(config, llm or FakeLLMWrapper())
+            agent.name = name
+            agents.append(agent)
+        return agents
+    return make
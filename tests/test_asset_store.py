@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from content_generation.asset_store import AssetCreationError, AssetStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AssetStore(str(tmp_path / "assets"))
+
+
+def test_fetch_generates_once(store, tmp_path):
+    calls = []
+
+    def create():
+        calls.append(1)
+        path = tmp_path / f"clip_{len(calls)}.mp4"
+        path.write_bytes(b"video")
+        return str(path)
+
+    inputs = {"api": "fake", "prompt": "a detective", "duration": 5}
+    first = store.fetch("video", inputs, create)
+    second = store.fetch("video", inputs, create)
+    assert first == second
+    assert len(calls) == 1
+    assert first.startswith(os.path.join(store.root, "objects"))
+
+
+@pytest.mark.parametrize("result", [None, [], "missing.mp4"])
+def test_fetch_rejects_failed_generation(store, result):
+    inputs = {"api": "fake", "prompt": "a detective", "duration": 5}
+    with pytest.raises(AssetCreationError, match="video generation produced no file"):
+        store.fetch("video", inputs, lambda: result)
+    assert store.get(AssetStore.key("video", inputs)) is None
@@ -0,0 +1,42 @@
+from content_generation.cascade import PreviewCascade
+from production.fakes import FakeImageGen
+
+
+class ScriptedScreen:
+    """
+    Screening agent stand-in that rejects the first preview of some shots and every preview of others.
+    """
+
+    def __init__(self, reject_once=(), reject_always=()):
+        self.reject_once = set(reject_once)
+        self.reject_always = set(reject_always)
+
+    def image_api_call(self, query, image):
+        shot = query.split("The shot should show: ")[1].split("\n")[0]
+        if shot in self.reject_always or shot in self.reject_once:
+            self.reject_once.discard(shot)
+            return "REJECT the detective is missing"
+        return "APPROVE shows the shot"
+
+
+def test_rejected_shot_is_retried_with_derived_seed():
+    image_gen = FakeImageGen()
+    cascade = PreviewCascade(image_gen, ScriptedScreen(reject_once=["shot 1"]))
+    result = cascade.run(["prompt 0", "prompt 1", "prompt 2"], ["shot 0", "shot 1", "shot 2"], seeds=[10, 11, 12])
+
+    assert result["approved"] == [0, 1, 2]
+    assert result["seeds"] == [10, PreviewCascade.retry_seed(11, 1), 12]
+    assert result["seeds"][1] != 11
+    assert result["report"]["previews"] == 4
+    assert len(result["images"]) == 3
+    # a rerun with the same seeds retries with the same seed
+    again = PreviewCascade(FakeImageGen(), ScriptedScreen(reject_once=["shot 1"])).run(["prompt 0", "prompt 1", "prompt 2"], ["shot 0", "shot 1", "shot 2"], seeds=[10, 11, 12])
+    assert again["seeds"] == result["seeds"]
+
+
+def test_shot_rejected_on_every_attempt_is_dropped():
+    result = PreviewCascade(FakeImageGen(), ScriptedScreen(reject_always=["shot 0"]), retries=2).run(["prompt 0", "prompt 1"], ["shot 0", "shot 1"], seeds=[1, 2])
+
+    assert result["approved"] == [1]
+    assert result["report"]["previews"] == 4
+    assert result["seeds"][0] == PreviewCascade.retry_seed(1, 2)
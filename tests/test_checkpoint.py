@@ -0,0 +1,76 @@
+import json
+
+from agents import RoundScheduler
+from agents.checkpoint import SimulationCheckpoint
+from production.fakes import FakeLLMWrapper
+
+NARRATIVE = "how does the internet work"
+
+
+def test_resume_continues_after_last_recorded_turn(make_agents, tmp_path):
+    reference_agents = make_agents()
+    reference_scenes = [NARRATIVE]
+    reference = RoundScheduler(reference_agents).run(NARRATIVE, 3, all_scenes=reference_scenes)
+
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    steps = RoundScheduler(make_agents()).steps(NARRATIVE, 3, checkpoint=checkpoint)
+    for _ in range(3):
+        next(steps)
+    steps.close()
+
+    llm = FakeLLMWrapper()
+    agents = make_agents(llm=llm)
+    scenes = [NARRATIVE]
+    script = RoundScheduler(agents).run(NARRATIVE, 3, all_scenes=scenes, checkpoint=SimulationCheckpoint(checkpoint.path))
+
+    # 7 turns in all, the first 3 were replayed without a model call
+    assert llm.calls == 4
+    assert script.to_json() == reference.to_json()
+    assert scenes == reference_scenes
+    for agent, reference_agent in zip(agents, reference_agents):
+        assert agent.short_memory == reference_agent.short_memory
+    assert SimulationCheckpoint.load(checkpoint.path)["turns"] == 7
+
+
+def test_finished_checkpoint_replays_without_calls(make_agents, tmp_path):
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    first = RoundScheduler(make_agents()).run(NARRATIVE, 2, checkpoint=checkpoint)
+
+    llm = FakeLLMWrapper()
+    script = RoundScheduler(make_agents(llm=llm)).run(NARRATIVE, 2, checkpoint=SimulationCheckpoint(checkpoint.path))
+    assert llm.calls == 0
+    assert script.to_json() == first.to_json()
+
+
+def test_resume_restarts_at_earlier_turn(make_agents, tmp_path):
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    RoundScheduler(make_agents()).run(NARRATIVE, 2, checkpoint=checkpoint)
+
+    agents = make_agents()
+    restarted = SimulationCheckpoint(checkpoint.path)
+    state = restarted.resume(agents, upto=2)
+    assert state["turns"] == 2
+    assert [name for name, _ in state["history"]] == ["script_writer", "producer"]
+    assert agents[0].short_memory == state["memories"]["script_writer"]["short"]
+
+    # later turns were dropped and new ones follow the kept ones
+    restarted.record("script_writer", agents, state["all_scenes"] + ["a new direction"], "a note")
+    turns = [json.loads(line) for line in open(checkpoint.path).read().splitlines()[1:]]
+    assert [turn["turn"] for turn in turns] == [0, 1, 2]
+    assert turns[-1]["scenes"] == ["a new direction"]
+
+
+def test_load_ignores_a_turn_cut_short(make_agents, tmp_path):
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    RoundScheduler(make_agents()).run(NARRATIVE, 1, checkpoint=checkpoint)
+    with open(checkpoint.path, 'a') as file:
+        file.write('{"type": "turn", "turn": 3, "age')
+    assert SimulationCheckpoint.load(checkpoint.path)["turns"] == 3
+
+
+def test_fork_copies_first_turns(make_agents, tmp_path):
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    RoundScheduler(make_agents()).run(NARRATIVE, 2, checkpoint=checkpoint)
+    fork = checkpoint.fork(str(tmp_path / "fork" / "sim.jsonl"), upto=2)
+    assert SimulationCheckpoint.load(fork.path)["turns"] == 2
+    assert SimulationCheckpoint.load(checkpoint.path)["turns"] == 5
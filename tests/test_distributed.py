@@ -0,0 +1,187 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from production.broker import Broker, SQLiteBroker, open_broker
+from production.fakes import FakeImageGen
+from production.worker import DistributedWorker, StageHandlers
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def broker_url(request, tmp_path):
+    if request.param == "sqlite":
+        return f"sqlite://{tmp_path / 'tasks.db'}"
+    return f"file://{tmp_path / 'broker'}"
+
+
+@pytest.fixture
+def make_broker(broker_url):
+    """
+    Opens brokers on the same storage, one per worker as with separate processes.
+    """
+    return lambda max_attempts=3: open_broker(broker_url, max_attempts)
+
+
+def wait_until(condition, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return
+        time.sleep(0.02)
+    raise AssertionError("timed out")
+
+
+def start_worker(broker, name, latency=0.0, **kwargs):
+    """
+    Runs a DistributedWorker serving image tasks with the stand-in image generator in a thread.
+    """
+    kwargs = {"lease_seconds": 1.0, "heartbeat_interval": 0.1, "poll_interval": 0.02, **kwargs}
+    worker = DistributedWorker(broker, StageHandlers(image_gen=FakeImageGen(latency)), ["image"], name=name, **kwargs)
+    threading.Thread(target=worker.run, daemon=True).start()
+    return worker
+
+
+def put_images(broker, tmp_path, count):
+    return [broker.put("image", {"prompt": f"shot {i}", "seed": i, "output": str(tmp_path / f"{i}.png")}, task_id=f"ep.image.{i:04d}")
+            for i in range(count)]
+
+
+def test_workers_run_every_task_once(make_broker, tmp_path):
+    broker = make_broker()
+    task_ids = put_images(broker, tmp_path, 12)
+    workers = [start_worker(make_broker(), f"w{k}", latency=0.02, concurrency=2) for k in range(3)]
+    try:
+        wait_until(lambda: all(task["status"] == "done" for task in broker.get_many(task_ids).values()))
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    tasks = broker.get_many(task_ids)
+    assert all(task["attempts"] == 1 for task in tasks.values())
+    assert all(os.path.exists(task["result"]["path"]) for task in tasks.values())
+    assert sum(worker.completed for worker in workers) == 12
+
+
+def serve_slowly(broker_url):
+    worker = DistributedWorker(open_broker(broker_url), StageHandlers(image_gen=FakeImageGen(60)), ["image"], name="doomed",
+                               lease_seconds=0.5, heartbeat_interval=0.1, poll_interval=0.02)
+    worker.run()
+
+
+def test_killed_worker_task_is_redispatched(broker_url, make_broker, tmp_path):
+    broker = make_broker()
+    [task_id] = put_images(broker, tmp_path, 1)
+    process = multiprocessing.get_context("fork").Process(target=serve_slowly, args=(broker_url,))
+    process.start()
+    try:
+        wait_until(lambda: broker.get_many([task_id]).get(task_id, {}).get("owner") == "doomed")
+        # heartbeats keep the lease of a live worker
+        time.sleep(1.0)
+        assert broker.get_many([task_id])[task_id]["status"] == "leased"
+    finally:
+        process.kill()
+        process.join()
+
+    worker = start_worker(make_broker(), "survivor")
+    try:
+        wait_until(lambda: broker.get_many([task_id])[task_id]["status"] == "done")
+    finally:
+        worker.stop()
+    task = broker.get_many([task_id])[task_id]
+    assert task["owner"] == "survivor"
+    assert task["attempts"] == 2
+
+
+def test_incomplete_brokers_cannot_be_created():
+    class NoLeases(Broker):
+        put = SQLiteBroker.put
+
+    with pytest.raises(TypeError, match="abstract"):
+        NoLeases()
+
+
+def test_complete_is_first_wins(make_broker):
+    broker = make_broker()
+    task_id = broker.put("image", {}, task_id="ep.image.0000")
+    assert broker.lease("slow", ["image"], 0.1)["id"] == task_id
+    time.sleep(0.2)
+    assert broker.lease("fast", ["image"], 10.0)["attempts"] == 2
+    assert not broker.heartbeat("slow", task_id, 10.0)
+
+    assert broker.complete("fast", task_id, {"by": "fast"})
+    assert not broker.complete("slow", task_id, {"by": "slow"})
+    task = broker.get_many([task_id])[task_id]
+    assert task["status"] == "done"
+    assert task["result"] == {"by": "fast"}
+
+
+def test_failing_task_fails_after_max_attempts(make_broker, tmp_path):
+    broker = make_broker(max_attempts=2)
+    # the image cannot be saved into a missing directory
+    task_id = broker.put("image", {"prompt": "shot", "seed": 0, "output": str(tmp_path / "missing" / "0.png")})
+    workers = [start_worker(make_broker(max_attempts=2), f"w{k}") for k in range(2)]
+    try:
+        wait_until(lambda: broker.get_many([task_id])[task_id]["status"] == "failed")
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    task = broker.get_many([task_id])[task_id]
+    assert task["attempts"] == 2
+    assert "FileNotFoundError" in task["error"]
+    assert sum(worker.failed for worker in workers) == 2
+
+
+class StubTTS:
+    """
+    Stand-in TTS provider that, like TTSWrapper, writes into out_audio without creating it, or returns no path.
+    """
+
+    def __init__(self, returns_path=True):
+        self.returns_path = returns_path
+
+    def make_api_call(self, prompt, seed=0, idx=None):
+        if not self.returns_path:
+            return None
+        path = f"out_audio/{idx}.mp3"
+        with open(path, "wb") as file:
+            file.write(b"vo")
+        return path
+
+
+@pytest.mark.parametrize("returns_path", [True, False])
+def test_tts_tasks_on_a_fresh_worker(make_broker, tmp_path, monkeypatch, returns_path):
+    monkeypatch.chdir(tmp_path)
+    broker = make_broker(max_attempts=1)
+    task_id = broker.put("tts", {"prompt": "a line", "idx": "ep_0", "output": str(tmp_path / "0.mp3")})
+    worker = DistributedWorker(make_broker(max_attempts=1), StageHandlers(tts=StubTTS(returns_path)), ["tts"], name="w",
+                               lease_seconds=1.0, heartbeat_interval=0.1, poll_interval=0.02)
+    threading.Thread(target=worker.run, daemon=True).start()
+    try:
+        wait_until(lambda: broker.get_many([task_id])[task_id]["status"] in ("done", "failed"))
+    finally:
+        worker.stop()
+
+    task = broker.get_many([task_id])[task_id]
+    if returns_path:
+        assert task["status"] == "done"
+        assert (tmp_path / "0.mp3").read_bytes() == b"vo"
+    else:
+        assert task["status"] == "failed"
+        assert "the tts provider returned no file (None)" in task["error"]
+
+
+def test_expired_leases_fail_after_max_attempts(make_broker):
+    broker = make_broker(max_attempts=2)
+    task_id = broker.put("image", {})
+    for attempt in range(2):
+        assert broker.lease(f"dead{attempt}", ["image"], 0.05)["attempts"] == attempt + 1
+        time.sleep(0.1)
+
+    assert broker.lease("live", ["image"], 10.0) is None
+    task = broker.get_many([task_id])[task_id]
+    assert task["status"] == "failed"
+    assert task["error"] == "lease expired too many times"
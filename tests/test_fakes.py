@@ -0,0 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from production.fakes import FakeImageGen, FakeLLMWrapper, count_tokens
+
+
+def test_counters_add_up_across_threads():
+    llm = FakeLLMWrapper()
+    image_gen = FakeImageGen(width=8, height=8)
+    messages = [{"role": "system", "content": "a system prompt"}, {"role": "user", "content": "a question"}]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(lambda i: llm.make_api_call(messages), range(2000)))
+        list(executor.map(lambda i: image_gen.generate_image(f"shot {i}", i), range(2000)))
+
+    assert llm.calls == 2000
+    assert llm.prompt_tokens == 2000 * (count_tokens("a system prompt") + count_tokens("a question"))
+    assert llm.completion_tokens == 2000 * count_tokens("fake response to: a question")
+    assert image_gen.calls == 2000
@@ -0,0 +1,29 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+flux_wrapper = pytest.importorskip("content_generation.flux_wrapper")
+
+SHORT_PROMPT = "a cat"
+LONG_PROMPT = ", ".join(["a detective in a tailored dark suit walking through a glitchy neon city at night"] * 20)
+
+
+def test_stack_prompt_embeds_pads_to_longest():
+    short = (torch.randn(1, 7, 16), torch.randn(1, 8))
+    long = (torch.randn(1, 300, 16), torch.randn(1, 8))
+    prompt_embeds, pooled_prompt_embeds = flux_wrapper.stack_prompt_embeds([short, long])
+
+    assert prompt_embeds.shape == (2, 300, 16)
+    assert pooled_prompt_embeds.shape == (2, 8)
+    assert torch.equal(prompt_embeds[0, :7], short[0][0])
+    assert torch.count_nonzero(prompt_embeds[0, 7:]) == 0
+    assert torch.equal(prompt_embeds[1], long[0][0])
+
+
+def test_generate_images_batches_prompts_of_different_lengths():
+    try:
+        image_gen = flux_wrapper.FluxWrapper("hf-internal-testing/tiny-flux-pipe", [], device="cpu")
+    except OSError as e:
+        pytest.skip(f"tiny Flux model unavailable: {e}")
+
+    images = image_gen.generate_images([SHORT_PROMPT, LONG_PROMPT], [0, 1], steps=2, width=64, height=64, batch_size=2)
+    assert [image.size for image in images] == [(64, 64), (64, 64)]
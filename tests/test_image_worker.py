@@ -0,0 +1,106 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from multiprocessing.connection import Client
+from multiprocessing.shared_memory import SharedMemory
+
+from content_generation import ImageWorker, ImageWorkerClient
+from content_generation.image_worker import client_authkey, worker_authkey
+from production.fakes import FakeImageGen
+
+
+@pytest.fixture
+def worker_address():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        address = sock.getsockname()
+    worker = ImageWorker(FakeImageGen(), address, authkey=b"test")
+    threading.Thread(target=worker.serve_forever, daemon=True).start()
+    for _ in range(100):
+        try:
+            Client(address, authkey=b"test").close()
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.01)
+    return address
+
+
+def test_images_come_back_in_prompt_order(worker_address):
+    client = ImageWorkerClient(worker_address, authkey=b"test")
+    images = client.generate_images(["a", "b"], [1, 2])
+    assert [image.size for image in images] == [(256, 144)] * 2
+    assert images[0].tobytes() == FakeImageGen().generate_image("a", 1).tobytes()
+    assert client.stats()["completed"] == 1
+
+
+@pytest.mark.parametrize("message", [{"type": "resize"}, {"kwargs": {}}, "stats", {"type": "generate"}])
+def test_malformed_messages_get_an_error_reply(worker_address, message):
+    with Client(worker_address, authkey=b"test") as conn:
+        conn.send(message)
+        assert "error" in conn.recv()
+        # the connection still answers afterwards
+        conn.send({"type": "stats"})
+        assert "queue_depth" in conn.recv()
+
+
+def test_unclaimed_blocks_are_unlinked_when_the_connection_closes(worker_address):
+    with Client(worker_address, authkey=b"test") as conn:
+        conn.send({"type": "generate", "kwargs": {"prompts": ["a", "b"], "seeds": [1, 2]}})
+        names = [image["name"] for image in conn.recv()["images"]]
+
+    for _ in range(100):
+        try:
+            SharedMemory(name=names[-1]).close()
+        except FileNotFoundError:
+            break
+        time.sleep(0.01)
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+
+@pytest.fixture
+def key_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("IMAGE_WORKER_AUTHKEY", raising=False)
+    path = tmp_path / "keys" / "image_worker.key"
+    monkeypatch.setenv("IMAGE_WORKER_KEY_FILE", str(path))
+    return path
+
+
+def test_a_worker_without_a_key_shares_a_random_one(key_file):
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        address = sock.getsockname()
+    worker = ImageWorker(FakeImageGen(), address)
+    assert len(worker.authkey) == 64
+    assert key_file.read_bytes() == worker.authkey
+    assert os.stat(key_file).st_mode & 0o777 == 0o600
+    assert client_authkey(address) == worker.authkey
+
+    threading.Thread(target=worker.serve_forever, daemon=True).start()
+    for _ in range(100):
+        try:
+            assert ImageWorkerClient(address).stats()["completed"] == 0
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.01)
+    else:
+        raise AssertionError("worker did not start")
+
+
+def test_public_addresses_need_an_explicit_key(key_file, monkeypatch):
+    with pytest.raises(ValueError, match="IMAGE_WORKER_AUTHKEY"):
+        worker_authkey(("0.0.0.0", 6000))
+    assert not key_file.exists()
+    assert worker_authkey(("0.0.0.0", 6000), b"secret") == b"secret"
+    monkeypatch.setenv("IMAGE_WORKER_AUTHKEY", "from-env")
+    assert worker_authkey(("0.0.0.0", 6000)) == b"from-env"
+
+
+def test_clients_without_a_key_fail_clearly(key_file):
+    with pytest.raises(ValueError, match="no key"):
+        ImageWorkerClient(("localhost", 6000)).stats()
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from production.fakes import FakeImageGen, FakeLLMWrapper
+from production.job_queue import JobCancelled, JobQueue
+from production.pipeline import EpisodePipeline
+from production.server import make_handler
+from production.service import ProductionService
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def wait_for_status(queue, job_id, statuses, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {queue.get(job_id)['status']}")
+
+
+def test_claim_takes_each_job_once_in_order(queue):
+    job_ids = [queue.submit(f"episode {i}") for i in range(20)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        claims = list(executor.map(lambda i: queue.claim(f"worker_{i % 8}"), range(24)))
+
+    claimed = [job["id"] for job in claims if job is not None]
+    assert sorted(claimed) == sorted(job_ids)
+    assert queue.claim("late") is None
+    assert all(queue.get(job_id)["status"] == "running" for job_id in job_ids)
+    # a single worker gets them oldest first
+    ordered = [queue.submit(f"episode {i}") for i in range(3)]
+    assert [queue.claim("worker")["id"] for _ in ordered] == ordered
+
+
+def test_cancel_queued_job(queue):
+    job_id = queue.submit("episode")
+    job = queue.cancel(job_id)
+    assert job["status"] == "cancelled"
+    assert job["finished"] is not None
+    assert queue.claim("worker") is None
+    assert queue.cancel("missing") is None
+
+
+def test_cancel_running_job_stops_at_next_stage(queue):
+    job_id = queue.submit("episode")
+    queue.claim("worker")
+    queue.update_stage(job_id, "simulation", 0.1)
+
+    job = queue.cancel(job_id)
+    assert job["status"] == "running"
+    assert job["cancel_requested"]
+    with pytest.raises(JobCancelled):
+        queue.update_stage(job_id, "augment", 0.4, stage_time=1.5)
+    assert queue.get(job_id)["stage_times"] == {"simulation": 1.5}
+
+
+def test_requeue_running(queue):
+    running = queue.submit("interrupted")
+    done = queue.submit("finished")
+    queue.claim("old_worker")
+    queue.claim("old_worker")
+    queue.update_stage(running, "images", 0.5)
+    queue.finish(done, "done")
+
+    assert queue.requeue_running() == 1
+    job = queue.get(running)
+    assert (job["status"], job["worker"], job["stage"], job["progress"]) == ("queued", None, None, 0)
+    assert queue.claim("new_worker")["id"] == running
+    assert queue.get(done)["status"] == "done"
+
+
+def start_service(queue, scenario_file, llm_latency=0.0):
+    pipeline = EpisodePipeline(scenario_file, FakeImageGen(), None, None, llm_factory=lambda: FakeLLMWrapper(llm_latency), output_dir="jobs")
+    service = ProductionService(queue, pipeline, num_workers=2, poll_interval=0.02)
+    service.start()
+    return service
+
+
+def test_service_runs_and_cancels_jobs(queue, scenario_file):
+    service = start_service(queue, scenario_file, llm_latency=0.05)
+    try:
+        quick = queue.submit("a quick episode", {"iterations": 1, "render": False})
+        slow = queue.submit("a long episode", {"iterations": 50, "render": False})
+
+        job = wait_for_status(queue, quick, ("done", "failed"))
+        assert job["status"] == "done", job["error"]
+        assert "script.json" in job["artifacts"]
+        assert set(job["stage_times"]) == {"simulation"}
+
+        wait_for_status(queue, slow, ("running",))
+        queue.cancel(slow)
+        job = wait_for_status(queue, slow, ("cancelled", "done", "failed"))
+        assert job["status"] == "cancelled"
+        assert job["progress"] < 0.4
+    finally:
+        service.stop()
+
+
+class NoFileProvider:
+    """
+    Stand-in video provider that, like VideoWrapper after a failed download, returns None.
+    """
+
+    api = "none"
+
+    def make_api_call(self, prompt, img, duration=5, idx=None):
+        return None
+
+
+class VOStub:
+    api = "stub"
+
+    def make_api_call(self, prompt, seed=0, idx=None):
+        return f"out_audio/{idx}.mp3"
+
+
+def test_media_without_a_file_fails_before_assembly(queue, scenario_file):
+    pipeline = EpisodePipeline(scenario_file, FakeImageGen(), NoFileProvider(), VOStub(), llm_factory=FakeLLMWrapper, output_dir="jobs")
+    queue.submit("episode", {"iterations": 1})
+    job = queue.claim("worker")
+    with pytest.raises(RuntimeError, match="shot 0: the video provider returned no file"):
+        pipeline.run(job, queue)
+    assert queue.get(job["id"])["stage"] == "media"
+
+
+@pytest.mark.parametrize("body, error", [
+    (b"[]", "body must be a JSON object"),
+    (b'"x"', "body must be a JSON object"),
+    (b"{", "invalid JSON"),
+    (b"{}", "narrative is required"),
+])
+def test_submit_rejects_bad_bodies(queue, body, error):
+    server = ThreadingHTTPServer(("localhost", 0), make_handler(ProductionService(queue, None)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        request = urllib.request.Request(f"http://localhost:{server.server_port}/jobs", data=body, method="POST")
+        with pytest.raises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(request, timeout=5)
+        assert raised.value.code == 400
+        assert json.loads(raised.value.read()) == {"error": error}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,34 @@
+from content_generation.lora_manager import LoraManager
+
+
+class RecordingPipe:
+    """
+    Stand-in diffusers pipeline that records the LoRA calls.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+
+def test_a_file_registered_twice_is_loaded_once(tmp_path):
+    (tmp_path / "style.safetensors").write_bytes(b"")
+    (tmp_path / "face.safetensors").write_bytes(b"")
+    pipe = RecordingPipe()
+    loras = LoraManager(pipe, str(tmp_path), max_resident=2)
+    assert loras.discover() == ["face", "style"]
+
+    loras.register("lora_0", str(tmp_path / "style.safetensors"))
+    loras.register("lora_1", str(tmp_path / ".." / tmp_path.name / "face.safetensors"))
+    assert loras.aliases == {"lora_0": "style", "lora_1": "face"}
+    assert loras.discover() == ["face", "style"]
+
+    loras.load("lora_0")
+    loras.load("style")
+    loras.activate({"lora_0": 0.3, "lora_1": 1.0})
+    loras.activate({"style": 0.3, "face": 1.0})
+    assert [call[0] for call in pipe.calls].count("load_lora_weights") == 2
+    assert sorted(loras.resident) == ["face", "style"]
+    assert loras.stats["hits"] == 1
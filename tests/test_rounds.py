@@ -0,0 +1,165 @@
+import threading
+
+import pytest
+
+import tracing
+
+from agents import RoundScheduler
+from agents.rounds import LONG_SCRIPT_CHARS
+from agents.semantic_cache import SemanticCache
+from agents.checkpoint import SimulationCheckpoint
+from production.fakes import FakeLLMWrapper
+
+NARRATIVE = "how does the internet work"
+
+CRITICS = [
+    {"agent": "script_writer", "writes_script": True},
+    {"agent": "story_critic", "after": ["script_writer"]},
+    {"agent": "visual_critic", "after": ["script_writer"]},
+    {"agent": "producer", "after": ["story_critic", "visual_critic"], "prompt": "merge these notes on {script}: {inputs}"},
+]
+
+
+class ConcurrencyProbe(FakeLLMWrapper):
+    """
+    Stand-in LLM shared by several agents that records how many calls overlapped.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def make_api_call(self, messages):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return super().make_api_call(messages)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class PromptLog(FakeLLMWrapper):
+    """
+    Stand-in LLM that records the prompt of every script it writes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.script_prompts = []
+        self._lock = threading.Lock()
+
+    def make_api_call_structured(self, messages, response_model=None):
+        with self._lock:
+            self.script_prompts.append(messages[-1]["content"])
+        return super().make_api_call_structured(messages)
+
+
+def test_independent_agents_run_in_one_wave(make_agents, tmp_path):
+    llm = ConcurrencyProbe(latency=0.1)
+    scheduler = RoundScheduler(make_agents(["producer", "visual_critic", "story_critic", "script_writer"], llm), CRITICS)
+    assert [[turn["agent"] for turn in wave] for wave in scheduler.waves] == [["script_writer"], ["story_critic", "visual_critic"], ["producer"]]
+    assert scheduler.notes == ["producer"]
+    assert scheduler.total_turns(2) == 9
+
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    turns = []
+    scheduler.run(NARRATIVE, 2, on_turn=lambda agent_name, text: turns.append(agent_name), checkpoint=checkpoint)
+
+    assert llm.max_in_flight == 2
+    expected = ["script_writer", "story_critic", "visual_critic", "producer"] * 2 + ["script_writer"]
+    assert turns == expected
+    assert [name for name, _ in SimulationCheckpoint.load(checkpoint.path)["history"]] == expected
+
+
+def test_parallel_turns_keep_the_trace_context(make_agents):
+    scheduler = RoundScheduler(make_agents(["script_writer", "story_critic", "visual_critic", "producer"], FakeLLMWrapper(latency=0.05)), CRITICS)
+    tracer = tracing.enable()
+    try:
+        with tracing.trace_context(episode="ep1"):
+            scheduler.run(NARRATIVE, 1)
+    finally:
+        tracing.disable()
+
+    turns = [event for event in tracer.events if event["name"] == "agent.process_observation"]
+    assert len({event["tid"] for event in turns}) > 1
+    assert len(turns) == 5
+    assert all(event["args"]["episode"] == "ep1" for event in turns)
+
+
+def test_branches_diverge_at_the_fork(make_agents, tmp_path):
+    llm = PromptLog()
+    agents = make_agents(["script_writer", "producer"], llm)
+    agents[1].cache = SemanticCache()
+    scheduler = RoundScheduler(agents)
+    tracer = tracing.enable()
+    try:
+        with tracing.trace_context(episode="ep1"):
+            results = scheduler.branch(NARRATIVE, 2, branches=3, fork_at=1, top_n=3, checkpoint_dir=str(tmp_path))
+    finally:
+        tracing.disable()
+
+    assert sorted(result["branch"] for result in results) == [0, 1, 2]
+    # the first draft is shared, each branch then revises it with its own direction
+    assert llm.script_prompts[0] == NARRATIVE
+    forked = llm.script_prompts[1:]
+    assert len(forked) == 6
+    assert len({prompt for prompt in forked if "alternative" in prompt}) == 3
+    assert agents[1].cache.stats()["entries"] == 0
+    assert all(event["args"]["episode"] == "ep1" for event in tracer.events if event["name"] == "agent.process_observation")
+
+
+def test_a_long_narrative_is_broken_down(make_agents):
+    llm = FakeLLMWrapper(num_shots=2)
+    scheduler = RoundScheduler(make_agents(["script_writer", "producer"], llm))
+    script = "\n\n".join(f"INT. ROOM {i} - DAY\n" + "Taylor Trace looks around. " * 200 for i in range(3))
+    assert len(script) > LONG_SCRIPT_CHARS
+
+    drafts = [turn_script for _, _, turn_script in scheduler.steps(script, 1) if turn_script is not None]
+    # three chunks of whole scenes, broken down in one call each, then the final revision
+    assert len(drafts[0].shots) == 6
+    assert llm.calls == 5
+    assert scheduler.writer.short_memory[0] == drafts[0].to_str()
+
+
+def test_resume_inside_a_wave(make_agents, tmp_path):
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    steps = RoundScheduler(make_agents(["script_writer", "story_critic", "visual_critic", "producer"]), CRITICS).steps(NARRATIVE, 2, checkpoint=checkpoint)
+    # stop after the first critic of the first beat
+    for _ in range(2):
+        next(steps)
+    steps.close()
+
+    llm = FakeLLMWrapper()
+    scheduler = RoundScheduler(make_agents(["script_writer", "story_critic", "visual_critic", "producer"], llm), CRITICS)
+    turns = []
+    scheduler.run(NARRATIVE, 2, on_turn=lambda agent_name, text: turns.append(agent_name), checkpoint=SimulationCheckpoint(checkpoint.path))
+    assert turns == ["visual_critic", "producer"] + ["script_writer", "story_critic", "visual_critic", "producer", "script_writer"]
+    assert llm.calls == 7
+
+
+def test_resume_rejects_another_schedule(make_agents, tmp_path):
+    checkpoint = SimulationCheckpoint(str(tmp_path / "sim.jsonl"))
+    steps = RoundScheduler(make_agents()).steps(NARRATIVE, 2, checkpoint=checkpoint)
+    for _ in range(3):
+        next(steps)
+    steps.close()
+
+    scheduler = RoundScheduler(make_agents(["script_writer", "story_critic", "visual_critic", "producer"]), CRITICS)
+    with pytest.raises(ValueError, match="different round schedule"):
+        scheduler.run(NARRATIVE, 2, checkpoint=SimulationCheckpoint(checkpoint.path))
+
+
+@pytest.mark.parametrize("turns, error", [
+    ([{"agent": "director", "writes_script": True}], "unknown agent"),
+    ([{"agent": "script_writer", "writes_script": True}, {"agent": "producer", "writes_script": True}], "exactly one writes_script"),
+    ([{"agent": "script_writer", "writes_script": True}, {"agent": "producer"}], "must run after"),
+    ([{"agent": "script_writer", "writes_script": True},
+      {"agent": "story_critic", "after": ["producer"]}, {"agent": "producer", "after": ["story_critic"]}], "circular"),
+])
+def test_invalid_schedules(make_agents, turns, error):
+    with pytest.raises(ValueError, match=error):
+        RoundScheduler(make_agents(["script_writer", "story_critic", "producer"]), turns)
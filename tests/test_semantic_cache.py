@@ -0,0 +1,19 @@
+import pytest
+
+from agents.semantic_cache import SemanticCache
+
+
+def test_near_repeats_hit_and_the_least_recent_entry_is_evicted():
+    cache = SemanticCache(max_entries=2)
+    cache.put("3D animation of a detective in a neon-lit office", "first")
+    cache.put("a garden at dawn", "second")
+    assert cache.get("3D animation of a detective in a neon-lit office.") == "first"
+    cache.put("a rooftop at night", "third")
+    assert cache.get("a garden at dawn") is None
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.parametrize("max_entries", [0, -1])
+def test_max_entries_must_be_positive(max_entries):
+    with pytest.raises(ValueError, match="max_entries"):
+        SemanticCache(max_entries=max_entries)
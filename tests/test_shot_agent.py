@@ -0,0 +1,28 @@
+from agents import ShotAgent
+from agents.llm_wrapper import Shot
+from production.fakes import FakeLLMWrapper
+
+
+def test_shots_naming_the_character_carry_its_caption(make_agents):
+    writer = make_agents(["script_writer"])[0]
+    assert writer.name == "script_writer"
+    assert writer.character_name == "Taylor Trace"
+
+    named = ShotAgent._normalize_shot(Shot(shot_action="Shot 2: Taylor Trace opens the door.", txt2img_prompt="a detective at a door", vo=""), [writer])
+    assert named.shot_action == "Taylor Trace opens the door."
+    assert named.txt2img_prompt.endswith(f"Taylor Trace: {writer.lora_key_word}, {writer.flux_caption}")
+
+    unnamed = ShotAgent._normalize_shot(Shot(shot_action="The city sleeps.", txt2img_prompt="a city at night", vo=""), [writer])
+    assert unnamed.txt2img_prompt == "a city at night"
+
+
+def test_script_chunks_are_broken_down_in_order(make_agents, tmp_path):
+    llm = FakeLLMWrapper(num_shots=2)
+    script = "\n\n".join(f"INT. ROOM {i} - DAY\n" + "Taylor Trace looks around. " * 100 for i in range(3))
+    path = tmp_path / "script.txt"
+    path.write_text(script)
+
+    shot_list = ShotAgent(llm=llm).generate_shot_list(str(path), 6, make_agents(["script_writer"]), max_chunk_chars=3000)
+    assert llm.calls == 3
+    assert len(shot_list.shots) == 6
+    assert all("Taylor Trace: " in shot.txt2img_prompt for shot in shot_list.shots)
@@ -0,0 +1,255 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+# the active tracer, None while tracing is disabled
+_tracer = None
+
+_context = contextvars.ContextVar("trace_context", default={})
+
+
+class _NoOpSpan:
+    """
+    Shared span returned while tracing is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NO_OP_SPAN = _NoOpSpan()
+
+
+class Span:
+    """
+    A timed section of work, recorded as a Chrome trace complete event when it exits.
+
+    Attributes:
+        name (str): The span name.
+        attributes (dict): Attributes shown in the trace viewer, merged over the current trace context.
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attributes = {**_context.get(), **attributes}
+        self._otel_span = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        if self.tracer.otel_tracer is not None:
+            self._otel_span = self.tracer.otel_tracer.start_as_current_span(self.name, attributes=_otel_attributes(self.attributes))
+            self._otel_span.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attributes["error"] = repr(exc)
+        self.tracer.record(self.name, self.start, end, self.attributes)
+        if self._otel_span is not None:
+            self._otel_span.__exit__(exc_type, exc, tb)
+        return False
+
+    def set_attribute(self, key, value):
+        """
+        Adds an attribute once it is known, e.g. a result size.
+        """
+        self.attributes[key] = value
+
+
+class Tracer:
+    """
+    Collects spans in memory and exports them as a Chrome trace / Perfetto JSON file, optionally also to OTLP.
+
+    Attributes:
+        events (list): Recorded Chrome trace events.
+        otel_tracer: OpenTelemetry tracer spans are mirrored to, or None.
+    """
+
+    def __init__(self, otel_tracer=None) -> None:
+        self.events = []
+        self.otel_tracer = otel_tracer
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def record(self, name: str, start: int, end: int, attributes: dict) -> None:
+        """
+        Stores one finished span.
+
+        Args:
+            name (str): The span name.
+            start (int): Start time from time.perf_counter_ns.
+            end (int): End time from time.perf_counter_ns.
+            attributes (dict): The span attributes.
+        """
+        event = {
+            "name": name,
+            "cat": name.split(".")[0],
+            "ph": "X",
+            "ts": (start - self._origin) / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {key: value if isinstance(value, (int, float, bool, str)) or value is None else str(value) for key, value in attributes.items()},
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def export_chrome_trace(self, path: str) -> None:
+        """
+        Writes the recorded spans as a Chrome trace file, which also opens in Perfetto (ui.perfetto.dev).
+
+        Args:
+            path (str): The output path.
+        """
+        with self._lock:
+            events = list(self.events)
+        thread_names = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread.ident, "args": {"name": thread.name}}
+            for thread in threading.enumerate()
+        ]
+        with open(path, 'w') as file:
+            json.dump({"traceEvents": thread_names + events, "displayTimeUnit": "ms"}, file)
+        print(f"trace saved to {path}")
+
+
+def _otel_attributes(attributes: dict) -> dict:
+    """
+    Keeps the attributes OpenTelemetry accepts.
+    """
+    return {key: value for key, value in attributes.items() if isinstance(value, (int, float, bool, str))}
+
+
+def enable(chrome_trace_path: str = None, otlp_endpoint: str = None, service_name: str = "simulated_agents") -> Tracer:
+    """
+    Turns tracing on for the whole process.
+
+    Args:
+        chrome_trace_path (str, optional): Where to write the Chrome trace when the process exits.
+        otlp_endpoint (str, optional): OTLP/HTTP endpoint spans are also sent to, e.g. http://localhost:4318/v1/traces.
+            Needs the opentelemetry-sdk and opentelemetry-exporter-otlp packages.
+        service_name (str, optional): The OTLP service name. Defaults to "simulated_agents".
+
+    Returns:
+        Tracer: The active tracer.
+    """
+    global _tracer
+
+    otel_tracer = None
+    if otlp_endpoint:
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            raise ValueError("OTLP export needs: pip install opentelemetry-sdk opentelemetry-exporter-otlp")
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=otlp_endpoint)))
+        atexit.register(provider.shutdown)
+        otel_tracer = provider.get_tracer(service_name)
+
+    _tracer = Tracer(otel_tracer)
+    if chrome_trace_path:
+        atexit.register(_tracer.export_chrome_trace, chrome_trace_path)
+    return _tracer
+
+
+def disable() -> None:
+    """
+    Turns tracing off. Spans started afterwards are no-ops.
+    """
+    global _tracer
+    _tracer = None
+
+
+def get_tracer() -> Tracer:
+    """
+    Returns the active tracer, or None while tracing is disabled.
+    """
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """
+    Times a block of work: `with span("flux.generate_image", steps=40): ...`.
+
+    Args:
+        name (str): The span name, its prefix before the first dot is the trace category.
+        **attributes: Attributes shown in the trace viewer.
+
+    Returns:
+        A context manager, a shared no-op while tracing is disabled.
+    """
+    if _tracer is None:
+        return _NO_OP_SPAN
+    return Span(_tracer, name, attributes)
+
+
+class trace_context:
+    """
+    Adds attributes, such as the episode or shot index, to every span started inside the block.
+    """
+
+    def __init__(self, **attributes) -> None:
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._token = _context.set({**_context.get(), **self.attributes})
+        return self
+
+    def __exit__(self, *exc):
+        _context.reset(self._token)
+        return False
+
+
+def traced(name: str, attributes=None):
+    """
+    Decorator recording every call of a function as a span.
+
+    Args:
+        name (str): The span name.
+        attributes (Callable, optional): Called with the function's arguments, returns the span attributes.
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with Span(_tracer, name, attributes(*args, **kwargs) if attributes else {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_context(fn):
+    """
+    Wraps a function handed to a thread pool so that it sees the caller's trace context:
+    `executor.map(in_context(take_turn), items)`. Every call runs in its own copy of the context.
+
+    Args:
+        fn (Callable): The function.
+
+    Returns:
+        Callable: The wrapped function.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
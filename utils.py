@@ -1,7 +1,7 @@
 import os
 import shutil
 
-from moviepy import VideoFileClip, AudioFileClip, concatenate_videoclips
+from tracing import traced
 
 
 def list_to_txt(input_list: list, filename: str) -> None:
@@ -44,6 +44,7 @@ def concatenate_actions(beat_number, all_scenes,character_agents):
     concatenated_actions = " ".join(all_scenes[start:end])
     return concatenated_actions
 
+@traced("edit.combine_video_audio")
 def combine_video_audio(video_path, audio_path, output_path):
     """
     Combines video and audio into a single file, trimming the video to match the audio length.
@@ -53,15 +54,14 @@ def combine_video_audio(video_path, audio_path, output_path):
         audio_path (str): The path to the audio file.
         output_path (str): The path to the output file.
     """
-    video_clip = VideoFileClip(video_path)
-    audio_clip = AudioFileClip(audio_path)
-    
-    # Trim the video to the length of the audio
-    video_clip = video_clip.subclipped(0, audio_clip.duration)
-    
-    final_clip = video_clip.with_audio(audio_clip)
-    final_clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
+    from moviepy import VideoFileClip, AudioFileClip
 
+    with VideoFileClip(video_path) as video_clip, AudioFileClip(audio_path) as audio_clip:
+        # Trim the video to the length of the audio
+        final_clip = video_clip.subclipped(0, audio_clip.duration).with_audio(audio_clip)
+        final_clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
+
+@traced("edit.concatenate_videos", lambda video_paths, output_path: {"clips": len(video_paths)})
 def concatenate_videos(video_paths, output_path):
     """
     Concatenates multiple video files into a single file.
@@ -70,6 +70,13 @@ def concatenate_videos(video_paths, output_path):
         video_paths (list): List of paths to the video files.
         output_path (str): The path to the output file.
     """
+    from moviepy import VideoFileClip, concatenate_videoclips
+
     clips = [VideoFileClip(video) for video in video_paths]
-    final_clip = concatenate_videoclips(clips)
-    final_clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
\ No newline at end of file
+    try:
+        final_clip = concatenate_videoclips(clips)
+        final_clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
+    finally:
+        # release the ffmpeg readers, the gradio app is long running
+        for clip in clips:
+            clip.close()
\ No newline at end of file